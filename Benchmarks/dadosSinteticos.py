@@ -0,0 +1,424 @@
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+# Módulos compartilhados (cliente B3)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Comum"))
+from b3Client import decode_params
+
+# Tamanho atual da base (escala 1x)
+ESCALA_BASE = {
+    "empresas": 2000,
+    "bdrs_patrocinados": 150,
+    "bdrs_nao_patrocinados": 850,
+    "etfs": 120,
+    "etfs_bdr": 80,
+    "fiis": 500
+}
+
+# Histórico de preços (Diario): dias por escala e limite de colunas do Excel (16384 / 4 por empresa)
+DIAS_BASE = 20
+MAX_EMPRESAS_EXCEL = 4096
+
+DATA_BASE = date(2026, 1, 1)
+
+def codigo_letras(n):
+    """Deterministic 4-letter code (AAAA, AAAB, ...) for index n"""
+    letters = []
+    for _ in range(4):
+        n, r = divmod(n, 26)
+        letters.append(chr(ord('A') + r))
+    return "".join(reversed(letters))
+
+def indice_letras(code):
+    n = 0
+    for letter in code[:4]:
+        n = n * 26 + (ord(letter) - ord('A'))
+    return n
+
+def formatar_data(d):
+    return d.strftime("%d/%m/%Y")
+
+def formatar_cnpj(n):
+    digits = f"{n:014d}"
+    return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}"
+
+def pagina(items, page_number, page_size):
+    total = len(items)
+    start = (page_number - 1) * page_size
+    return {
+        "page": {
+            "pageNumber": page_number,
+            "pageSize": page_size,
+            "totalRecords": total,
+            "totalPages": (total + page_size - 1) // page_size
+        },
+        "results": items[start:start + page_size]
+    }
+
+class B3Sintetica:
+    """Deterministic synthetic B3 backend, usable as a servidorB3Fake responder.
+
+    Every response is generated on demand from the request payload, so memory
+    stays flat even at 100x. Entities live in two namespaces (listed companies and
+    funds), each one a contiguous range of indices that encode into 4-letter codes.
+    """
+
+    def __init__(self, escala=1, seed=0):
+        self.escala = escala
+        self.seed = seed
+        self.tamanhos = {name: count * escala for name, count in ESCALA_BASE.items()}
+
+        # listedCompaniesProxy: empresas, BDRs patrocinados, não patrocinados e ETFs de BDR
+        self.faixas_empresas = {}
+        offset = 0
+        for name in ("empresas", "bdrs_patrocinados", "bdrs_nao_patrocinados", "etfs_bdr"):
+            self.faixas_empresas[name] = (offset, offset + self.tamanhos[name])
+            offset += self.tamanhos[name]
+
+        # fundsProxy: FIIs (typeFund 7) e ETFs (typeFund 20)
+        self.faixas_fundos = {
+            7: (0, self.tamanhos["fiis"]),
+            20: (self.tamanhos["fiis"], self.tamanhos["fiis"] + self.tamanhos["etfs"])
+        }
+
+    def rng(self, *key):
+        return random.Random(":".join(str(k) for k in (self.seed,) + key))
+
+    def tipo_empresa(self, n):
+        for name, (start, end) in self.faixas_empresas.items():
+            if start <= n < end:
+                return name
+        return None
+
+    # ---- listedCompaniesProxy ----
+
+    def empresa(self, n):
+        """Listing record (GetInitialCompanies / GetCompaniesBDR) for global index n"""
+        kind = self.tipo_empresa(n)
+        rng = self.rng("empresa", n)
+        code = codigo_letras(n)
+        is_bdr = kind != "empresas"
+        return {
+            "codeCVM": str(10000 + n),
+            "issuingCompany": code,
+            "companyName": f"{kind.upper()} {n:06d} S.A.",
+            "tradingName": f"{kind.upper()} {n:06d}",
+            "cnpj": formatar_cnpj(n + 1),
+            "marketIndicator": str(rng.choice([10, 15, 20])),
+            "typeBDR": rng.choice(["DRN", "DRE"]) if is_bdr else "",
+            "dateListing": formatar_data(DATA_BASE - timedelta(days=rng.randint(365, 365 * 40))),
+            "status": "A",
+            "segment": rng.choice(["NOVO MERCADO", "NÍVEL 1", "NÍVEL 2", "TRADICIONAL", "BDR"]),
+            "segmentEng": "",
+            "type": "1" if is_bdr else "2",
+            "market": rng.choice(["NM", "N1", "N2", "MB"])
+        }
+
+    def detalhe_empresa(self, n):
+        kind = self.tipo_empresa(n)
+        rng = self.rng("detalhe", n)
+        listing = self.empresa(n)
+        code = listing["issuingCompany"]
+
+        # Uma em cada dez empresas não tem código de negociação (empresas_sem_codigo)
+        other_codes = []
+        if kind != "empresas" or n % 10:
+            suffixes = ["3", "4"] if rng.random() < 0.5 else ["3"]
+            if kind in ("bdrs_patrocinados", "bdrs_nao_patrocinados"):
+                suffixes = ["34"]
+            elif kind == "etfs_bdr":
+                suffixes = ["39"]
+            other_codes = [{"code": code + suffix, "isin": f"BR{code}{suffix}XXX"} for suffix in suffixes]
+
+        return {
+            "issuingCompany": code,
+            "companyName": listing["companyName"],
+            "tradingName": listing["tradingName"],
+            "cnpj": listing["cnpj"],
+            "industryClassification": rng.choice([
+                "Financeiro / Bancos / Bancos",
+                "Consumo Cíclico / Comércio / Tecidos",
+                "Utilidade Pública / Energia Elétrica / Energia Elétrica",
+                "Materiais Básicos / Mineração / Minerais Metálicos"
+            ]),
+            "activity": f"Atividade sintética {n}",
+            "website": f"www.{code.lower()}.com.br",
+            "hasBDR": rng.random() < 0.05,
+            "code": other_codes[0]["code"] if other_codes else "",
+            "otherCodes": other_codes,
+            "codeCVM": listing["codeCVM"],
+            "status": listing["status"],
+            "marketIndicator": listing["marketIndicator"],
+            "dateListing": listing["dateListing"],
+            "type": listing["type"],
+            "describleCategoryBVMF": "BDR" if kind != "empresas" else "AÇÕES"
+        }
+
+    def listagem_empresas(self, kind, params):
+        start, end = self.faixas_empresas[kind]
+        page_number = int(params.get("pageNumber", 1))
+        page_size = int(params.get("pageSize", 120))
+        first = start + (page_number - 1) * page_size
+        results = [self.empresa(n) for n in range(first, min(first + page_size, end))]
+        total = end - start
+        return {
+            "page": {
+                "pageNumber": page_number,
+                "pageSize": page_size,
+                "totalRecords": total,
+                "totalPages": (total + page_size - 1) // page_size
+            },
+            "results": results
+        }
+
+    def dividendos_empresa(self, n):
+        rng = self.rng("dividendos", n)
+        dividends = []
+        approval = DATA_BASE
+        # Histórico de 0 a 80 proventos: parte das empresas ocupa mais de uma página
+        for _ in range(rng.randint(0, 80)):
+            approval -= timedelta(days=rng.randint(30, 120))
+            dividends.append({
+                "typeStock": rng.choice(["ON", "PN"]),
+                "dateApproval": formatar_data(approval),
+                "valueCash": f"{rng.uniform(0.01, 3):.8f}".replace(".", ","),
+                "ratio": "1",
+                "corporateAction": rng.choice(["DIVIDENDO", "JRS CAP PROPRIO", "RENDIMENTO"]),
+                "lastDatePriorEx": formatar_data(approval + timedelta(days=5)),
+                "closingPricePriorExDate": f"{rng.uniform(1, 100):.2f}".replace(".", ",")
+            })
+        return dividends
+
+    def dividendos_bdr(self, n):
+        rng = self.rng("dividendosBdr", n)
+        dividends = []
+        approval = DATA_BASE
+        for _ in range(rng.randint(0, 30)):
+            approval -= timedelta(days=rng.randint(60, 120))
+            dividends.append({
+                "label": "DIVIDENDO",
+                "approvedOn": formatar_data(approval),
+                "rate": f"{rng.uniform(0.001, 1):.8f}".replace(".", ","),
+                "paymentDate": formatar_data(approval + timedelta(days=30)),
+                "lastDatePrior": formatar_data(approval + timedelta(days=5))
+            })
+        return [{"cashDividends": dividends, "stockDividends": [], "subscriptions": []}]
+
+    def responder_empresas(self, method, params):
+        if method == "GetInitialCompanies":
+            kind = "bdrs_patrocinados" if str(params.get("governance")) == "14" else "empresas"
+            return self.listagem_empresas(kind, params)
+
+        if method == "GetCompaniesBDR":
+            kind = "etfs_bdr" if str(params.get("codeCategoryBVMF")) == "-1" else "bdrs_nao_patrocinados"
+            return self.listagem_empresas(kind, params)
+
+        if method == "GetDetail":
+            n = int(params["codeCVM"]) - 10000
+            if self.tipo_empresa(n) is None:
+                return None
+            return self.detalhe_empresa(n)
+
+        if method == "GetListedCashDividends":
+            n = int(params["tradingName"].split()[-1])
+            page_size = int(params.get("pageSize", 60))
+            return pagina(self.dividendos_empresa(n), int(params.get("pageNumber", 1)), page_size)
+
+        if method == "GetListedSupplementBDR":
+            n = indice_letras(params["issuingCompany"])
+            if self.tipo_empresa(n) is None:
+                return None
+            return self.dividendos_bdr(n)
+
+        return None
+
+    # ---- fundsProxy ----
+
+    def fundo(self, type_fund, n):
+        code = codigo_letras(n)
+        label = "FII" if type_fund == 7 else "ETF"
+        return {
+            "id": n,
+            "typeName": None,
+            "acronym": code,
+            "fundName": f"{label} {code} {n:06d}",
+            "companyName": f"{label} SINTETICO {n:06d}",
+            "cnpj": f"{900000000 + n:014d}"
+        }
+
+    def detalhe_fundo(self, type_fund, n):
+        rng = self.rng("fundo", n)
+        listing = self.fundo(type_fund, n)
+        code = listing["acronym"]
+        suffix = "11"
+        return {
+            "detailFund": {
+                "acronym": code,
+                "tradingName": listing["fundName"],
+                "tradingCode": f"{code}{suffix}      ",
+                "tradingCodeOthers": "",
+                "cnpj": listing["cnpj"],
+                "companyName": listing["companyName"],
+                "webSite": f"www.{code.lower()}.com.br",
+                "quotaCount": str(rng.randint(10 ** 5, 10 ** 8)),
+                "quotaDateApproved": formatar_data(DATA_BASE - timedelta(days=rng.randint(30, 3650)))
+            }
+        }
+
+    def dividendos_fundo(self, n):
+        rng = self.rng("dividendosFii", n)
+        months = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho",
+                  "agosto", "setembro", "outubro", "novembro", "dezembro"]
+        dividends = []
+        approval = DATA_BASE
+        for _ in range(rng.randint(0, 24)):
+            approval -= timedelta(days=30)
+            dividends.append({
+                "paymentDate": formatar_data(approval + timedelta(days=10)),
+                "rate": f"{rng.uniform(0.05, 2):.8f}".replace(".", ","),
+                "relatedTo": f"{months[approval.month - 1].capitalize()}/{approval.year}",
+                "approvedOn": formatar_data(approval),
+                "label": "RENDIMENTO",
+                "lastDatePrior": formatar_data(approval + timedelta(days=3))
+            })
+        return {"quantity": str(rng.randint(10 ** 5, 10 ** 8)), "cashDividends": dividends}
+
+    def responder_fundos(self, method, params):
+        type_fund = int(params.get("typeFund", 7))
+        if type_fund not in self.faixas_fundos:
+            return None
+        start, end = self.faixas_fundos[type_fund]
+
+        if method == "GetListedFundsSIG":
+            page_number = int(params.get("pageNumber", 1))
+            page_size = int(params.get("pageSize", 60))
+            first = start + (page_number - 1) * page_size
+            results = [self.fundo(type_fund, n) for n in range(first, min(first + page_size, end))]
+            total = end - start
+            return {
+                "page": {
+                    "pageNumber": page_number,
+                    "pageSize": page_size,
+                    "totalRecords": total,
+                    "totalPages": (total + page_size - 1) // page_size
+                },
+                "results": results
+            }
+
+        n = indice_letras(params.get("identifierFund", ""))
+        if not start <= n < end:
+            return None
+        if method == "GetDetailFundSIG":
+            return self.detalhe_fundo(type_fund, n)
+        if method == "GetListedSupplementFunds":
+            return self.dividendos_fundo(n)
+        return None
+
+    def __call__(self, path):
+        """servidorB3Fake responder: path -> {"status", "body"} or None"""
+        parts = path.split("?")[0].strip("/").split("/")
+        if len(parts) < 4:
+            return None
+        proxy, method, payload = parts[0], parts[-2], parts[-1]
+        try:
+            params = decode_params(payload)
+        except ValueError:
+            return None
+
+        try:
+            if proxy == "listedCompaniesProxy":
+                data = self.responder_empresas(method, params)
+            elif proxy == "fundsProxy":
+                data = self.responder_fundos(method, params)
+            else:
+                data = None
+        except (KeyError, ValueError):
+            data = None
+
+        if data is None:
+            return None
+        return {"status": 200, "body": json.dumps(data, ensure_ascii=False)}
+
+    def contagens(self):
+        return dict(self.tamanhos)
+
+    # ---- cotações (validação local dos *ExcelJson.py) ----
+
+    def codigos_negociacao(self):
+        """Every ticker the synthetic B3 can hand out, in the formats of detalhe_empresa/detalhe_fundo"""
+        sufixos = {"empresas": ("3", "4"), "bdrs_patrocinados": ("34",), "bdrs_nao_patrocinados": ("34",), "etfs_bdr": ("39",)}
+        for kind, (start, end) in self.faixas_empresas.items():
+            for n in range(start, end):
+                for suffix in sufixos[kind]:
+                    yield codigo_letras(n) + suffix
+        for start, end in self.faixas_fundos.values():
+            for n in range(start, end):
+                yield codigo_letras(n) + "11"
+
+    def cotacao(self, code):
+        """Quote of one ticker as B3_COTACOES reads it, or None for a ticker the source does not have.
+
+        Most tickers are valid; a few are dead (no fields), have a zero price
+        or no market cap, so every branch of the check runs.
+        """
+        rng = self.rng("cotacao", code)
+        sorteio = rng.random()
+        if sorteio < 0.01:
+            return None
+        if sorteio < 0.02:
+            return {"preco": None, "valorMercado": None}
+        preco = round(rng.uniform(1, 200), 2)
+        valor_mercado = rng.randint(10 ** 7, 10 ** 11)
+        if sorteio < 0.03:
+            preco = 0
+        elif sorteio < 0.04:
+            valor_mercado = None
+        return {"preco": preco, "valorMercado": valor_mercado}
+
+def gerar_cotacoes(path, backend):
+    """Write the quotes of every synthetic ticker as a {"CODE": {"preco", "valorMercado"}} map"""
+    quotes = {}
+    for code in backend.codigos_negociacao():
+        quote = backend.cotacao(code)
+        if quote is not None:
+            quotes[code] = quote
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(quotes, f)
+    return len(quotes)
+
+def gerar_historico_excel(path, escala=1, seed=0):
+    """Write a synthetic price history workbook in the layout process_excel expects.
+
+    One 4-column block per company (date, price, volume, blank) under a header row
+    with name and ticker. Companies are capped by Excel's column limit, so larger
+    scales grow the number of days instead.
+    """
+    from openpyxl import Workbook
+
+    companies = min(ESCALA_BASE["empresas"] * escala, MAX_EMPRESAS_EXCEL)
+    days = DIAS_BASE * escala
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Historico")
+
+    header = []
+    for n in range(companies):
+        code = codigo_letras(n)
+        header.extend([f"EMPRESAS {n:06d}", f"{code}3", None, None])
+    ws.append(header)
+
+    prices = [random.Random(f"{seed}:preco:{n}").uniform(5, 100) for n in range(companies)]
+    for day in range(days):
+        rng = random.Random(f"{seed}:dia:{day}")
+        current = DATA_BASE - timedelta(days=day)
+        row = []
+        for n in range(companies):
+            prices[n] = max(0.01, prices[n] * (1 + rng.uniform(-0.03, 0.03)))
+            row.extend([current, round(prices[n], 2), rng.randint(10 ** 3, 10 ** 7), None])
+        ws.append(row)
+
+    wb.save(path)
+    return {"empresas": companies, "dias": days}
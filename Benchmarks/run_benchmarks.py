@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+
+# Módulos compartilhados (servidor B3 fake)
+sys.path.append(os.path.join(BASE_DIR, "Comum"))
+from servidorB3Fake import start_server
+from dadosSinteticos import B3Sintetica, gerar_cotacoes, gerar_historico_excel
+
+RESULTADOS_JSONL = os.path.join(BENCH_DIR, "Resultados", "benchmarks.jsonl")
+
+# Ordem do run_all_semestral.py. As etapas *ExcelJson.py validam os códigos com o backend
+# local (B3_VALIDACAO=local) contra as cotações sintéticas de B3_COTACOES
+ETAPAS_SEMESTRAL = [
+    "empresas.py",
+    "empresasExcelJson.py",
+    "dividendosEmpresas.py",
+    "empresasJsonFormat.py",
+    "bdr.py",
+    "bdrExcelJson.py",
+    "dividendosBdr.py",
+    "bdrJsonFormat.py",
+    "etf.py",
+    "etfExcelJson.py",
+    "etfJsonFormat.py",
+    "etfBdr.py",
+    "etfBdrExcelJson.py",
+    "etfBdrJsonFormat.py",
+    "fii.py",
+    "fiiExcelJson.py",
+    "dividendosFii.py",
+    "fiisJsonFormat.py",
+    "dividendosauxiliar.py"
+]
+
+ETAPAS_SEMANAL = ["dividendosAtualizar.py"]
+
+# Etapa Python do Diario: leitura do histórico em Excel -> empresasHistorico.json
+DIARIO_CODIGO = (
+    "import os, sys\n"
+    "import process_excel\n"
+    "history = process_excel.read_history(sys.argv[1])\n"
+    "process_excel.save_history_store(history, os.path.join(sys.argv[2], 'Historico'))\n"
+    "process_excel.save_historic_json(process_excel.historic_records(*history), sys.argv[2])\n"
+)
+
+def preparar_fiis(semestral_dir):
+    """dividendosFii.py reads the Finais/fiis.json of the previous semester, kept in the project; the sandbox has none yet"""
+    anterior = os.path.join(semestral_dir, "Finais", "fiis.json")
+    if not os.path.exists(anterior):
+        shutil.copy(os.path.join(semestral_dir, "Finais", "Parcial", "fiis.json"), anterior)
+
+# Arquivos que uma etapa espera da rodada anterior, preparados logo antes dela
+PREPAROS = {
+    "dividendosFii.py": preparar_fiis
+}
+
+def preparar_semanal(sandbox):
+    """Seed Semanal/Jsons with the Semestral outputs, as done by hand after each semester"""
+    finais = os.path.join(sandbox, "Semestral", "Finais")
+    jsons = os.path.join(sandbox, "Semanal", "Jsons")
+    for origem, destino in [
+        (os.path.join(finais, "dividendos_auxiliar.json"), "dividendos_auxiliar.json"),
+        (os.path.join(finais, "dividendosEmpresas.json"), "dividendosEmpresas.json"),
+        (os.path.join(finais, "dividendosBdr.json"), "dividendosBdr.json"),
+        (os.path.join(finais, "Parcial", "dividendosFii.json"), "dividendosFii.json")
+    ]:
+        if os.path.exists(origem):
+            shutil.copy(origem, os.path.join(jsons, destino))
+
+def montar_sandbox(destino):
+    """Copy the scripts into a scratch tree so benchmark runs never touch the real Finais/"""
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+    shutil.copytree(os.path.join(BASE_DIR, "Comum"), os.path.join(destino, "Comum"), ignore=ignore)
+    shutil.copytree(os.path.join(BASE_DIR, "Semestral", "Scripts"), os.path.join(destino, "Semestral", "Scripts"), ignore=ignore)
+    shutil.copytree(os.path.join(BASE_DIR, "Semanal", "Scripts"), os.path.join(destino, "Semanal", "Scripts"), ignore=ignore)
+    shutil.copytree(os.path.join(BASE_DIR, "Diario", "Scripts", "testando"), os.path.join(destino, "Diario", "Scripts", "testando"),
+                    ignore=shutil.ignore_patterns("__pycache__", "*.pyc", "*.xlsx", "Finais"))
+
+    for pasta in [
+        ("Semestral", "Finais", "Parcial"),
+        ("Semestral", "Finais", "Copiar"),
+        ("Semestral", "Suporte"),
+        ("Semestral", "Excel"),
+        ("Semanal", "Jsons"),
+        ("Semanal", "Suporte"),
+        ("Diario", "Finais")
+    ]:
+        os.makedirs(os.path.join(destino, *pasta), exist_ok=True)
+
+def snapshot(root):
+    """Size and mtime of every file under root"""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+def bytes_escritos(antes, depois):
+    """Total size of the files a stage created or modified"""
+    return sum(size for path, (size, mtime) in depois.items() if antes.get(path) != (size, mtime))
+
+def aguardar(proc):
+    """Wait for the child and return (exit code, peak RSS in MB or None)"""
+    if not hasattr(os, "wait4"):
+        # Windows: sem rusage do processo filho
+        return proc.wait(), None
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return proc.returncode, round(rusage.ru_maxrss / divisor, 1)
+
+def executar_etapa(pipeline, etapa, comando, cwd, env, sandbox, server, log_dir):
+    """Run one stage as a subprocess and measure it"""
+    antes = snapshot(sandbox)
+    stats_antes = server.stats()
+    log_path = os.path.join(log_dir, f"{pipeline}_{etapa}.log")
+
+    start_time = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proc = subprocess.Popen(comando, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        exit_code, peak_rss = aguardar(proc)
+    wall_time = time.perf_counter() - start_time
+
+    stats_depois = server.stats()
+    requests = stats_depois["requests"] - stats_antes["requests"]
+    return {
+        "pipeline": pipeline,
+        "etapa": etapa,
+        "status": "Sucesso" if exit_code == 0 else "Falha",
+        "exit_code": exit_code,
+        "tempo_s": round(wall_time, 3),
+        "requisicoes": requests,
+        "respostas_429": stats_depois["throttled"] - stats_antes["throttled"],
+        "nao_encontradas": stats_depois["not_found"] - stats_antes["not_found"],
+        "req_s": round(requests / wall_time, 2) if wall_time > 0 else None,
+        "pico_rss_mb": peak_rss,
+        "bytes_escritos": bytes_escritos(antes, snapshot(sandbox)),
+        "log": log_path
+    }
+
+def commit_atual():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def imprimir_resumo(resultado):
+    print(f"\n{'='*80}")
+    print(f"ESCALA {resultado['escala']}x - commit {resultado['commit']}")
+    print(f"{'='*80}")
+    print(f"{'Etapa':<36}{'Tempo (s)':>10}{'Req':>9}{'Req/s':>9}{'RSS (MB)':>10}{'Escrito':>12}  Status")
+    for etapa in resultado["etapas"]:
+        nome = f"{etapa['pipeline']}/{etapa['etapa']}"
+        rss = etapa['pico_rss_mb'] if etapa['pico_rss_mb'] is not None else "-"
+        req_s = etapa['req_s'] if etapa['req_s'] is not None else "-"
+        print(f"{nome:<36}{etapa['tempo_s']:>10.2f}{etapa['requisicoes']:>9}{req_s:>9}{rss:>10}"
+              f"{etapa['bytes_escritos']:>12}  {etapa['status']}")
+    total = resultado["total"]
+    print(f"{'Total':<36}{total['tempo_s']:>10.2f}{total['requisicoes']:>9}")
+
+def executar_escala(escala, args, log_root):
+    sandbox = tempfile.mkdtemp(prefix=f"b3bench_{escala}x_", dir=args.diretorio)
+    log_dir = os.path.join(log_root, f"{escala}x")
+    os.makedirs(log_dir, exist_ok=True)
+    montar_sandbox(sandbox)
+
+    backend = B3Sintetica(escala, seed=args.seed)
+    server = start_server(backend, latency=args.latencia, rate_429=args.taxa_429, retry_after=args.retry_after)
+
+    env = dict(os.environ)
+    env.pop("B3_CASSETE", None)
+    env.update({
+        "B3_BASE_URL": server.base_url,
+        "B3_RATE_LIMIT": str(args.limite),
+        "B3_RATE_BURST": str(args.limite),
+        "B3_RATE_MAX": str(args.limite),
+        "PYTHONIOENCODING": "utf-8"
+    })
+
+    dataset = backend.contagens()
+    etapas = []
+    print(f"\nEscala {escala}x: {dataset} (sandbox em {sandbox})")
+
+    try:
+        if "semestral" in args.pipelines:
+            semestral_dir = os.path.join(sandbox, "Semestral")
+            cotacoes = os.path.join(sandbox, "cotacoesSinteticas.json")
+            print("  Gerando cotações sintéticas...")
+            dataset["cotacoes"] = gerar_cotacoes(cotacoes, backend)
+            env_semestral = dict(env, B3_VALIDACAO="local", B3_COTACOES=cotacoes)
+            for script in ETAPAS_SEMESTRAL:
+                if script in PREPAROS:
+                    PREPAROS[script](semestral_dir)
+                print(f"  Semestral/{script}...")
+                comando = [sys.executable, os.path.join(semestral_dir, "Scripts", script)]
+                etapas.append(executar_etapa("Semestral", script, comando, semestral_dir, env_semestral, sandbox, server, log_dir))
+
+        if "semanal" in args.pipelines:
+            preparar_semanal(sandbox)
+            semanal_dir = os.path.join(sandbox, "Semanal")
+            for script in ETAPAS_SEMANAL:
+                print(f"  Semanal/{script}...")
+                comando = [sys.executable, os.path.join(semanal_dir, "Scripts", script)]
+                etapas.append(executar_etapa("Semanal", script, comando, semanal_dir, env, sandbox, server, log_dir))
+
+        if "diario" in args.pipelines:
+            testando_dir = os.path.join(sandbox, "Diario", "Scripts", "testando")
+            historico = os.path.join(sandbox, "Diario", "historicoSintetico.xlsx")
+            print("  Gerando histórico sintético...")
+            dataset["historico"] = gerar_historico_excel(historico, escala, seed=args.seed)
+            print("  Diario/process_excel.py...")
+            comando = [sys.executable, "-c", DIARIO_CODIGO, historico, os.path.join(sandbox, "Diario", "Finais")]
+            etapas.append(executar_etapa("Diario", "process_excel.py", comando, testando_dir, env, sandbox, server, log_dir))
+    finally:
+        server.shutdown()
+        server.server_close()
+        if args.manter:
+            print(f"Sandbox mantida em {sandbox}")
+        else:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+    rss = [etapa["pico_rss_mb"] for etapa in etapas if etapa["pico_rss_mb"] is not None]
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "escala": escala,
+        "dataset": dataset,
+        "backend": {
+            "latencia": args.latencia,
+            "taxa_429": args.taxa_429,
+            "limite_req_s": args.limite
+        },
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "etapas": etapas,
+        "total": {
+            "tempo_s": round(sum(etapa["tempo_s"] for etapa in etapas), 3),
+            "requisicoes": sum(etapa["requisicoes"] for etapa in etapas),
+            "bytes_escritos": sum(etapa["bytes_escritos"] for etapa in etapas),
+            "pico_rss_mb": max(rss) if rss else None,
+            "falhas": sum(1 for etapa in etapas if etapa["status"] != "Sucesso")
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos pipelines Semestral, Semanal e Diario contra uma B3 sintética")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1, 10, 100],
+                        help="Multiplicadores do tamanho atual da base (padrão: 1 10 100)")
+    parser.add_argument("--pipelines", nargs="+", choices=["semestral", "semanal", "diario"],
+                        default=["semestral", "semanal", "diario"])
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência por requisição do servidor fake, em segundos")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Probabilidade (0-1) de responder 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valor do header Retry-After nas respostas 429")
+    parser.add_argument("--limite", type=float, default=1000.0,
+                        help="Taxa máxima do rate limiter do cliente B3, em req/s (padrão alto para medir o código, não o limite)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", default=RESULTADOS_JSONL, help="Arquivo JSON Lines onde cada escala é acrescentada")
+    parser.add_argument("--diretorio", default=None, help="Onde criar as sandboxes (padrão: pasta temporária do sistema)")
+    parser.add_argument("--manter", action="store_true", help="Não apaga a sandbox ao final (para inspecionar as saídas)")
+    args = parser.parse_args()
+
+    if "semanal" in args.pipelines and "semestral" not in args.pipelines:
+        parser.error("o pipeline semanal usa as saídas do semestral; inclua 'semestral' em --pipelines")
+
+    log_root = os.path.join(BENCH_DIR, "Resultados", "logs", datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+
+    for escala in args.escalas:
+        resultado = executar_escala(escala, args, log_root)
+        with open(args.saida, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        imprimir_resumo(resultado)
+
+    print(f"\nResultados acrescentados em: {args.saida}")
+    print(f"Logs das etapas em: {log_root}")
+
+if __name__ == "__main__":
+    main()
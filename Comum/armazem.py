@@ -0,0 +1,407 @@
+"""SQLite store of assets, ticker codes, dividends and daily quotes, kept next to the JSON files.
+
+The store is an opt-in second copy (B3_BANCO): the JSON files stay the source
+of truth that the stages and the frontend read, and they are still rewritten
+in full on every run. Writing a row here therefore saves no JSON writing; what
+the store adds is indexed queries (by codigoCVM, ticker, dataAprovacao) without
+loading whole files, and the exporters that rebuild the JSON from it.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import date
+
+from comparacao import strip_hash
+from dados import save_json
+from indiceDividendos import bdr_key, empresa_key, fii_key, parse_date
+
+# Banco SQLite com ativos, dividendos e cotações (vazio = só os JSON, como sempre; com ele, os JSON continuam sendo gravados)
+STORE_PATH = os.environ.get("B3_BANCO")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Classe de ativo -> (campo chave, campo nome, listas do arquivo Parcial; None = o arquivo é uma lista)
+ASSET_CLASSES = {
+    "empresas": ("codigoCVM", "nomeEmpresa", ("empresas", "empresas_problema", "empresas_sem_codigo")),
+    "bdrs": ("codigoCVM", "nomeEmpresa", ("bdrs", "bdr_nao_patrocinados")),
+    "etfs": ("codigoETF", "nomeETF", None),
+    "etfs_bdr": ("codigoETF", "nomeETF", None),
+    "fiis": ("codigoFII", "nomeFII", None)
+}
+
+# Classe -> (campo com o nome do titular, chave de deduplicação)
+DIVIDEND_CLASSES = {
+    "empresas": ("nomeEmpresa", empresa_key),
+    "bdrs": ("nomeEmpresa", bdr_key),
+    "fiis": ("nomeFII", fii_key)
+}
+
+# Só as cotações de empresas e BDRs trazem "valor mercado"
+MARKET_CAP_CLASSES = {"empresas", "bdrs"}
+
+# Arquivos de hoje que o banco importa e regenera, relativos à raiz do projeto
+ASSET_FILES = {
+    "empresas": os.path.join("Semestral", "Finais", "Parcial", "empresasParcial.json"),
+    "bdrs": os.path.join("Semestral", "Finais", "Parcial", "bdr.json"),
+    "etfs": os.path.join("Semestral", "Finais", "Parcial", "etf.json"),
+    "etfs_bdr": os.path.join("Semestral", "Finais", "Parcial", "etfBdr.json"),
+    "fiis": os.path.join("Semestral", "Finais", "Parcial", "fiis.json")
+}
+DIVIDEND_FILES = {
+    "empresas": os.path.join("Semanal", "Jsons", "dividendosEmpresas.json"),
+    "bdrs": os.path.join("Semanal", "Jsons", "dividendosBdr.json"),
+    "fiis": os.path.join("Semanal", "Jsons", "dividendosFii.json")
+}
+PRICE_FILES = {
+    "empresas": os.path.join("Diario", "Finais", "empresas.json"),
+    "bdrs": os.path.join("Diario", "Finais", "bdrs.json"),
+    "etfs": os.path.join("Diario", "Finais", "etf.json"),
+    "etfs_bdr": os.path.join("Diario", "Finais", "etfBdr.json"),
+    "fiis": os.path.join("Diario", "Finais", "fiis.json")
+}
+
+# Os números das cotações ficam em colunas sem tipo: o SQLite devolve int ou float como vieram do JSON
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS codigos (
+    classe TEXT NOT NULL, chave TEXT NOT NULL, lista TEXT NOT NULL, ticker TEXT NOT NULL,
+    PRIMARY KEY (classe, chave, lista, ticker)
+);
+CREATE INDEX IF NOT EXISTS codigos_ticker ON codigos (ticker);
+
+CREATE TABLE IF NOT EXISTS titulares_dividendos (
+    classe TEXT NOT NULL, titular TEXT NOT NULL, quantidade TEXT,
+    PRIMARY KEY (classe, titular)
+);
+CREATE TABLE IF NOT EXISTS dividendos (
+    classe TEXT NOT NULL, titular TEXT NOT NULL, chave TEXT NOT NULL, ordem INTEGER NOT NULL,
+    dataAprovacao TEXT, dados TEXT NOT NULL,
+    PRIMARY KEY (classe, titular, chave, ordem)
+);
+CREATE INDEX IF NOT EXISTS dividendos_dataAprovacao ON dividendos (classe, dataAprovacao);
+
+CREATE TABLE IF NOT EXISTS titulares_precos (
+    classe TEXT NOT NULL, data TEXT NOT NULL, titular TEXT NOT NULL, dados TEXT NOT NULL,
+    PRIMARY KEY (classe, data, titular)
+);
+CREATE TABLE IF NOT EXISTS precos (
+    classe TEXT NOT NULL, data TEXT NOT NULL, ticker TEXT NOT NULL, titular TEXT NOT NULL,
+    preco, valorMercado, precoAnterior, variacao,
+    PRIMARY KEY (classe, data, ticker)
+);
+CREATE INDEX IF NOT EXISTS precos_ticker ON precos (ticker, data);
+"""
+
+ASSET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {classe} (
+    chave TEXT NOT NULL, lista TEXT NOT NULL, codigoCVM TEXT, nome TEXT, dados TEXT NOT NULL,
+    PRIMARY KEY (chave, lista)
+);
+CREATE INDEX IF NOT EXISTS {classe}_codigoCVM ON {classe} (codigoCVM);
+"""
+
+def tickers_of(record):
+    """Ticker codes of a Parcial record ("codigos" list or "codigo" string/list)"""
+    codes = record.get("codigos", record.get("codigo"))
+    if isinstance(codes, str):
+        codes = [codes]
+    return [code for code in codes or [] if code]
+
+def iso_date(value):
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else None
+
+class AssetStore:
+    """SQLite store for assets, ticker codes, dividends and daily price snapshots.
+
+    Writes are row-level UPSERTs; the export_* methods rebuild the JSON shapes
+    the frontend reads today, in the order the rows were first written. Each
+    public write commits on its own; one connection per thread.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or STORE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA + "".join(ASSET_SCHEMA.format(classe=classe) for classe in ASSET_CLASSES))
+
+    def close(self):
+        self.conn.close()
+
+    # Ativos e códigos de negociação
+
+    def _upsert_asset(self, classe, record, lista):
+        key_field, name_field, _ = ASSET_CLASSES[classe]
+        key = str(record[key_field])
+        # Linha igual à do banco: nada é regravado, nem os códigos
+        changed = self.conn.execute(
+            f"INSERT INTO {classe} (chave, lista, codigoCVM, nome, dados) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chave, lista) DO UPDATE SET codigoCVM = excluded.codigoCVM, nome = excluded.nome, "
+            "dados = excluded.dados WHERE dados IS NOT excluded.dados",
+            (key, lista, record.get("codigoCVM"), record.get(name_field),
+             json.dumps(strip_hash(record), ensure_ascii=False))).rowcount
+        if changed:
+            self.conn.execute("DELETE FROM codigos WHERE classe = ? AND chave = ? AND lista = ?", (classe, key, lista))
+            self.conn.executemany("INSERT OR IGNORE INTO codigos (classe, chave, lista, ticker) VALUES (?, ?, ?, ?)",
+                                  [(classe, key, lista, ticker) for ticker in tickers_of(record)])
+        return key
+
+    def import_assets(self, classe, data):
+        """Bring the class in line with a Parcial file (list, or dict of lists).
+
+        Each record is upserted under its key and the list of the file it is in
+        (a company can be both in "empresas" and, with other tickers, in
+        "empresas_problema"); unchanged rows are left alone and only the rows
+        no longer in the file are deleted.
+        """
+        with self.conn:
+            groups = data.items() if isinstance(data, dict) else [("", data)]
+            present = set()
+            for lista, records in groups:
+                for record in records:
+                    present.add((self._upsert_asset(classe, record, lista), lista))
+            stale = [row for row in self.conn.execute(f"SELECT chave, lista FROM {classe}").fetchall()
+                     if row not in present]
+            self.conn.executemany(f"DELETE FROM {classe} WHERE chave = ? AND lista = ?", stale)
+            self.conn.executemany("DELETE FROM codigos WHERE classe = ? AND chave = ? AND lista = ?",
+                                  [(classe, key, lista) for key, lista in stale])
+
+    def export_assets(self, classe):
+        """The class as its Parcial file: a list, or a dict of lists for empresas and BDRs"""
+        lists = ASSET_CLASSES[classe][2]
+        rows = self.conn.execute(f"SELECT lista, dados FROM {classe} ORDER BY rowid").fetchall()
+        if lists is None:
+            return [json.loads(dados) for _, dados in rows]
+        result = {lista: [] for lista in lists}
+        for lista, dados in rows:
+            result.setdefault(lista, []).append(json.loads(dados))
+        return result
+
+    def asset_by_cvm(self, classe, codigo_cvm):
+        """The first asset of the class with that codigoCVM, or None"""
+        row = self.conn.execute(f"SELECT dados FROM {classe} WHERE codigoCVM = ? ORDER BY rowid",
+                                (str(codigo_cvm),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_ticker(self, ticker):
+        """[(classe, record)] of the assets trading under `ticker`"""
+        found = []
+        for classe, key, lista in self.conn.execute(
+                "SELECT classe, chave, lista FROM codigos WHERE ticker = ?", (ticker,)).fetchall():
+            row = self.conn.execute(f"SELECT dados FROM {classe} WHERE chave = ? AND lista = ?", (key, lista)).fetchone()
+            if row:
+                found.append((classe, json.loads(row[0])))
+        return found
+
+    # Dividendos
+
+    def _add_dividends(self, classe, titular, dividends, quantidade):
+        key_of = DIVIDEND_CLASSES[classe][1]
+        self.conn.execute(
+            "INSERT INTO titulares_dividendos (classe, titular, quantidade) VALUES (?, ?, ?) "
+            "ON CONFLICT (classe, titular) DO UPDATE SET quantidade = COALESCE(excluded.quantidade, quantidade)",
+            (classe, titular, quantidade))
+        # Chaves se repetem (vários dividendos aprovados no mesmo dia): "ordem" numera as repetições
+        counts = dict(self.conn.execute(
+            "SELECT chave, COUNT(*) FROM dividendos WHERE classe = ? AND titular = ? GROUP BY chave",
+            (classe, titular)).fetchall())
+        rows = []
+        for div in dividends:
+            key = key_of(div)
+            order = counts.get(key, 0)
+            counts[key] = order + 1
+            rows.append((classe, titular, key, order, iso_date(div.get("dataAprovacao")),
+                         json.dumps(div, ensure_ascii=False)))
+        self.conn.executemany(
+            "INSERT INTO dividendos (classe, titular, chave, ordem, dataAprovacao, dados) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (classe, titular, chave, ordem) DO UPDATE SET "
+            "dataAprovacao = excluded.dataAprovacao, dados = excluded.dados", rows)
+
+    def add_dividends(self, classe, titular, dividends, quantidade=None):
+        """Append dividends merged for a holder (and set the FII quantidade, when given)"""
+        with self.conn:
+            self._add_dividends(classe, titular, dividends, quantidade)
+
+    def import_dividends(self, classe, records):
+        """Replace every dividend of the class with a dividendos*.json file"""
+        name_field = DIVIDEND_CLASSES[classe][0]
+        with self.conn:
+            self.conn.execute("DELETE FROM dividendos WHERE classe = ?", (classe,))
+            self.conn.execute("DELETE FROM titulares_dividendos WHERE classe = ?", (classe,))
+            for record in records:
+                self._add_dividends(classe, record[name_field], record.get("dividendos", []), record.get("quantidade"))
+
+    def export_dividends(self, classe):
+        """The class as its dividendos*.json file"""
+        name_field = DIVIDEND_CLASSES[classe][0]
+        dividends = {}
+        for titular, dados in self.conn.execute(
+                "SELECT titular, dados FROM dividendos WHERE classe = ? ORDER BY rowid", (classe,)):
+            dividends.setdefault(titular, []).append(json.loads(dados))
+        result = []
+        for titular, quantidade in self.conn.execute(
+                "SELECT titular, quantidade FROM titulares_dividendos WHERE classe = ? ORDER BY rowid", (classe,)):
+            record = {name_field: titular}
+            if classe == "fiis":
+                record["quantidade"] = quantidade
+            record["dividendos"] = dividends.get(titular, [])
+            result.append(record)
+        return result
+
+    def dividends_approved_since(self, classe, since):
+        """[(titular, dividend)] approved on or after the date `since`"""
+        rows = self.conn.execute(
+            "SELECT titular, dados FROM dividendos WHERE classe = ? AND dataAprovacao >= ? ORDER BY dataAprovacao",
+            (classe, since.isoformat()))
+        return [(titular, json.loads(dados)) for titular, dados in rows]
+
+    # Cotações do Diario
+
+    def upsert_prices(self, classe, snapshot, day=None):
+        """Store a Diario/Finais snapshot as the prices of `day` (today by default)"""
+        day = (day or date.today()).isoformat()
+        with self.conn:
+            for record in snapshot:
+                header = {field: value for field, value in record.items() if field != "codigos"}
+                self.conn.execute(
+                    "INSERT INTO titulares_precos (classe, data, titular, dados) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (classe, data, titular) DO UPDATE SET dados = excluded.dados",
+                    (classe, day, record["nome"], json.dumps(header, ensure_ascii=False)))
+                self.conn.executemany(
+                    "INSERT INTO precos (classe, data, ticker, titular, preco, valorMercado, precoAnterior, variacao) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (classe, data, ticker) DO UPDATE SET "
+                    "titular = excluded.titular, preco = excluded.preco, valorMercado = excluded.valorMercado, "
+                    "precoAnterior = excluded.precoAnterior, variacao = excluded.variacao",
+                    [(classe, day, code["codigo"], record["nome"], code.get("preco"), code.get("valor mercado"),
+                      code.get("precoAnterior"), code.get("variacao")) for code in record.get("codigos", [])])
+
+    def latest_price_day(self, classe):
+        return self.conn.execute("SELECT MAX(data) FROM titulares_precos WHERE classe = ?", (classe,)).fetchone()[0]
+
+    def export_prices(self, classe, day=None):
+        """The snapshot of `day` (the latest one by default) as its Diario/Finais file"""
+        day = day.isoformat() if day else self.latest_price_day(classe)
+        codes = {}
+        for titular, ticker, preco, valor_mercado, preco_anterior, variacao in self.conn.execute(
+                "SELECT titular, ticker, preco, valorMercado, precoAnterior, variacao FROM precos "
+                "WHERE classe = ? AND data = ? ORDER BY rowid", (classe, day)):
+            code = {"codigo": ticker, "preco": preco}
+            if classe in MARKET_CAP_CLASSES:
+                code["valor mercado"] = valor_mercado
+            code["precoAnterior"] = preco_anterior
+            code["variacao"] = variacao
+            codes.setdefault(titular, []).append(code)
+        result = []
+        for titular, dados in self.conn.execute(
+                "SELECT titular, dados FROM titulares_precos WHERE classe = ? AND data = ? ORDER BY rowid", (classe, day)):
+            record = json.loads(dados)
+            record["codigos"] = codes.get(titular, [])
+            result.append(record)
+        return result
+
+    def price_history(self, ticker):
+        """[(data ISO, preco)] of a ticker, oldest first"""
+        return self.conn.execute("SELECT data, preco FROM precos WHERE ticker = ? ORDER BY data", (ticker,)).fetchall()
+
+def _import_files(files, load, root):
+    for classe, relative in files.items():
+        path = os.path.join(root, relative)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                load(classe, json.load(f))
+            print(f"Importado para o banco: {relative}")
+
+def import_assets(store, root=ROOT_DIR):
+    """Store the Semestral/Finais/Parcial files of a run"""
+    _import_files(ASSET_FILES, store.import_assets, root)
+
+def import_dividends(store, root=ROOT_DIR):
+    """Replace the dividends in the store with the Semanal/Jsons files"""
+    _import_files(DIVIDEND_FILES, store.import_dividends, root)
+
+def import_prices(store, root=ROOT_DIR, day=None, classes=None):
+    """Store the Diario/Finais snapshots of a run as the prices of `day` (today by default).
+
+    `classes` limits the import to those classes (the scripts that succeeded).
+    """
+    files = {classe: relative for classe, relative in PRICE_FILES.items() if classes is None or classe in classes}
+    _import_files(files, lambda classe, snapshot: store.upsert_prices(classe, snapshot, day), root)
+
+def import_all(store, root=ROOT_DIR):
+    """Load every JSON file of the project into the store (first use of the store)"""
+    import_assets(store, root)
+    import_dividends(store, root)
+    import_prices(store, root)
+
+def export_all(store, destination):
+    """Write the JSON files of today from the store, with the same relative paths"""
+    exports = [(ASSET_FILES, store.export_assets, 4), (DIVIDEND_FILES, store.export_dividends, 4),
+               (PRICE_FILES, store.export_prices, 2)]
+    for files, export, indent in exports:
+        for classe, relative in files.items():
+            data = export(classe)
+            if not data or (isinstance(data, dict) and not any(data.values())):
+                # Nada dessa classe no banco: não sobrescreve o arquivo com uma lista vazia
+                continue
+            path = os.path.join(destination, relative)
+            save_json(path, data, indent=indent)
+            print(f"Exportado: {path}")
+
+def query(store, args):
+    """Result of a consultar command, as JSON-ready data"""
+    if args.consulta == "ticker":
+        return [{"classe": classe, "ativo": record} for classe, record in store.find_ticker(args.valor)]
+    if args.consulta == "cvm":
+        return store.asset_by_cvm(args.classe or "empresas", args.valor)
+    if args.consulta == "dividendos":
+        since = parse_date(args.valor)
+        if since is None:
+            raise ValueError(f"Data inválida (use dd/mm/aaaa): {args.valor}")
+        return [{"titular": titular, "dividendo": div}
+                for titular, div in store.dividends_approved_since(args.classe or "empresas", since)]
+    return [{"data": day, "preco": price} for day, price in store.price_history(args.valor)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco SQLite com ativos, dividendos e cotações")
+    parser.add_argument("acao", choices=["importar", "exportar", "consultar"],
+                        help="importar: carrega os JSON do projeto no banco; exportar: regenera os JSON a partir do banco; "
+                             "consultar: busca no banco pelos índices")
+    parser.add_argument("consulta", nargs="?", choices=["ticker", "cvm", "dividendos", "historico"],
+                        help="Com consultar: ativos de um ticker, ativo de um codigoCVM, dividendos aprovados "
+                             "desde uma data (dd/mm/aaaa) ou preços de um ticker")
+    parser.add_argument("valor", nargs="?", help="Ticker, codigoCVM ou data da consulta")
+    parser.add_argument("--classe", choices=list(ASSET_CLASSES),
+                        help="Classe das consultas cvm e dividendos (padrão: empresas)")
+    parser.add_argument("--banco", default=STORE_PATH, help="Arquivo SQLite (padrão: B3_BANCO)")
+    parser.add_argument("--raiz", default=ROOT_DIR, help="Raiz do projeto de onde os JSON são importados")
+    parser.add_argument("--destino", default=ROOT_DIR, help="Pasta onde os JSON são exportados")
+    args = parser.parse_args()
+
+    if not args.banco:
+        print("Informe o banco com --banco ou B3_BANCO")
+        sys.exit(1)
+    if args.acao == "consultar" and (args.consulta is None or args.valor is None):
+        parser.error("consultar precisa do tipo de consulta e do valor")
+    if args.acao == "consultar" and args.consulta == "dividendos" and args.classe not in (None, *DIVIDEND_CLASSES):
+        parser.error(f"dividendos só existem para {', '.join(DIVIDEND_CLASSES)}")
+
+    store = AssetStore(args.banco)
+    try:
+        if args.acao == "importar":
+            import_all(store, args.raiz)
+        elif args.acao == "exportar":
+            export_all(store, args.destino)
+        else:
+            try:
+                result = query(store, args)
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rateLimiter import AdaptiveRateLimiter
+from cassete import Cassete
+
+# Disable SSL warning (B3 endpoints are called with verify=False)
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Endpoints (B3_BASE_URL aponta os scripts para o servidor fake, ver servidorB3Fake.py)
+BASE_URL = os.environ.get("B3_BASE_URL", "https://sistemaswebb3-listados.b3.com.br")
+COMPANIES_PROXY = "listedCompaniesProxy/CompanyCall"
+FUNDS_PROXY = "fundsProxy/fundsCall"
+
+# Configuração do pool de conexões e da política de retry
+POOL_SIZE = int(os.environ.get("B3_POOL_SIZE", 10))
+MAX_RETRIES = int(os.environ.get("B3_MAX_RETRIES", 3))
+BACKOFF_FACTOR = float(os.environ.get("B3_BACKOFF_FACTOR", 1))
+TIMEOUT = float(os.environ.get("B3_TIMEOUT", 30))
+# 429/503 ficam de fora: quem trata é o rate limiter adaptativo
+STATUS_FORCELIST = [500, 502, 504]
+THROTTLE_STATUS = [429, 503]
+
+# Orçamento global de requisições (por segundo) compartilhado por todos os workers
+RATE_LIMIT = float(os.environ.get("B3_RATE_LIMIT", 2))
+RATE_BURST = float(os.environ.get("B3_RATE_BURST", 2))
+RATE_MIN = float(os.environ.get("B3_RATE_MIN", 0.2))
+RATE_MAX = float(os.environ.get("B3_RATE_MAX", 10))
+MAX_WORKERS = int(os.environ.get("B3_MAX_WORKERS", 4))
+
+_session = None
+_session_lock = threading.Lock()
+_limiter = AdaptiveRateLimiter(RATE_LIMIT, RATE_BURST, min_rate=RATE_MIN, max_rate=RATE_MAX)
+
+# Gravação: com B3_CASSETE definido, toda resposta é gravada nesse arquivo (.jsonl.gz)
+CASSETE_PATH = os.environ.get("B3_CASSETE")
+_cassete = Cassete(CASSETE_PATH) if CASSETE_PATH else None
+
+def encode_params(params):
+    """Encode request params as base64 JSON, the format used by the B3 proxies"""
+    params_str = json.dumps(params)
+    return base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
+
+def decode_params(encoded_params):
+    """Decode a base64 payload back into its params dict"""
+    return json.loads(base64.b64decode(encoded_params.encode('utf-8')).decode('utf-8'))
+
+def companies_url(method, params):
+    """Build a listedCompaniesProxy URL (GetInitialCompanies, GetDetail, ...)"""
+    return f"{BASE_URL}/{COMPANIES_PROXY}/{method}/{encode_params(params)}"
+
+def funds_url(method, params):
+    """Build a fundsProxy URL (GetListedFundsSIG, GetDetailFundSIG, ...)"""
+    return f"{BASE_URL}/{FUNDS_PROXY}/{method}/{encode_params(params)}"
+
+def create_session(pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """Create a keep-alive session with a connection pool and retry strategy"""
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=STATUS_FORCELIST,
+        # Retry-After is honoured by the shared limiter, not per connection
+        respect_retry_after_header=False,
+        # Return the last response instead of raising, so callers still see the HTTPError
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry_strategy)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.verify = False
+    return session
+
+def get_session():
+    """Return the process-wide shared session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+def get_limiter():
+    """Return the process-wide rate limiter shared by every B3 call"""
+    return _limiter
+
+def get_metrics():
+    """Current request rate and throttle counters of the shared limiter"""
+    return _limiter.metrics()
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def get(url, session=None, max_retries=MAX_RETRIES):
+    """GET a B3 URL through the pooled session, adapting the global rate to 429/503 responses"""
+    if session is None:
+        session = get_session()
+    for attempt in range(max_retries + 1):
+        _limiter.acquire()
+        response = session.get(url, verify=False, timeout=TIMEOUT)
+        # Medição das etapas (perfil.py): a resposta conta para a etapa desta thread
+        perfil = sys.modules.get("perfil")
+        if perfil is not None:
+            perfil.count_http(len(response.content))
+        if response.status_code not in THROTTLE_STATUS:
+            _limiter.on_success()
+            if _cassete is not None:
+                _cassete.record(url, response.status_code, response.text)
+            return response
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        rate = _limiter.on_throttle(retry_after)
+        print(f"\nRate limit hit ({response.status_code}), nova taxa: {rate:.2f} req/s")
+    return response
+
+def get_json(url, session=None):
+    """GET a B3 URL, raise on HTTP errors and return the decoded JSON"""
+    response = get(url, session)
+    response.raise_for_status()
+    return response.json()
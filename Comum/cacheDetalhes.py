@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+from dados import save_json
+
+DAY = 86400
+
+# Validade de uma resposta do GetDetail, em dias. Todos os campos vêm na mesma
+# resposta e são buscados juntos; com a coleta semestral, cada detalhe é buscado
+# de novo a cada duas execuções
+TTL_DAYS = 365
+
+# Campos do GetInitialCompanies/GetCompaniesBDR que, se mudarem, forçam uma nova busca do detalhe
+SUMMARY_FIELDS = ("tradingName", "segment", "status")
+
+def summary_of(listing):
+    return {field: listing.get(field) for field in SUMMARY_FIELDS}
+
+class DetailCache:
+    """Persistent GetDetail cache keyed by codeCVM.
+
+    An entry is reused while it is younger than the TTL and the listing
+    summary (tradingName, segment, status) is the one it was fetched with;
+    otherwise the caller refetches and calls put(). A field missing from a
+    response stays missing until the entry expires.
+    """
+
+    def __init__(self, path, ttl_days=TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * DAY
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.updated = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def _expired(self, entry, now):
+        fetched_at = entry.get("buscadoEm")
+        # Entradas do formato antigo (uma data por campo) são buscadas de novo uma vez
+        return not isinstance(fetched_at, (int, float)) or now - fetched_at > self.ttl
+
+    def get(self, code_cvm, listing):
+        """Cached details if fresh and the listing summary is unchanged, else None"""
+        entry = self.entries.get(str(code_cvm))
+        if entry is None or entry["resumo"] != summary_of(listing) or self._expired(entry, time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["detalhes"]
+
+    def put(self, code_cvm, listing, details):
+        self.updated += 1
+        self.entries[str(code_cvm)] = {
+            "resumo": summary_of(listing),
+            "detalhes": details,
+            "buscadoEm": time.time()
+        }
+
+    def prune(self, codes_cvm):
+        """Drop entries for companies no longer listed"""
+        keep = {str(code) for code in codes_cvm}
+        self.entries = {code: entry for code, entry in self.entries.items() if code in keep}
+
+    def save(self):
+        save_json(self.path, self.entries, compact=True)
@@ -0,0 +1,97 @@
+import atexit
+import base64
+import binascii
+import gzip
+import json
+import os
+import tempfile
+import threading
+import zlib
+from urllib.parse import unquote, urlsplit
+
+def request_key(url):
+    """Key a B3 request by endpoint plus its decoded base64 payload (keys sorted)"""
+    path = urlsplit(url).path.strip('/')
+    endpoint, _, payload = path.rpartition('/')
+    try:
+        params = json.loads(base64.b64decode(unquote(payload)).decode('utf-8'))
+        payload = json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        pass
+    return f"{endpoint}/{payload}"
+
+class Cassete:
+    """Request/response store kept as gzipped JSON Lines, one entry per B3 request.
+
+    Recording keeps one gzip writer open (closed at exit) and flushes it after
+    each entry, so a crash only loses the entry being written; load() drops
+    such a cut-off tail.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.file = None
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        complete = True
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        complete = False
+                        break
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError):
+            complete = False
+        if not complete:
+            # Regrava só as entradas completas, para não gravar as próximas depois de um final cortado
+            print(f"Cassete {self.path}: final incompleto descartado ({len(self.entries)} respostas mantidas)")
+            self._rewrite()
+
+    def _rewrite(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # mkstemp cria o arquivo só para o dono: mantém as permissões do arquivo substituído
+        mode = os.stat(self.path).st_mode & 0o777
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, 'wb'), 'wt', encoding='utf-8') as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+            os.chmod(temp_path, mode)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def record(self, url, status, body):
+        """Store a response; later recordings of the same key win on load"""
+        entry = {"key": request_key(url), "status": status, "body": body}
+        with self.lock:
+            self.entries[entry["key"]] = entry
+            if self.file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.file = gzip.open(self.path, 'at', encoding='utf-8')
+                atexit.register(self.close)
+            self.file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+            # Z_SYNC_FLUSH: a entrada já pode ser lida do disco mesmo se o processo morrer antes do close()
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def lookup(self, url):
+        """Return the recorded entry for a URL or path, or None"""
+        return self.entries.get(request_key(url))
+
+    def __len__(self):
+        return len(self.entries)
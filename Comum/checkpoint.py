@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import threading
+
+# Registros entre cada fsync do journal
+FSYNC_EVERY = int(os.environ.get("B3_CHECKPOINT_FSYNC", 50))
+
+def resume_requested(argv=None):
+    """True when the script was started with --resume (run_all_semestral.py --resume passes it on)"""
+    return "--resume" in (sys.argv[1:] if argv is None else argv)
+
+class Checkpoint:
+    """Append-only JSON Lines journal of finished entities, keyed by entity ID.
+
+    Without `resume` any previous journal is discarded. With it, finished entries
+    are loaded (a line cut short by a crash is dropped) and new ones are appended.
+    The file is fsynced every `fsync_every` records and on close.
+    """
+
+    def __init__(self, path, resume=False, fsync_every=FSYNC_EVERY):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.done = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if resume and os.path.exists(path):
+            self.load()
+        elif os.path.exists(path):
+            os.remove(path)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def load(self):
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self.done[entry["id"]] = entry["dados"]
+                good_offset += len(line)
+        # Descarta o que sobrou depois do último registro completo, para não colar o próximo nele
+        with open(self.path, 'r+b') as f:
+            f.truncate(good_offset)
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def get(self, key, default=None):
+        return self.done.get(key, default)
+
+    def record(self, key, value):
+        with self.lock:
+            self.file.write(json.dumps({"id": key, "dados": value}, ensure_ascii=False) + "\n")
+            self.done[key] = value
+            self.pending += 1
+            if self.pending >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+    def clear(self):
+        """Remove the journal once the run finished and its results are saved"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+
+from dados import file_signature, save_json
+
+# Campo com o hash que versões anteriores gravavam dentro de cada registro (hoje os
+# hashes ficam num arquivo ao lado, ver save_hashes); ignorado e descartado
+HASH_FIELD = "hash"
+
+def content_hash(record):
+    """BLAKE2b of the record's canonical JSON (sorted keys, compact), ignoring the hash field"""
+    content = {field: value for field, value in record.items() if field != HASH_FIELD}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+def strip_hash(record):
+    """The record without the legacy embedded hash field"""
+    if HASH_FIELD not in record:
+        return record
+    return {field: value for field, value in record.items() if field != HASH_FIELD}
+
+def hashes_path(path):
+    """Sidecar file with the content hashes of the records written to `path`"""
+    return os.path.splitext(path)[0] + ".hashes.json"
+
+def load_hashes(path, *related):
+    """Hashes saved by save_hashes for `path`, and whether `path` and `related` are still as then written.
+
+    The hashes describe what the script wrote last time, so they stay valid
+    for the comparison even when a later stage edited the file; only the
+    decision to skip rewriting it needs the files untouched.
+    """
+    index_path = hashes_path(path)
+    if not os.path.exists(index_path):
+        return {}, False
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except ValueError:
+        return {}, False
+    untouched = index.get("origem") == [file_signature(p) for p in (path,) + related]
+    return index.get("hashes", {}), untouched
+
+def save_hashes(hashes, path, *related):
+    """Store the hashes of the records just written to `path` (and `related`), tied to those files"""
+    save_json(hashes_path(path), {"origem": [file_signature(p) for p in (path,) + related], "hashes": hashes},
+              compact=True)
+
+def field_changes(old, new, prefix=""):
+    """List (field, old value, new value) for every differing field; nested dicts use dotted paths"""
+    changes = []
+    for field in list(old) + [field for field in new if field not in old]:
+        if field == HASH_FIELD and not prefix:
+            continue
+        path = f"{prefix}{field}"
+        old_value = old.get(field)
+        new_value = new.get(field)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changes.extend(field_changes(old_value, new_value, path + "."))
+        elif old_value != new_value:
+            changes.append((path, old_value, new_value))
+    return changes
+
+def describe_changes(fields):
+    """One report line per changed field"""
+    return [
+        f"{path}: {json.dumps(old_value, ensure_ascii=False)} -> {json.dumps(new_value, ensure_ascii=False)}"
+        for path, old_value, new_value in fields
+    ]
+
+def index_by(records, key="codigoCVM"):
+    """Index records by `key`; on duplicates the last record wins"""
+    return {record[key]: record for record in records}
+
+def diff_records(old_records, new_records, key="codigoCVM", hashes=None):
+    """Compare two record lists by `key` in linear time.
+
+    Each new record is hashed once and compared with the previous record's
+    hash from `hashes` (see load_hashes), falling back to hashing the previous
+    record when none is stored; matching records are skipped without looking
+    at their fields, the rest get a field-level diff. Returns {"added": [...],
+    "removed": [...], "changed": [(old, new, fields), ...], "hashes": {key:
+    hash}, "stale": n}, where `hashes` is what save_hashes should store and
+    `stale` counts previous records with no stored hash or still carrying the
+    legacy embedded one. `added` and `changed` follow the order of
+    `new_records`, `removed` the order of `old_records`.
+    """
+    old_index = index_by(old_records, key)
+    hashes = hashes or {}
+    new_hashes = {}
+    added = []
+    changed = []
+    stale = 0
+
+    for record in new_records:
+        record_key = record[key]
+        new_hashes[record_key] = content_hash(record)
+        old_record = old_index.get(record_key)
+        if old_record is None:
+            added.append(record)
+            continue
+        old_hash = hashes.get(str(record_key))
+        if old_hash is None or HASH_FIELD in old_record:
+            stale += 1
+            if old_hash is None:
+                old_hash = content_hash(old_record)
+        if old_hash != new_hashes[record_key]:
+            changed.append((old_record, record, field_changes(old_record, record)))
+
+    removed = [record for record_key, record in old_index.items() if record_key not in new_hashes]
+    return {"added": added, "removed": removed, "changed": changed, "hashes": new_hashes, "stale": stale}
+
+def has_changes(diff):
+    return bool(diff["added"] or diff["removed"] or diff["changed"])
+
+def needs_rewrite(diff, untouched=True):
+    """True unless every record and its stored hash are already up to date on disk.
+
+    `untouched` is load_hashes' second value: False when another stage edited
+    the files since they were written.
+    """
+    return has_changes(diff) or diff["stale"] > 0 or not untouched
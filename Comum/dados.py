@@ -0,0 +1,144 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# B3_JSON_COMPACTO=1 grava todos os JSON sem indentação (menores, para consumo só por máquina)
+COMPACT = os.environ.get("B3_JSON_COMPACTO") == "1"
+
+# JSONs já lidos ou gravados neste processo: caminho -> (mtime_ns, tamanho, texto)
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+def file_signature(path):
+    """mtime and size of a file, to tell whether an index saved beside it still matches it"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def load_json(path):
+    """Parsed JSON file, read from disk once per process.
+
+    When the stages run in the same process (run_all_*.py), the text of the
+    file is kept after the first read (or after save_json wrote it) and later
+    readers parse it from memory, as long as the file on disk has not changed
+    since. Each call returns its own objects, free to change.
+    """
+    key = os.path.abspath(path)
+    version = _file_version(key)
+    with _datasets_lock:
+        cached = _datasets.get(key)
+    if cached is None or cached[:2] != version:
+        with open(key, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # Medição das etapas (perfil.py): o texto é lido sem passar pelo json.load que ela intercepta
+        perfil = sys.modules.get("perfil")
+        if perfil is not None:
+            perfil.count_json_read(version[1])
+        cached = version + (text,)
+        with _datasets_lock:
+            _datasets[key] = cached
+    return json.loads(cached[2])
+
+# Níveis de lista/dict gravados elemento a elemento (o primeiro cobre listas e dicts de listas)
+STREAM_DEPTH = 2
+
+def _write_value(f, value, indent, level, depth):
+    """Write `value` nested at `level` with json.dump's layout, streaming containers down to `depth` levels"""
+    if isinstance(value, dict):
+        # Como no json.dump, chaves que não são texto viram texto ("1", "true", "null")
+        items = ((json.dumps(key if isinstance(key, str) else json.dumps(key), ensure_ascii=False), item)
+                 for key, item in value.items())
+        opening, closing = "{", "}"
+    elif depth > 0 and not isinstance(value, (str, bytes)) and hasattr(value, "__iter__"):
+        items = ((None, item) for item in value)
+        opening, closing = "[", "]"
+    else:
+        items = None
+
+    if items is None or depth == 0:
+        if indent is None:
+            f.write(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+        else:
+            # Strings JSON não têm quebra de linha crua: cada "\n" é uma linha do documento
+            text = json.dumps(value, ensure_ascii=False, indent=indent)
+            f.write(text.replace("\n", "\n" + " " * (indent * level)))
+        return
+
+    inner = "" if indent is None else "\n" + " " * (indent * (level + 1))
+    colon = ":" if indent is None else ": "
+    f.write(opening)
+    first = True
+    for key, item in items:
+        f.write(inner if first else "," + inner)
+        first = False
+        if key is not None:
+            f.write(key + colon)
+        _write_value(f, item, indent, level + 1, depth - 1)
+    if not first and indent is not None:
+        f.write("\n" + " " * (indent * level))
+    f.write(closing)
+
+class _Tee:
+    """Text file stand-in that also keeps what was written"""
+
+    def __init__(self, f, chunks):
+        self.f = f
+        self.chunks = chunks
+
+    def write(self, text):
+        self.chunks.append(text)
+        return self.f.write(text)
+
+def save_json(path, data, indent=4, compact=None):
+    """Write JSON atomically: stream to a temp file beside `path`, fsync, then rename over it.
+
+    Lists (or generators), dicts and the lists inside them are written one
+    element at a time, with the same layout as json.dump(data, f,
+    ensure_ascii=False, indent=indent). A crash mid-write leaves the previous
+    file intact. `compact` (default: B3_JSON_COMPACTO) drops the indentation.
+
+    The text of a list or dict is kept for load_json, so the next stage of
+    this process reads `path` without going back to the disk.
+    """
+    if compact if compact is not None else COMPACT:
+        indent = None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # mkstemp cria o arquivo só para o dono: mantém as permissões do arquivo substituído
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        # Geradores (exportações grandes) continuam só em disco: guardar o texto desfaria o streaming
+        chunks = [] if isinstance(data, (list, dict)) else None
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            _write_value(f if chunks is None else _Tee(f, chunks), data, indent, 0, STREAM_DEPTH)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Garante que a troca de nome também chegou ao disco
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    if chunks is not None:
+        key = os.path.abspath(path)
+        with _datasets_lock:
+            _datasets[key] = _file_version(key) + ("".join(chunks),)
+    # Medição das etapas (perfil.py): a gravação não passa pelo json.dump que ela intercepta
+    perfil = sys.modules.get("perfil")
+    if perfil is not None:
+        perfil.count_json_written(os.path.getsize(path))
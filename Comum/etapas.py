@@ -0,0 +1,191 @@
+import ast
+import importlib.util
+import inspect
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from perfil import measure
+
+# Função que um script expõe para poder rodar dentro do processo do run_all_*.py
+ENTRY_POINT = "main"
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+# Etapas rodando agora no processo; o pico de RSS de uma etapa que dividiu o processo
+# com outra (execução paralela) inclui o consumo da outra (as demais medidas são por etapa)
+_active_stages = {}
+_active_lock = threading.Lock()
+
+# sys.stdout, sys.stderr e Thread.start originais, trocados só enquanto alguma etapa roda
+_output_lock = threading.Lock()
+_output_stages = 0
+_original_output = None
+
+class _ThreadOutput:
+    """sys.stdout/sys.stderr stand-in that sends each thread's output to its own file, when set.
+
+    Threads started by a redirected thread (the ThreadPoolExecutors of a
+    stage) inherit its file, see _start_with_stage_output.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def file(self):
+        file = getattr(self.local, "file", None)
+        if file is None:
+            file = getattr(threading.current_thread(), "_stage_output", {}).get(self)
+        return file
+
+    def target(self):
+        return self.file() or self.default
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+def _start_with_stage_output(thread):
+    """Thread.start that hands the starting thread's output files down to the new thread"""
+    thread._stage_output = {stream: stream.file() for stream in (sys.stdout, sys.stderr)
+                            if isinstance(stream, _ThreadOutput)}
+    return _original_output[2](thread)
+
+def _redirect_thread_output(file):
+    """Send this thread's prints, and those of the threads it starts, to `file` until _restore_thread_output()"""
+    global _output_stages, _original_output
+    with _output_lock:
+        if _output_stages == 0:
+            _original_output = sys.stdout, sys.stderr, threading.Thread.start
+            sys.stdout, sys.stderr = _ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr)
+            threading.Thread.start = _start_with_stage_output
+        _output_stages += 1
+        sys.stdout.local.file = sys.stderr.local.file = file
+
+def _restore_thread_output():
+    """Send this thread's prints back to the console; the last stage to finish puts back the original streams"""
+    global _output_stages
+    with _output_lock:
+        sys.stdout.local.file = sys.stderr.local.file = None
+        _output_stages -= 1
+        if _output_stages == 0:
+            sys.stdout, sys.stderr, threading.Thread.start = _original_output
+
+def has_entry_point(script_path):
+    """True for Python scripts defining a top-level main() (checked without importing them)"""
+    if not script_path.endswith(".py") or not os.path.exists(script_path):
+        return False
+    with open(script_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script_path)
+    return any(isinstance(node, ast.FunctionDef) and node.name == ENTRY_POINT for node in tree.body)
+
+def load_entry_point(script_path):
+    """Import a script once per process and return its main()"""
+    script_path = os.path.abspath(script_path)
+    with _modules_lock:
+        module = _modules.get(script_path)
+        if module is None:
+            name = "etapa_" + os.path.splitext(os.path.basename(script_path))[0]
+            spec = importlib.util.spec_from_file_location(name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _modules[script_path] = module
+    return getattr(module, ENTRY_POINT)
+
+def exit_code_of(code):
+    """Exit status for a main() return value or SystemExit code"""
+    if code is None:
+        return 0
+    return code if isinstance(code, int) else 1
+
+def _call_entry_point(script_path, args):
+    try:
+        entry_point = load_entry_point(script_path)
+        # sys.argv é do processo inteiro e as etapas rodam em paralelo: quem lê
+        # flags (--resume, --completo) recebe os argumentos em main(argv)
+        if inspect.signature(entry_point).parameters:
+            return exit_code_of(entry_point(list(args)))
+        return exit_code_of(entry_point())
+    except SystemExit as e:
+        return exit_code_of(e.code)
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+def run_in_process(script_path, args=(), log_path=None, cprofile_path=None):
+    """Run the script's main() in this process, sharing the B3 session, rate limiter and loaded JSONs.
+
+    Returns (exit code, figures); see perfil.measure.
+    """
+    log = open(log_path, 'w', encoding='utf-8') if log_path else None
+    _redirect_thread_output(log)
+    stage = threading.get_ident()
+    with _active_lock:
+        for other in _active_stages:
+            _active_stages[other] = False
+        _active_stages[stage] = not _active_stages
+    try:
+        exit_code, figures = measure(lambda: _call_entry_point(script_path, args), cprofile_path)
+    finally:
+        with _active_lock:
+            isolated = _active_stages.pop(stage)
+        _restore_thread_output()
+        if log:
+            log.close()
+    figures["isolada"] = isolated
+    return exit_code, figures
+
+def run_subprocess(script_path, args=(), env=None, log_path=None, cprofile_path=None):
+    """Run the script in its own interpreter (node for .js), measured through perfil.py.
+
+    Returns (exit code, figures); Node scripts get no figures.
+    """
+    figures_path = None
+    if script_path.endswith('.js'):
+        command = ['node', script_path] + list(args)
+    else:
+        fd, figures_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfil.py"),
+                   "--saida", figures_path] + (["--cprofile", cprofile_path] if cprofile_path else [])
+        command += [script_path] + list(args)
+
+    if log_path:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            returncode = subprocess.run(command, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    else:
+        returncode = subprocess.run(command, env=env, capture_output=False).returncode
+
+    figures = {}
+    if figures_path:
+        try:
+            with open(figures_path, 'r', encoding='utf-8') as f:
+                figures = json.load(f)
+        except ValueError:
+            # O processo morreu antes de gravar as medidas
+            pass
+        os.remove(figures_path)
+        figures["isolada"] = True
+    return returncode, figures
+
+def run_stage(script_path, args=(), in_process=True, env=None, log_path=None, cprofile_path=None):
+    """Run one pipeline stage and return (exit code, resource figures).
+
+    Scripts exposing main() run in-process unless `in_process` is False, with
+    `args` passed as main(argv) when main() takes it; Node scripts keep
+    running as a subprocess, with `env`. With `cprofile_path`, a cProfile of the stage is
+    dumped there.
+    """
+    if in_process and has_entry_point(script_path):
+        return run_in_process(script_path, args, log_path, cprofile_path)
+    return run_subprocess(script_path, args, env, log_path, cprofile_path)
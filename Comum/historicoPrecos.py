@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from armazem import PRICE_FILES
+from dados import save_json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pasta do histórico colunar de preços (padrão: Finais/Historico ao lado do empresasHistorico.json)
+HISTORY_DIR = os.environ.get("B3_HISTORICO") or os.path.join(ROOT_DIR, "Diario", "Scripts", "testando", "Finais", "Historico")
+
+# Cotações do dia que entram no histórico (o empresasHistorico.json só tem empresas)
+SNAPSHOT_CLASSES = ("empresas",)
+
+# Colunas de cada ticker: um arquivo binário cru por coluna, little-endian, sem cabeçalho
+COLUMNS = {
+    "data": np.dtype("<i4"),  # dias desde 1970-01-01
+    "preco": np.dtype("<f8"),
+    "volume": np.dtype("<f8")  # NaN = sem volume
+}
+MANIFEST = "tickers.json"
+
+def days_of(dates):
+    """int32 days since 1970-01-01 of a datetime64 array"""
+    return dates.astype("datetime64[D]").astype(np.int64).astype(np.int32)
+
+def date_texts(days):
+    """dd/mm/yyyy texts of an array of days since 1970-01-01"""
+    iso = np.datetime_as_string(np.asarray(days, dtype=np.int64).astype("datetime64[D]"), unit="D")
+    return [f"{text[8:10]}/{text[5:7]}/{text[0:4]}" for text in iso.tolist()]
+
+def trading_day(day=None):
+    """`day` (today by default), moved back to Friday on weekends: the snapshot then still has Friday's prices.
+
+    Holidays are not known here: their rows are provisional, see PriceHistory.append.
+    """
+    day = day or date.today()
+    return day - timedelta(days=max(0, day.weekday() - 4))
+
+def _folder_name(codigo):
+    return re.sub(r"[^\w.-]", "_", str(codigo))
+
+class PriceHistory:
+    """Columnar daily price history, one folder of column files per ticker.
+
+    tickers.json holds, per ticker, the company name, its folder, the number
+    of rows, the latest date and how many of the last rows are provisional;
+    series() memory-maps just that ticker's columns, oldest first, without
+    reading any other ticker. Rows past the count in the manifest (an
+    interrupted write) are never read.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest_path = os.path.join(self.path, MANIFEST)
+        self.tickers = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.tickers = json.load(f)
+
+    def __contains__(self, codigo):
+        return codigo in self.tickers
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def _column_path(self, codigo, column):
+        return os.path.join(self.path, self.tickers[codigo]["pasta"], f"{column}.bin")
+
+    def series(self, codigo):
+        """{"data", "preco", "volume"} arrays of a ticker, oldest first (read-only memory maps)"""
+        rows = self.tickers[codigo]["linhas"]
+        if not rows:
+            return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+        return {column: np.memmap(self._column_path(codigo, column), dtype=dtype, mode="r", shape=(rows,))
+                for column, dtype in COLUMNS.items()}
+
+    def latest_day(self, codigo):
+        """Latest stored date of a ticker, in days since 1970-01-01 (None when unknown)"""
+        entry = self.tickers.get(codigo)
+        return entry["ultimoDia"] if entry else None
+
+    def write(self, codigo, empresa, days, prices, volumes):
+        """Replace a ticker's series; rows must be sorted oldest first"""
+        entry = self.tickers.get(codigo) or {"pasta": _folder_name(codigo)}
+        folder = os.path.join(self.path, entry["pasta"])
+        os.makedirs(folder, exist_ok=True)
+        for column, values in (("data", days), ("preco", prices), ("volume", volumes)):
+            fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f".{column}.", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(np.ascontiguousarray(values, dtype=COLUMNS[column]).tobytes())
+            os.replace(temp_path, os.path.join(folder, f"{column}.bin"))
+        entry.update({"empresa": empresa, "linhas": len(days), "ultimoDia": int(days[-1]) if len(days) else None})
+        entry.pop("provisorias", None)
+        self.tickers[codigo] = entry
+
+    def append(self, codigo, empresa, days, prices, volumes, provisional=False):
+        """Append the rows newer than the ticker's latest day (rows sorted oldest first); returns how many.
+
+        Only the new rows are written, over the ticker's column files from the
+        first row they replace; rows past the manifest count (an interrupted
+        append) are cut off. `provisional` rows (the day's quote, see
+        append_snapshots) only hold a day until a real row comes: a
+        non-provisional append replaces the provisional rows up to its last
+        day, and later ones stay provisional.
+        """
+        columns = [np.asarray(days, dtype=COLUMNS["data"]), np.asarray(prices, dtype=COLUMNS["preco"]),
+                   np.asarray(volumes, dtype=COLUMNS["volume"])]
+        entry = self.tickers.get(codigo)
+        stored = entry["linhas"] if entry else 0
+        pending = entry.get("provisorias", 0) if entry and not provisional else 0
+        kept = stored - pending
+        series = self.series(codigo) if pending else None
+        latest = (int(series["data"][kept - 1]) if kept else None) if pending else self.latest_day(codigo)
+
+        new = columns[0] > latest if latest is not None else np.ones(len(columns[0]), dtype=bool)
+        rows = [values[new] for values in columns]
+        provisional_rows = int(new.sum()) if provisional else 0
+        if pending:
+            # Provisórias depois do último dia real continuam valendo, ainda provisórias
+            last = int(rows[0][-1]) if len(rows[0]) else latest
+            old = [np.array(series[column][kept:]) for column in COLUMNS]
+            # Solta os memmaps antes de regravar os arquivos (no Windows um arquivo mapeado não pode ser cortado)
+            series = None
+            later = old[0] > last if last is not None else np.ones(pending, dtype=bool)
+            if not new.any() and later.all():
+                return 0
+            rows = [np.concatenate((values, previous[later])) for values, previous in zip(rows, old)]
+            provisional_rows = int(later.sum())
+        elif not new.any():
+            return 0
+        elif provisional and entry:
+            provisional_rows += entry.get("provisorias", 0)
+
+        if entry is None:
+            self.write(codigo, empresa, *rows)
+            entry = self.tickers[codigo]
+        else:
+            for column, values in zip(COLUMNS, rows):
+                dtype = COLUMNS[column]
+                with open(self._column_path(codigo, column), 'r+b') as f:
+                    f.seek(kept * dtype.itemsize)
+                    f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+                    # Nunca menor que as linhas do manifesto gravado, que continua valendo até o save()
+                    f.truncate(max(f.tell(), stored * dtype.itemsize))
+            entry["linhas"] = kept + len(rows[0])
+            entry["ultimoDia"] = int(rows[0][-1]) if len(rows[0]) else latest
+        if provisional_rows:
+            entry["provisorias"] = provisional_rows
+        else:
+            entry.pop("provisorias", None)
+        return int(new.sum())
+
+    def remove(self, codigo):
+        entry = self.tickers.pop(codigo)
+        folder = os.path.join(self.path, entry["pasta"])
+        for column in COLUMNS:
+            path = os.path.join(folder, f"{column}.bin")
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+    def save(self):
+        """Write the manifest: rows written since the last save become visible to readers"""
+        save_json(self.manifest_path, self.tickers, compact=True)
+
+    def records(self):
+        """Yield each ticker in the empresasHistorico.json shape, newest prices first"""
+        for codigo, entry in self.tickers.items():
+            series = self.series(codigo)
+            if not entry["linhas"]:
+                continue
+            # Mais recentes primeiro; no mesmo dia, a ordem em que as linhas foram gravadas
+            order = np.lexsort((np.arange(entry["linhas"]), -series["data"].astype(np.int64)))
+            volumes = series["volume"][order].astype(object)
+            volumes[np.isnan(series["volume"][order])] = None
+            yield {
+                "empresa": entry["empresa"],
+                "codigo": codigo,
+                "historicoPrecos": [
+                    {"data": data, "preco": preco, "volume": volume}
+                    for data, preco, volume in zip(date_texts(series["data"][order]), series["preco"][order].tolist(),
+                                                   volumes.tolist())
+                ]
+            }
+
+def append_snapshots(history, root=ROOT_DIR, day=None, classes=SNAPSHOT_CLASSES):
+    """Append the price of each ticker in the Diario/Finais snapshots as its provisional row of `day`.
+
+    `day` defaults to the last weekday; tickers that already have that day are
+    left alone, so a rerun appends nothing. The snapshot has no volume and no
+    date of its own (a holiday gets the previous close), so the row only holds
+    the day until process_excel.py appends the workbook's real rows, which
+    replace it. Returns the number of rows appended.
+    """
+    day_number = int(days_of(np.array([trading_day(day)], dtype="datetime64[D]"))[0])
+    appended = 0
+    for classe in classes:
+        path = os.path.join(root, PRICE_FILES[classe])
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        for record in snapshot:
+            for code in record.get("codigos") or []:
+                if not code.get("codigo") or code.get("preco") is None:
+                    continue
+                # A cotação do dia não traz volume
+                appended += history.append(code["codigo"], record.get("nome"), [day_number], [code["preco"]], [np.nan], provisional=True)
+    history.save()
+    return appended
+
+def export_json(history, path):
+    """Write the history as empresasHistorico.json (compatibility output)"""
+    save_json(path, history.records(), indent=2)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico colunar de preços diários")
+    parser.add_argument("acao", choices=["atualizar", "exportar", "mostrar"],
+                        help="atualizar: acrescenta as cotações do dia (Diario/Finais); exportar: gera o "
+                             "empresasHistorico.json; mostrar: últimos preços de um ticker")
+    parser.add_argument("--pasta", default=HISTORY_DIR, help="Pasta do histórico (padrão: B3_HISTORICO ou Finais/Historico do process_excel)")
+    parser.add_argument("--destino", default="empresasHistorico.json", help="Arquivo JSON exportado")
+    parser.add_argument("--codigo", help="Ticker mostrado")
+    parser.add_argument("--linhas", type=int, default=10, help="Quantos preços mostrar")
+    parser.add_argument("--raiz", default=ROOT_DIR, help="Raiz do projeto de onde vêm as cotações do dia")
+    parser.add_argument("--data", help="Dia das cotações acrescentadas, dd/mm/aaaa (padrão: último dia útil)")
+    args = parser.parse_args()
+
+    history = PriceHistory(args.pasta)
+    if args.acao == "atualizar":
+        day = datetime.strptime(args.data, "%d/%m/%Y").date() if args.data else None
+        print(f"Linhas acrescentadas ao histórico: {append_snapshots(history, args.raiz, day)}")
+        return
+    if args.acao == "exportar":
+        print(f"Exportado: {export_json(history, args.destino)} ({len(history)} tickers)")
+        return
+
+    if args.codigo not in history:
+        print(f"Ticker não encontrado no histórico: {args.codigo}")
+        sys.exit(1)
+    series = history.series(args.codigo)
+    tail = slice(max(0, len(series["data"]) - args.linhas), None)
+    for data, preco, volume in zip(date_texts(series["data"][tail]), series["preco"][tail], series["volume"][tail]):
+        print(f"{data}  {preco:>12.2f}  {'' if np.isnan(volume) else int(volume)}")
+
+if __name__ == "__main__":
+    main()
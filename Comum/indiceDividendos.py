@@ -0,0 +1,112 @@
+import json
+import os
+from datetime import datetime
+
+from dados import file_signature, save_json
+
+def parse_date(value):
+    """Parse a B3 dd/mm/yyyy date (None when empty or malformed)"""
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+# Chave de deduplicação dos dividendos de cada classe (a mesma usada desde o dividendosAtualizar.py)
+def empresa_key(div):
+    return f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('tipo')}"
+
+def bdr_key(div):
+    return f"{div.get('dataAprovacao')}|{div.get('tipo')}"
+
+def fii_key(div):
+    return f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('dataPagamento')}"
+
+class DividendIndex:
+    """Sidecar index of a dividendos*.json file: entity -> dividend keys and latest dataAprovacao.
+
+    The keys of each entity are kept as one newline-joined string, so loading
+    the index costs one entry per entity; they are split only for entities
+    whose fetched dividends need checking. The index is tied to the mtime and
+    size of the dividend file and rebuilt from it when they no longer match.
+    """
+
+    def __init__(self, path, source_path, key_of, name_field):
+        self.path = path
+        self.source_path = source_path
+        self.key_of = key_of
+        self.name_field = name_field
+        self.entries = {}
+        self.key_sets = {}
+        self.rebuilt = False
+
+        index = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except ValueError:
+                index = None
+        if index is not None and index.get("origem") == file_signature(source_path):
+            self.entries = index["entidades"]
+        elif os.path.exists(source_path):
+            self.rebuild()
+
+    def rebuild(self):
+        """Index every entity of the dividend file (first run, or file changed outside this script)"""
+        with open(self.source_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self.entries = {}
+        self.key_sets = {}
+        for record in records:
+            self.entries[record[self.name_field]] = {}
+            self.add(record[self.name_field], record.get("dividendos", []))
+            if "quantidade" in record:
+                self.entries[record[self.name_field]]["quantidade"] = record["quantidade"]
+        self.rebuilt = True
+
+    def __contains__(self, entity):
+        return entity in self.entries
+
+    def keys(self, entity):
+        if entity not in self.key_sets:
+            keys = self.entries.get(entity, {}).get("chaves", "")
+            self.key_sets[entity] = set(keys.split("\n")) if keys else set()
+        return self.key_sets[entity]
+
+    def latest(self, entity):
+        """Most recent dataAprovacao indexed for the entity, as a date"""
+        latest = self.entries.get(entity, {}).get("ultimaAprovacao")
+        return datetime.strptime(latest, "%Y-%m-%d").date() if latest else None
+
+    def get(self, entity, field, default=None):
+        return self.entries.get(entity, {}).get(field, default)
+
+    def set(self, entity, field, value):
+        self.entries.setdefault(entity, {})[field] = value
+
+    def new_dividends(self, entity, dividends):
+        """Dividends whose key is not indexed yet for the entity.
+
+        Keys are not unique (a BDR can pay several dividends approved the same
+        day), so every fetched dividend with an unknown key is kept.
+        """
+        known = self.keys(entity)
+        return [div for div in dividends if self.key_of(div) not in known]
+
+    def add(self, entity, dividends):
+        """Index dividends just merged into the file for the entity"""
+        keys = self.keys(entity)
+        entry = self.entries.setdefault(entity, {})
+        latest = self.latest(entity)
+        for div in dividends:
+            keys.add(self.key_of(div))
+            date = parse_date(div.get("dataAprovacao"))
+            if date and (latest is None or date > latest):
+                latest = date
+        entry["chaves"] = "\n".join(sorted(keys))
+        if latest:
+            entry["ultimaAprovacao"] = latest.isoformat()
+
+    def save(self):
+        """Write the index tied to the dividend file as it is now on disk"""
+        save_json(self.path, {"origem": file_signature(self.source_path), "entidades": self.entries}, compact=True)
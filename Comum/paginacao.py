@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from b3Client import MAX_WORKERS
+
+def fetch_all_pages(fetch_page, first_page=None, max_workers=MAX_WORKERS, max_retries=3, label=None):
+    """Fetch page 1, then pages 2..totalPages concurrently; return every `results` list in page order.
+
+    `fetch_page(page_number)` must return the decoded B3 page (or None on failure).
+    Failed pages are retried on their own, up to `max_retries` rounds.
+    """
+    if first_page is None:
+        first_page = fetch_page(1)
+    if first_page is None:
+        raise RuntimeError("Não foi possível buscar a página 1")
+
+    total_pages = first_page['page']['totalPages']
+    results_by_page = {1: first_page['results']}
+    pending = list(range(2, total_pages + 1))
+    suffix = f" para {label}" if label else ""
+
+    for attempt in range(max_retries):
+        if not pending:
+            break
+        failed = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch_page, page_number): page_number for page_number in pending}
+            for future in as_completed(futures):
+                page_number = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    print(f"Erro ao buscar a página {page_number}{suffix}: {e}")
+                    data = None
+                if data is None:
+                    failed.append(page_number)
+                    continue
+                results_by_page[page_number] = data['results']
+                print(f"Página {page_number} de {total_pages}{suffix}")
+        pending = sorted(failed)
+
+    if pending:
+        raise RuntimeError(f"Páginas não carregadas após {max_retries} tentativas{suffix}: {pending}")
+
+    all_results = []
+    for page_number in range(1, total_pages + 1):
+        all_results.extend(results_by_page[page_number])
+    return all_results
@@ -0,0 +1,214 @@
+import argparse
+import cProfile
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem getrusage, o pico de memória fica de fora
+    resource = None
+
+# Medidas de cada etapa; as threads que a etapa abre somam nos contadores dela
+COUNTERS = ("cpu_s", "sono_s", "json_lido_bytes", "json_gravado_bytes", "requisicoes", "bytes_http")
+
+_local = threading.local()
+_counters_lock = threading.Lock()
+
+# Ganchos ligados só enquanto alguma medição está rodando (measure pode rodar em várias threads)
+_hooks_lock = threading.Lock()
+_measuring = 0
+_originals = None
+
+def current_counters():
+    """Counters of the measured run this thread belongs to (None outside measure())"""
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = getattr(threading.current_thread(), "_perfil_counters", None)
+    return counters
+
+def _add(name, value):
+    counters = current_counters()
+    if counters is None:
+        return
+    with _counters_lock:
+        counters[name] += value
+
+def _position(fp):
+    try:
+        return fp.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def _install():
+    """Hook time.sleep, json.load, json.dump and Thread.start while a measured run is going on.
+
+    Calls from threads outside a measured run are passed through uncounted.
+    Threads started inside one inherit its counters and add their CPU time
+    to them when they finish.
+    """
+    global _measuring, _originals
+    with _hooks_lock:
+        _measuring += 1
+        if _measuring > 1:
+            return
+        _originals = sleep, load, dump, thread_start = time.sleep, json.load, json.dump, threading.Thread.start
+
+        def timed_sleep(seconds):
+            start = time.perf_counter()
+            try:
+                sleep(seconds)
+            finally:
+                _add("sono_s", time.perf_counter() - start)
+
+        def counted_load(fp, *args, **kwargs):
+            start = _position(fp)
+            data = load(fp, *args, **kwargs)
+            end = _position(fp)
+            if start is not None and end is not None:
+                _add("json_lido_bytes", end - start)
+            return data
+
+        def counted_dump(obj, fp, *args, **kwargs):
+            start = _position(fp)
+            dump(obj, fp, *args, **kwargs)
+            end = _position(fp)
+            if start is not None and end is not None:
+                _add("json_gravado_bytes", end - start)
+
+        def counted_start(thread):
+            counters = current_counters()
+            if counters is not None:
+                thread._perfil_counters = counters
+                run = thread.run
+
+                def counted_run():
+                    try:
+                        run()
+                    finally:
+                        # Uma thread nova começa com thread_time() zerado
+                        _add("cpu_s", time.thread_time())
+                thread.run = counted_run
+            return thread_start(thread)
+
+        time.sleep = timed_sleep
+        json.load = counted_load
+        json.dump = counted_dump
+        threading.Thread.start = counted_start
+
+def _uninstall():
+    global _measuring
+    with _hooks_lock:
+        _measuring -= 1
+        if _measuring == 0:
+            time.sleep, json.load, json.dump, threading.Thread.start = _originals
+
+def count_json_written(size):
+    """Count a JSON file written without json.dump (dados.save_json streams it)"""
+    _add("json_gravado_bytes", size)
+
+def count_json_read(size):
+    """Count a JSON file read without json.load (dados.load_json parses its text)"""
+    _add("json_lido_bytes", size)
+
+def count_http(size):
+    """Count one B3 response of `size` body bytes (called by b3Client)"""
+    _add("requisicoes", 1)
+    _add("bytes_http", size)
+
+def peak_rss_mb():
+    """Peak RSS of this process so far, in MB (None on Windows)"""
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)
+
+def measure(run, cprofile_path=None):
+    """Call run() and return (its result, resource figures); with cprofile_path, dump a cProfile of it there.
+
+    The figures count only this thread and the threads it starts, so runs
+    measured at the same time in other threads do not leak into them; the
+    CPU of a started thread is counted once it finishes. The peak RSS is
+    the process's.
+    """
+    counters = dict.fromkeys(COUNTERS, 0)
+    previous = getattr(_local, "counters", None)
+    _local.counters = counters
+    _install()
+    profiler = cProfile.Profile() if cprofile_path else None
+    cpu = time.thread_time()
+    if profiler:
+        profiler.enable()
+    try:
+        result = run()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        _add("cpu_s", time.thread_time() - cpu)
+        _uninstall()
+        _local.counters = previous
+    with _counters_lock:
+        figures = dict(counters)
+    figures["cpu_s"] = round(figures["cpu_s"], 3)
+    figures["sono_s"] = round(figures["sono_s"], 3)
+    figures["pico_rss_mb"] = peak_rss_mb()
+    return result, figures
+
+def describe(figures):
+    """One-line summary of a stage's figures for the console ("" when there are none)"""
+    if not figures:
+        return ""
+    mb = 1024 * 1024
+    parts = [f"CPU {figures['cpu_s']:.1f} s"]
+    if figures.get("pico_rss_mb") is not None:
+        parts.append(f"pico RSS {figures['pico_rss_mb']:.0f} MB")
+    parts.append(f"HTTP {figures['requisicoes']} req, {figures['bytes_http'] / mb:.1f} MB")
+    parts.append(f"sleep {figures['sono_s']:.1f} s")
+    parts.append(f"JSON lido {figures['json_lido_bytes'] / mb:.1f} MB, gravado {figures['json_gravado_bytes'] / mb:.1f} MB")
+    return " | ".join(parts)
+
+def append_run_log(path, record):
+    """Append one stage record to the JSON Lines run log"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def main():
+    """Run a script under measurement and write its figures as JSON (used for subprocess stages)"""
+    from etapas import exit_code_of
+
+    parser = argparse.ArgumentParser(description="Executa um script medindo CPU, memória, HTTP, sleep e JSON")
+    parser.add_argument("--saida", required=True, help="Arquivo JSON com as medidas")
+    parser.add_argument("--cprofile", help="Arquivo .prof com o cProfile do script")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # Rodando como script este módulo é o __main__: dados.save_json procura os contadores em "perfil"
+    sys.modules.setdefault("perfil", sys.modules[__name__])
+    sys.argv = [args.script] + args.args
+    sys.path[0] = os.path.dirname(os.path.abspath(args.script))
+
+    def run():
+        try:
+            runpy.run_path(args.script, run_name="__main__")
+        except SystemExit as e:
+            return exit_code_of(e.code)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 0
+
+    exit_code, figures = measure(run, args.cprofile)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(figures, f)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.utils import get_column_letter
+
+# Colunas entre um ticker e o próximo (o HISTÓRICODEAÇÕES derrama data, fechamento e volume)
+COLUMN_STEP = 4
+
+# HISTÓRICODEAÇÕES(ticker; data inicial; HOJE(); diário; ...) como o Excel grava no arquivo:
+# nomes em inglês, com o prefixo das funções novas
+FORMULA = "_xlfn.STOCKHISTORY({ticker},{start},TODAY(),0,0,0,1,5)"
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+<Override PartName="/xl/metadata.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheetMetadata+xml"/>
+</Types>"""
+
+ROOT_RELS = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK_RELS = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="{REL_NS}/styles" Target="styles.xml"/>
+<Relationship Id="rId3" Type="{REL_NS}/sheetMetadata" Target="metadata.xml"/>
+</Relationships>"""
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{MAIN_NS}">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+# Marca as células com cm="1" como fórmulas de matriz dinâmica: sem isso o Excel
+# abre a fórmula com o @ da interseção implícita e ela não derrama
+METADATA = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<metadata xmlns="{MAIN_NS}" xmlns:xda="http://schemas.microsoft.com/office/spreadsheetml/2017/dynamicarray">
+<metadataTypes count="1"><metadataType name="XLDAPR" minSupportedVersion="120000" copy="1" pasteAll="1" pasteValues="1" merge="1" splitFirst="1" rowColShift="1" clearFormats="1" clearComments="1" assign="1" coerce="1" cellMeta="1"/></metadataTypes>
+<futureMetadata name="XLDAPR" count="1"><bk><extLst><ext uri="{{bdbb8cdc-fa1e-496e-a857-3c3f30c029c3}}"><xda:dynamicArrayProperties fDynamic="1" fCollapsed="0"/></ext></extLst></bk></futureMetadata>
+<cellMetadata count="1"><bk><rc t="1" v="0"/></bk></cellMetadata>
+</metadata>"""
+
+def _workbook(sheet_name):
+    return f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">
+<sheets><sheet name={quoteattr(sheet_name)} sheetId="1" r:id="rId1"/></sheets>
+<calcPr calcId="191029" fullCalcOnLoad="1"/>
+</workbook>"""
+
+def _text_cell(ref, text):
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(text))}</t></is></c>'
+
+def _sheet_rows(codes, start_date):
+    """Row 1 with each ticker and its start date, row 2 with its formula, one block of columns per ticker"""
+    yield f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{MAIN_NS}"><sheetData><row r="1">'
+    for i, codigo in enumerate(codes):
+        col = i * COLUMN_STEP + 1
+        yield _text_cell(f"{get_column_letter(col)}1", codigo) + _text_cell(f"{get_column_letter(col + 2)}1", start_date)
+    yield '</row><row r="2">'
+    for i in range(len(codes)):
+        col = i * COLUMN_STEP + 1
+        ref = f"{get_column_letter(col)}2"
+        formula = FORMULA.format(ticker=f"{get_column_letter(col)}1", start=f"{get_column_letter(col + 2)}1")
+        yield f'<c r="{ref}" cm="1"><f t="array" ref="{ref}">{formula}</f><v>0</v></c>'
+    yield '</row></sheetData></worksheet>'
+
+def write_history_workbook(path, codes, start_date, sheet_name="Historico"):
+    """Write the HISTÓRICODEAÇÕES workbook for `codes`, streaming the sheet straight into the xlsx.
+
+    The formulas are written the way Excel itself stores a spilling
+    STOCKHISTORY, so the file opens ready, with no pass through Excel to
+    strip the implicit-intersection @. openpyxl, even write-only, cannot mark
+    a cell as a dynamic-array formula. Written to a temporary file in the
+    same folder and renamed, like save_json.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    # mkstemp cria o arquivo só para o dono: mantém as permissões do arquivo substituído
+    mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".historico.", suffix=".xlsx.tmp")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+            archive.writestr("_rels/.rels", ROOT_RELS)
+            archive.writestr("xl/workbook.xml", _workbook(sheet_name))
+            archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+            archive.writestr("xl/styles.xml", STYLES)
+            archive.writestr("xl/metadata.xml", METADATA)
+            with archive.open("xl/worksheets/sheet1.xml", 'w') as sheet:
+                for chunk in _sheet_rows(codes, start_date):
+                    sheet.write(chunk.encode("utf-8"))
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
@@ -0,0 +1,80 @@
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and consume them"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+class AdaptiveRateLimiter(TokenBucket):
+    """AIMD limiter: raises the rate additively on success, cuts it multiplicatively on 429/503"""
+
+    def __init__(self, rate, capacity=None, min_rate=0.2, max_rate=10.0, increase=0.05, decrease=0.5):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.paused_until = 0.0
+        self.successes = 0
+        self.throttles = 0
+
+    def acquire(self, tokens=1):
+        """Wait out any Retry-After pause, then take tokens from the bucket"""
+        while True:
+            with self.lock:
+                wait_time = self.paused_until - time.monotonic()
+            if wait_time <= 0:
+                break
+            time.sleep(wait_time)
+        super().acquire(tokens)
+
+    def on_success(self):
+        """Additive increase after a successful response"""
+        with self.lock:
+            self._refill()
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """Multiplicative decrease after a 429/503, pausing every caller for Retry-After"""
+        with self.lock:
+            self._refill()
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            return self.rate
+
+    def metrics(self):
+        """Current rate and counters, for logging"""
+        with self.lock:
+            return {
+                "rate": round(self.rate, 3),
+                "successes": self.successes,
+                "throttles": self.throttles
+            }
@@ -0,0 +1,108 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cassete import Cassete
+
+class ServidorB3Fake(ThreadingHTTPServer):
+    """Local stand-in for sistemaswebb3-listados with configurable latency and 429 injection"""
+
+    daemon_threads = True
+
+    def __init__(self, address, responder, latency=0.0, rate_429=0.0, retry_after=1):
+        super().__init__(address, _B3Handler)
+        self.responder = responder
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self.not_found = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled, "not_found": self.not_found}
+
+class _B3Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real endpoint
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response stalls ~40 ms on delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.rate_429 and random.random() < server.rate_429:
+            with server.lock:
+                server.throttled += 1
+            self._send(429, b"", {"Retry-After": str(server.retry_after)})
+            return
+
+        entry = server.responder(self.path)
+        if entry is None:
+            with server.lock:
+                server.not_found += 1
+            self._send(404, json.dumps({"erro": "requisição não gravada", "path": self.path}).encode('utf-8'))
+            return
+        self._send(entry["status"], entry["body"].encode('utf-8'))
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def cassette_responder(cassete):
+    """Responder that replays a recorded Cassete"""
+    return cassete.lookup
+
+def start_server(responder, port=0, latency=0.0, rate_429=0.0, retry_after=1):
+    """Start the fake server on a background thread and return it (see .base_url)"""
+    server = ServidorB3Fake(("127.0.0.1", port), responder, latency, rate_429, retry_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor B3 local que reproduz uma gravação (cassete)")
+    parser.add_argument("cassete", help="Arquivo .jsonl.gz gravado com B3_CASSETE")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência por requisição, em segundos")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Probabilidade (0-1) de responder 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valor do header Retry-After nas respostas 429")
+    args = parser.parse_args()
+
+    cassete = Cassete(args.cassete)
+    server = ServidorB3Fake(("127.0.0.1", args.porta), cassette_responder(cassete),
+                            args.latencia, args.taxa_429, args.retry_after)
+    print(f"{len(cassete)} respostas carregadas de {args.cassete}")
+    print(f"Servidor B3 fake em {server.base_url}")
+    print(f"Aponte os scripts para ele com: B3_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Estatísticas: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import json
+import os
+import sys
+import time
+
+import openpyxl
+
+from armazem import PRICE_FILES
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Backend da validação dos códigos: "excel" (tipo de dado Ações do Excel via xlwings, só Windows)
+# ou "local" (cotações em JSON, sem Excel). Padrão: excel no Windows, local no resto
+BACKEND = os.environ.get("B3_VALIDACAO") or ("excel" if sys.platform == "win32" else "local")
+
+# Cotações do backend local, separadas por os.pathsep (padrão: as cotações do dia em Diario/Finais)
+QUOTES_PATHS = os.environ.get("B3_COTACOES")
+
+# O que o Excel devolve quando o campo não existe para o ticker (#CAMPO!)
+FIELD_ERROR = -2146826239
+
+# Linhas por chamada ao Excel ao gravar as fórmulas e ler os valores
+BATCH_ROWS = 5000
+
+# Macros que convertem a coluna F (BVMF:codigo) para o tipo de dado Ações
+CONVERT_MACRO = '''
+Sub ConvertToStock()
+    Columns("F:F").Select
+    Selection.ConvertToLinkedDataType ServiceID:=268435456, LanguageCulture:= "en-US"
+End Sub
+'''
+
+# Variante que só converte as células preenchidas (usada pelos BDRs)
+CONVERT_CONSTANTS_MACRO = '''
+Sub ConvertToStock()
+    Set rng = Columns("F:F")
+    On Error Resume Next
+    Set rng = rng.SpecialCells(xlCellTypeConstants)
+    On Error GoTo 0
+    If Not rng Is Nothing Then
+        rng.ConvertToLinkedDataType ServiceID:=268435456, LanguageCulture:= "en-US"
+    Else
+        MsgBox "Não há células com valores na coluna F."
+    End If
+End Sub
+'''
+
+def classify(codes, quotes, market_cap=True):
+    """Split codes into (problematic, problematic_prices, problematic_marketcap, unquoted), in row order.
+
+    quotes maps each code to {"preco", "valorMercado"}: FIELD_ERROR when the
+    source knows the ticker but not the field, None for an empty cell. Same
+    rules the Excel check always used: both fields missing is a dead ticker;
+    a zero or text price is a price problem; a missing market cap alone is
+    only reported; empty cells are left alone. Without market cap (ETFs,
+    FIIs) every price problem is a dead ticker. Codes the source does not
+    have at all go to `unquoted`, which nobody moves or deletes.
+    """
+    problematic, problematic_prices, problematic_marketcap, unquoted = [], [], [], []
+    for code in codes:
+        if code not in quotes:
+            unquoted.append(code)
+            continue
+        price, cap = quotes[code].get("preco"), quotes[code].get("valorMercado")
+        if not market_cap:
+            if price == FIELD_ERROR or price == 0.0 or isinstance(price, str):
+                problematic.append(code)
+        elif price == FIELD_ERROR and cap == FIELD_ERROR:
+            problematic.append(code)
+        elif price == 0.0 or isinstance(price, str):
+            problematic_prices.append(code)
+        elif cap == FIELD_ERROR:
+            problematic_marketcap.append(code)
+    return problematic, problematic_prices, problematic_marketcap, unquoted
+
+def _cell_value(value):
+    return None if value == FIELD_ERROR else value
+
+def write_sheet(path, sheet_name, table, market_cap=True):
+    """Rewrite the price sheet in one pass with the given (name, code, price, market cap) rows"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for name, code, price, cap in table:
+        ws.append([name, code, _cell_value(price), _cell_value(cap) if market_cap else None, None, f"BVMF:{code}"])
+    wb.save(path)
+
+class Validator:
+    """Backend of the code check: read() returns the (name, code, price, market cap) of every row"""
+
+    name = None
+
+    def quoted(self, code):
+        """Whether the source has the ticker at all"""
+        return True
+
+    def read(self, path, sheet_name, rows, market_cap=True):
+        raise NotImplementedError
+
+    def validate(self, path, sheet_name, rows, market_cap=True):
+        """Check the first `rows` rows of the price sheet; returns classify()'s four lists.
+
+        The whole column is resolved at once and the sheet is then rewritten
+        without the problematic rows (dead tickers and price problems).
+        """
+        table = self.read(path, sheet_name, rows, market_cap)
+        quotes = {code: {"preco": price, "valorMercado": cap} for _, code, price, cap in table if self.quoted(code)}
+        result = classify([code for _, code, _, _ in table], quotes, market_cap)
+        bad = set(result[0]) | set(result[1])
+        write_sheet(path, sheet_name, [row for row in table if row[1] not in bad], market_cap)
+        return result
+
+class ExcelValidator(Validator):
+    """Excel's Stocks data type through xlwings: needs Windows with Excel"""
+
+    name = "excel"
+
+    def __init__(self, macro=CONVERT_MACRO):
+        self.macro = macro
+
+    def read(self, path, sheet_name, rows, market_cap=True):
+        import xlwings as xw
+
+        app = xw.App(visible=False)
+        wb_xw = app.books.open(path)
+        wb_xw.api.VBProject.VBComponents.Add(1).CodeModule.AddFromString(self.macro)
+
+        # Salvar o workbook com a macro e reabrir para executá-la
+        macro_path = f"{os.path.splitext(os.path.basename(path))[0]}_with_macro.xlsm"
+        wb_xw.save(macro_path)
+        wb_xw.close()
+        wb_macro = app.books.open(macro_path)
+        time.sleep(5)  # Adding delay to ensure Excel is ready
+
+        try:
+            app.macro('ConvertToStock')()
+        except Exception as e:
+            print(f"Erro ao executar a macro: {e}")
+            wb_macro.close()
+            app.quit()
+            sys.exit()
+
+        # Fórmulas e leitura em blocos de linhas, não célula a célula
+        ws_macro = wb_macro.sheets[sheet_name]
+        for first in range(1, rows + 1, BATCH_ROWS):
+            last = min(rows, first + BATCH_ROWS - 1)
+            formulas = [[f"=F{row}.[Price]", f"=F{row}.[Market cap]"] if market_cap else [f"=F{row}.[Price]"]
+                        for row in range(first, last + 1)]
+            ws_macro.range((first, 3), (last, 4 if market_cap else 3)).value = formulas
+        ws_macro.range('A:F').columns.autofit()
+        wb_macro.save(path)
+        time.sleep(1)
+
+        # Reabrir para ler os valores calculados
+        wb_macro = app.books.open(path)
+        time.sleep(5)
+        ws_macro = wb_macro.sheets[sheet_name]
+        table = []
+        for first in range(1, rows + 1, BATCH_ROWS):
+            last = min(rows, first + BATCH_ROWS - 1)
+            for name, code, price, cap in ws_macro.range((first, 1), (last, 4)).options(ndim=2).value:
+                table.append((name, code, price, cap))
+
+        wb_macro.close()
+        app.quit()
+        if os.path.exists(macro_path):
+            os.remove(macro_path)
+        return table
+
+def _field(value):
+    return FIELD_ERROR if value is None else value
+
+def load_quotes(paths):
+    """code -> {"preco", "valorMercado"} from quote files, FIELD_ERROR for a null field.
+
+    A file is either a Diario/Finais snapshot (records with "codigos") or a
+    flat {"CODE": {"preco", "valorMercado"}} map, e.g. a fake price source.
+    """
+    quotes = {}
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Arquivo de cotações não encontrado: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        if isinstance(content, dict):
+            for codigo, quote in content.items():
+                quotes[codigo] = {"preco": _field(quote.get("preco")), "valorMercado": _field(quote.get("valorMercado"))}
+            continue
+        for record in content:
+            for code in record.get("codigos") or []:
+                if code.get("codigo"):
+                    quotes[code["codigo"]] = {"preco": _field(code.get("preco")), "valorMercado": _field(code.get("valor mercado"))}
+    return quotes
+
+class LocalValidator(Validator):
+    """Pure-Python check against quote files, all codes resolved in one lookup"""
+
+    name = "local"
+
+    def __init__(self, paths=None):
+        if paths is None:
+            paths = QUOTES_PATHS.split(os.pathsep) if QUOTES_PATHS else [os.path.join(ROOT_DIR, path) for path in PRICE_FILES.values()]
+        self.quotes = load_quotes(paths)
+        # Sem nenhuma cotação todos os códigos ficariam sem fonte: melhor parar
+        if not self.quotes:
+            raise FileNotFoundError(f"Nenhuma cotação carregada de: {', '.join(paths)}")
+
+    def quoted(self, code):
+        return code in self.quotes
+
+    def read(self, path, sheet_name, rows, market_cap=True):
+        wb = openpyxl.load_workbook(path, read_only=True)
+        names_codes = list(wb[sheet_name].iter_rows(min_row=1, max_row=rows, max_col=2, values_only=True))
+        wb.close()
+        table = []
+        for name, code in names_codes:
+            quote = self.quotes.get(code) or {}
+            table.append((name, code, quote.get("preco"), quote.get("valorMercado") if market_cap else None))
+        return table
+
+def get_validator(macro=CONVERT_MACRO, backend=None):
+    """Validator of the configured backend (B3_VALIDACAO)"""
+    backend = backend or BACKEND
+    if backend == "excel":
+        return ExcelValidator(macro)
+    if backend == "local":
+        return LocalValidator()
+    raise ValueError(f"Backend de validação desconhecido: {backend}")
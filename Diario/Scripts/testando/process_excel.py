@@ -5,9 +5,20 @@ import os
 import requests
 import datetime
 import re  # Add this import for regex
+import sys
 from tqdm import tqdm
 from openpyxl import Workbook  # Add this import for Workbook
 
+# Módulos compartilhados (gravação de JSON, histórico colunar)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "Comum"))
+from dados import save_json
+from historicoPrecos import HISTORY_DIR, PriceHistory, days_of
+
+# O histórico colunar é a saída principal; o empresasHistorico.json continua por compatibilidade (B3_HISTORICO_JSON=0 desliga)
+WRITE_JSON = os.environ.get("B3_HISTORICO_JSON", "1") != "0"
+# B3_HISTORICO_INCREMENTAL=1: só acrescenta ao histórico os dias depois do último de cada ticker, em vez de regravá-lo
+INCREMENTAL = os.environ.get("B3_HISTORICO_INCREMENTAL") == "1"
+
 def download_file():
     """Download the Excel file from Google Drive"""
     file_id = "1eFXVNBA3w52zG-XPAWyMSN5niaj_SLKt"
@@ -139,6 +150,12 @@ def format_date(date_value):
     
     return str(date_value)
 
+def _window_value(window, row_idx, col_idx):
+    """Value at 1-based (row, column) of rows read with iter_rows(values_only=True); None outside them"""
+    if row_idx > len(window) or col_idx > len(window[row_idx - 1]):
+        return None
+    return window[row_idx - 1][col_idx - 1]
+
 # Add this function to check the Excel file structure
 def inspect_excel_file(file_path):
     """Inspect the Excel file structure and formulas"""
@@ -174,9 +191,9 @@ def inspect_excel_file(file_path):
         from openpyxl import load_workbook
         
         try:
-            # Load workbook with data_only=True to get calculated values
+            # Load workbook with data_only=True to get calculated values; read-only streams the rows instead of loading every cell
             print("\nCarregando arquivo para inspeção detalhada...")
-            wb = load_workbook(file_path, data_only=True, read_only=False)
+            wb = load_workbook(file_path, data_only=True, read_only=True)
             
             # Get the active sheet or first sheet
             if wb.active:
@@ -189,9 +206,9 @@ def inspect_excel_file(file_path):
             
             print(f"Nome da planilha: {sheet.title}")
             
-            # Get dimensions
+            # Get dimensions (force: sem a dimensão gravada no arquivo, o modo somente leitura precisa varrer a planilha)
             try:
-                print(f"Dimensões: {sheet.dimensions}")
+                print(f"Dimensões: {sheet.calculate_dimension(force=True)}")
                 max_row = sheet.max_row
                 max_col = sheet.max_column
                 print(f"Número de linhas: {max_row}, Número de colunas: {max_col}")
@@ -200,10 +217,14 @@ def inspect_excel_file(file_path):
                 max_row = 1000  # Assume a reasonable number
                 max_col = 100
             
+            # A inspeção só olha as primeiras ~520 linhas e 100 colunas: lê essa janela em streaming e fecha o arquivo
+            window = list(sheet.iter_rows(min_row=1, max_row=min(max_row, 20 + 500), max_col=min(100, max_col), values_only=True))
+            wb.close()
+            
             # Look for the header row (first row with company names)
             header_row = None
             for row_idx in range(1, min(20, max_row)):
-                row_values = [sheet.cell(row=row_idx, column=col).value for col in range(1, min(20, max_col), 4)]
+                row_values = [_window_value(window, row_idx, col) for col in range(1, min(20, max_col), 4)]
                 non_empty = [val for val in row_values if val is not None]
                 if non_empty:
                     header_row = row_idx
@@ -221,14 +242,14 @@ def inspect_excel_file(file_path):
             
             # Check every 4 columns (company data blocks)
             for col_idx in range(1, min(100, max_col), 4):
-                company_name = sheet.cell(row=header_row, column=col_idx).value
+                company_name = _window_value(window, header_row, col_idx)
                 if company_name:
                     print(f"\nAnalisando dados para: {company_name}")
                     
                     # Look for dates in this column
                     dates_found = []
                     for row_idx in range(header_row + 1, min(header_row + 100, max_row)):
-                        cell_value = sheet.cell(row=row_idx, column=col_idx).value
+                        cell_value = _window_value(window, row_idx, col_idx)
                         
                         # Try to identify if it's a date
                         if isinstance(cell_value, (datetime.datetime, datetime.date)):
@@ -275,13 +296,13 @@ def inspect_excel_file(file_path):
             recent_dates = {}
             
             for col_idx in range(1, min(100, max_col), 4):
-                company_name = sheet.cell(row=header_row, column=col_idx).value
+                company_name = _window_value(window, header_row, col_idx)
                 if not company_name:
                     continue
                     
                 # Look for dates in this column more extensively
                 for row_idx in range(header_row + 1, min(header_row + 500, max_row)):
-                    cell_value = sheet.cell(row=row_idx, column=col_idx).value
+                    cell_value = _window_value(window, row_idx, col_idx)
                     
                     # Handle both datetime and date objects correctly
                     if isinstance(cell_value, datetime.datetime):
@@ -359,10 +380,82 @@ def inspect_excel_file(file_path):
         traceback.print_exc()
         return False
 
-# After the inspect_excel_file function, add this new function:
+def _block_date(cell_value):
+    """Date in a company date column: datetime, d/m/y or y-m-d text, or an Excel serial number"""
+    # Check for datetime objects
+    if isinstance(cell_value, (datetime.datetime, datetime.date)):
+        return cell_value
+    
+    # Check for string dates with / or -
+    if isinstance(cell_value, str) and '/' in cell_value:
+        parts = cell_value.split('/')
+        if len(parts) == 3:
+            try:
+                day, month, year = map(int, parts)
+                # Handle 2-digit years
+                if year < 100:
+                    year = 2000 + year if year < 50 else 1900 + year
+                return datetime.datetime(year, month, day)
+            except ValueError:
+                pass
+    elif isinstance(cell_value, str) and '-' in cell_value:
+        # Try different date formats
+        for fmt in ["%Y-%m-%d", "%d-%m-%Y"]:
+            try:
+                return datetime.datetime.strptime(cell_value, fmt)
+            except ValueError:
+                pass
+    
+    # Check for Excel serial dates (numbers)
+    elif isinstance(cell_value, (int, float)) and 30000 < cell_value < 50000:  # Reasonable range for Excel dates
+        return datetime.datetime(1899, 12, 30) + datetime.timedelta(days=int(cell_value))
+    return None
+
+def _any_date(cell_value):
+    """Date in any cell, trying every usual text format (busca abrangente)"""
+    if isinstance(cell_value, (datetime.datetime, datetime.date)):
+        return cell_value
+    
+    if isinstance(cell_value, str):
+        date_formats = [
+            "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y",
+            "%d-%m-%Y", "%Y-%m-%d", "%m-%d-%Y",
+            "%d.%m.%Y", "%Y.%m.%d", "%m.%d.%Y"
+        ]
+        for fmt in date_formats:
+            try:
+                return datetime.datetime.strptime(cell_value, fmt)
+            except ValueError:
+                continue
+    
+    elif isinstance(cell_value, (int, float)) and 30000 < cell_value < 50000:
+        return datetime.datetime(1899, 12, 30) + datetime.timedelta(days=int(cell_value))
+    return None
+
+def _scan_dates(sheet, rows, columns, find_date):
+    """Stream the given rows of the sheet; (number of date cells, most recent date) among the given columns"""
+    date_count = 0
+    most_recent_date = None
+    if not rows or not columns:
+        return date_count, most_recent_date
+    
+    for row in sheet.iter_rows(min_row=rows.start, max_row=rows.stop - 1, max_col=max(columns), values_only=True):
+        for col_idx in columns:
+            date_obj = find_date(row[col_idx - 1]) if col_idx <= len(row) else None
+            if date_obj:
+                date_count += 1
+                if most_recent_date is None or date_obj > most_recent_date:
+                    most_recent_date = date_obj
+                    print(f"  Nova data mais recente: {date_obj.strftime('%d/%m/%Y')}")
+    return date_count, most_recent_date
 
 def update_dates_in_file(file_path, output_path=None):
-    """Update dates in the Excel file to current dates for testing purposes"""
+    """Update dates in the Excel file to current dates for testing purposes.
+
+    The source is streamed twice in read-only mode (find the dates, then copy
+    the values with the dates shifted) into a write-only workbook, so neither
+    workbook is ever held in memory.
+    """
     if output_path is None:
         # Create a new filename with _updated suffix
         base_name, ext = os.path.splitext(file_path)
@@ -373,12 +466,11 @@ def update_dates_in_file(file_path, output_path=None):
     print(f"Arquivo atualizado será salvo em: {output_path}")
     
     try:
-        # Use openpyxl for more direct control over the file
         from openpyxl import load_workbook, Workbook
         
-        print("Carregando arquivo com openpyxl...")
+        print("Carregando arquivo com openpyxl (somente leitura)...")
         # Load with data_only=True to get calculated values instead of formulas
-        wb = load_workbook(file_path, data_only=True)
+        wb = load_workbook(file_path, data_only=True, read_only=True)
         
         if wb.active:
             sheet = wb.active
@@ -389,37 +481,17 @@ def update_dates_in_file(file_path, output_path=None):
             return False
         
         print(f"Nome da planilha: {sheet.title}")
+        dimensions = sheet.calculate_dimension(force=True)
         max_row = sheet.max_row
         max_col = sheet.max_column
-        print(f"Dimensões: {sheet.dimensions}")
+        print(f"Dimensões: {dimensions}")
         print(f"Número de linhas: {max_row}, Número de colunas: {max_col}")
         
-        # Create a new workbook with static values
-        print("Criando nova planilha com valores estáticos...")
-        new_wb = Workbook()
-        new_sheet = new_wb.active
-        new_sheet.title = sheet.title
-        
-        # Copy all content from original to new workbook as static values
-        print("Copiando conteúdo como valores estáticos...")
-        for row_idx in range(1, max_row + 1):
-            if row_idx % 100 == 0:
-                print(f"  Copiando linha {row_idx} de {max_row}...")
-            for col_idx in range(1, max_col + 1):
-                try:
-                    # Get the value (not the formula)
-                    cell_value = sheet.cell(row=row_idx, column=col_idx).value
-                    # Set the value in the new sheet
-                    new_sheet.cell(row=row_idx, column=col_idx).value = cell_value
-                except Exception as e:
-                    print(f"Erro ao copiar célula ({row_idx}, {col_idx}): {str(e)}")
-        
-        print("Cópia concluída com sucesso!")
-        
         # Look for the header row (first row with company names)
+        top_rows = list(sheet.iter_rows(min_row=1, max_row=20, max_col=20, values_only=True))
         header_row = None
         for row_idx in range(1, min(20, max_row)):
-            row_values = [new_sheet.cell(row=row_idx, column=col).value for col in range(1, min(20, max_col), 4)]
+            row_values = [_window_value(top_rows, row_idx, col) for col in range(1, min(20, max_col), 4)]
             non_empty = [val for val in row_values if val is not None]
             if non_empty:
                 header_row = row_idx
@@ -433,173 +505,73 @@ def update_dates_in_file(file_path, output_path=None):
         
         # Find the most recent date in the file
         print("\nProcurando a data mais recente no arquivo...")
-        most_recent_date = None
-        date_cells = []
+        header = [next(sheet.iter_rows(min_row=header_row, max_row=header_row, values_only=True), ())]
         
         # Check every 4 columns (company data blocks)
+        date_columns = []
         for col_idx in range(1, min(max_col, 2000), 4):
-            company_name = new_sheet.cell(row=header_row, column=col_idx).value
-            if not company_name:
-                continue
-                
-            print(f"Verificando datas para: {company_name}")
-            
-            # Look for dates in this column
-            for row_idx in range(header_row + 1, min(header_row + 1000, max_row)):
-                cell_value = new_sheet.cell(row=row_idx, column=col_idx).value
-                
-                # Try to identify if it's a date
-                date_obj = None
-                
-                # Check for datetime objects
-                if isinstance(cell_value, (datetime.datetime, datetime.date)):
-                    date_obj = cell_value
-                    print(f"  Data encontrada: {date_obj.strftime('%d/%m/%Y')} na célula ({row_idx}, {col_idx})")
-                
-                # Check for string dates with / or -
-                elif isinstance(cell_value, str) and ('/' in cell_value or '-' in cell_value):
-                    try:
-                        if '/' in cell_value:
-                            parts = cell_value.split('/')
-                            if len(parts) == 3:
-                                try:
-                                    day, month, year = map(int, parts)
-                                    # Handle 2-digit years
-                                    if year < 100:
-                                        year = 2000 + year if year < 50 else 1900 + year
-                                    date_obj = datetime.datetime(year, month, day)
-                                    print(f"  Data string encontrada: {cell_value} -> {date_obj.strftime('%d/%m/%Y')} na célula ({row_idx}, {col_idx})")
-                                except ValueError:
-                                    # Try other formats
-                                    try:
-                                        date_obj = datetime.datetime.strptime(cell_value, "%d/%m/%Y")
-                                    except:
-                                        pass
-                        elif '-' in cell_value:
-                            # Try different date formats
-                            for fmt in ["%Y-%m-%d", "%d-%m-%Y"]:
-                                try:
-                                    date_obj = datetime.datetime.strptime(cell_value, fmt)
-                                    print(f"  Data string encontrada: {cell_value} -> {date_obj.strftime('%d/%m/%Y')} na célula ({row_idx}, {col_idx})")
-                                    break
-                                except:
-                                    pass
-                    except Exception as e:
-                        print(f"  Erro ao processar possível data: {cell_value}, erro: {str(e)}")
-                
-                # Check for Excel serial dates (numbers)
-                elif isinstance(cell_value, (int, float)) and 30000 < cell_value < 50000:  # Reasonable range for Excel dates
-                    try:
-                        # Convert Excel date to Python date
-                        date_obj = datetime.datetime(1899, 12, 30) + datetime.timedelta(days=int(cell_value))
-                        print(f"  Data numérica encontrada: {cell_value} -> {date_obj.strftime('%d/%m/%Y')} na célula ({row_idx}, {col_idx})")
-                    except Exception as e:
-                        print(f"  Erro ao processar possível data numérica: {cell_value}, erro: {str(e)}")
-                
-                if date_obj:
-                    date_cells.append((row_idx, col_idx, date_obj))
-                    if most_recent_date is None or date_obj > most_recent_date:
-                        most_recent_date = date_obj
-                        print(f"  Nova data mais recente: {most_recent_date.strftime('%d/%m/%Y')}")
+            company_name = _window_value(header, 1, col_idx)
+            if company_name:
+                print(f"Verificando datas para: {company_name}")
+                date_columns.append(col_idx)
         
-        print(f"Total de datas encontradas: {len(date_cells)}")
+        date_rows = range(header_row + 1, min(header_row + 1000, max_row))
+        find_date = _block_date
+        date_count, most_recent_date = _scan_dates(sheet, date_rows, date_columns, find_date)
+        print(f"Total de datas encontradas: {date_count}")
         
         # If no dates found, try a more aggressive search
-        if not date_cells:
+        if not date_count:
             print("Nenhuma data encontrada no arquivo.")
             print("\nRealizando busca mais abrangente por datas...")
             
             # Scan the entire file for dates
-            for col_idx in range(1, min(max_col, 2000)):
-                if col_idx % 100 == 0:
-                    print(f"  Verificando coluna {col_idx} de {min(max_col, 2000)}...")
-                
-                for row_idx in range(1, min(max_row, 5000)):
-                    cell_value = new_sheet.cell(row=row_idx, column=col_idx).value
-                    
-                    # Try to identify if it's a date using all methods
-                    date_obj = None
-                    
-                    # Check for datetime objects
-                    if isinstance(cell_value, (datetime.datetime, datetime.date)):
-                        date_obj = cell_value
-                    
-                    # Check for string dates
-                    elif isinstance(cell_value, str):
-                        # Try multiple date formats
-                        date_formats = [
-                            "%d/%m/%Y", "%Y/%m/%d", "%m/%d/%Y",
-                            "%d-%m-%Y", "%Y-%m-%d", "%m-%d-%Y",
-                            "%d.%m.%Y", "%Y.%m.%d", "%m.%d.%Y"
-                        ]
-                        
-                        for fmt in date_formats:
-                            try:
-                                date_obj = datetime.datetime.strptime(cell_value, fmt)
-                                break
-                            except:
-                                continue
-                    
-                    # Check for Excel serial dates
-                    elif isinstance(cell_value, (int, float)) and 30000 < cell_value < 50000:
-                        try:
-                            date_obj = datetime.datetime(1899, 12, 30) + datetime.timedelta(days=int(cell_value))
-                        except:
-                            pass
-                    
-                    if date_obj:
-                        date_cells.append((row_idx, col_idx, date_obj))
-                        if most_recent_date is None or date_obj > most_recent_date:
-                            most_recent_date = date_obj
-                            print(f"Data encontrada: {date_obj.strftime('%d/%m/%Y')} na célula ({row_idx}, {col_idx})")
-            
-            print(f"Total de datas encontradas após busca abrangente: {len(date_cells)}")
-        
-        # If still no dates found, create a JSON with the static data
-        if not date_cells:
-            print("Ainda não foi possível encontrar datas no arquivo.")
-            print("Criando JSON com os dados estáticos sem atualizar datas...")
-            
-            # Save the static copy anyway
-            print(f"\nSalvando arquivo estático em: {output_path}")
-            new_wb.save(output_path)
-            print("Arquivo estático salvo com sucesso!")
-            
-            return output_path
+            date_rows = range(1, min(max_row, 5000))
+            date_columns = list(range(1, min(max_col, 2000)))
+            find_date = _any_date
+            date_count, most_recent_date = _scan_dates(sheet, date_rows, date_columns, find_date)
+            print(f"Total de datas encontradas após busca abrangente: {date_count}")
         
         # Calculate the date shift needed
         today = datetime.datetime.now().date()
+        days_to_shift = 0
         
-        if most_recent_date:
+        if not date_count:
+            # If still no dates found, save a static copy
+            print("Ainda não foi possível encontrar datas no arquivo.")
+            print("Criando cópia com os dados estáticos sem atualizar datas...")
+        elif most_recent_date:
             most_recent_date_only = most_recent_date.date() if isinstance(most_recent_date, datetime.datetime) else most_recent_date
             days_to_shift = (today - most_recent_date_only).days
             print(f"Data mais recente encontrada: {most_recent_date_only}")
             print(f"Dias a avançar: {days_to_shift}")
-        else:
-            # Default to shifting by 30 days
-            days_to_shift = 30
-            print(f"Usando deslocamento padrão de {days_to_shift} dias.")
         
-        # Update all dates in the file
-        print("\nAtualizando datas no arquivo...")
+        # Copy all content as static values, shifting the dates found above
+        print("\nCopiando conteúdo como valores estáticos e atualizando datas...")
+        new_wb = Workbook(write_only=True)
+        new_sheet = new_wb.create_sheet(sheet.title)
         updated_cells = 0
         
-        # First update the cells we already identified
-        for row_idx, col_idx, date_obj in date_cells:
-            try:
-                # Convert date to datetime if needed
-                if isinstance(date_obj, datetime.date) and not isinstance(date_obj, datetime.datetime):
-                    date_obj = datetime.datetime.combine(date_obj, datetime.time())
-                
-                new_date = date_obj + datetime.timedelta(days=days_to_shift)
-                new_sheet.cell(row=row_idx, column=col_idx).value = new_date
-                updated_cells += 1
-                
-                # Progress indicator
-                if updated_cells % 1000 == 0:
-                    print(f"  {updated_cells} células atualizadas...")
-            except Exception as e:
-                print(f"Erro ao atualizar célula ({row_idx}, {col_idx}): {str(e)}")
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True), start=1):
+            if row_idx % 100 == 0:
+                print(f"  Copiando linha {row_idx} de {max_row}...")
+            values = list(row)
+            if date_count and row_idx in date_rows:
+                for col_idx in date_columns:
+                    date_obj = find_date(values[col_idx - 1]) if col_idx <= len(values) else None
+                    if not date_obj:
+                        continue
+                    # Convert date to datetime if needed
+                    if isinstance(date_obj, datetime.date) and not isinstance(date_obj, datetime.datetime):
+                        date_obj = datetime.datetime.combine(date_obj, datetime.time())
+                    values[col_idx - 1] = date_obj + datetime.timedelta(days=days_to_shift)
+                    updated_cells += 1
+                    
+                    # Progress indicator
+                    if updated_cells % 1000 == 0:
+                        print(f"  {updated_cells} células atualizadas...")
+            new_sheet.append(values)
+        wb.close()
         
         print(f"Total de células atualizadas: {updated_cells}")
         
@@ -616,6 +588,340 @@ def update_dates_in_file(file_path, output_path=None):
         traceback.print_exc()
         return False
 
+def read_history_dataframe(file_path):
+    """Read the history workbook into a DataFrame, trying each supported engine"""
+    # Try different engines with explicit literals
+    df = None
+    
+    # Try openpyxl first (for .xlsx files)
+    try:
+        print("Tentando engine: openpyxl")
+        df = pd.read_excel(file_path, header=None, engine='openpyxl')
+        print("Leitura bem-sucedida com engine: openpyxl")
+    except Exception as e:
+        print(f"Falha ao ler com engine openpyxl: {str(e)}")
+        
+        # Try xlrd (for .xls files)
+        try:
+            print("Tentando engine: xlrd")
+            df = pd.read_excel(file_path, header=None, engine='xlrd')
+            print("Leitura bem-sucedida com engine: xlrd")
+        except Exception as e:
+            print(f"Falha ao ler com engine xlrd: {str(e)}")
+            
+            # Try other engines if needed
+            try:
+                print("Tentando engine: odf")
+                df = pd.read_excel(file_path, header=None, engine='odf')
+                print("Leitura bem-sucedida com engine: odf")
+            except Exception as e:
+                print(f"Falha ao ler com engine odf: {str(e)}")
+    
+    if df is None:
+        # Try to read as CSV as a fallback
+        try:
+            print("Tentando ler como CSV...")
+            df = pd.read_csv(file_path, header=None)
+            print("Leitura bem-sucedida como CSV")
+        except Exception as e:
+            print(f"Falha ao ler como CSV: {str(e)}")
+            raise ValueError("Não foi possível ler o arquivo em nenhum formato suportado")
+    
+    return df
+
+# Células lidas por vez na leitura em streaming: com milhares de empresas um lote tem poucas linhas
+BATCH_CELLS = 200_000
+
+# Tipos de célula que o format_date trata como data e como número de série do Excel
+DATETIME_TYPES = [datetime.datetime, pd.Timestamp]
+NUMBER_TYPES = [int, float, bool, np.float64]
+EXCEL_EPOCH = np.datetime64("1899-12-30", "D")
+# Números de série além disso estouram o datetime do Python (o format_date devolve o texto)
+MAX_SERIAL_DAYS = 2_900_000
+
+# Texto "d/m/a" com três inteiros, como o split("/") + int() do format_date aceita
+SLASH_DATE = r"^\s*([+-]?\d+)\s*/\s*([+-]?\d+)\s*/\s*([+-]?\d+)\s*$"
+
+def _cell_types(series):
+    return series.map(type)
+
+def _to_float(values):
+    """float64 array of cells converted like float(x) / float(str(x).replace(",", ".")); NaN where that fails"""
+    series = pd.Series(values, dtype=object)
+    types = _cell_types(series)
+    result = np.full(len(series), np.nan)
+    numbers = types.isin(NUMBER_TYPES).to_numpy()
+    if numbers.any():
+        result[numbers] = series[numbers].astype(float).to_numpy()
+    texts = (types == str).to_numpy()
+    if texts.any():
+        converted = pd.to_numeric(series[texts].str.replace(",", ".", regex=False).str.strip(), errors="coerce")
+        result[texts] = converted.to_numpy(dtype=float, na_value=np.nan)
+    return result
+
+def _dates_from_parts(day, month, year):
+    """datetime64[D] from integer arrays, NaT where they are not a valid date"""
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & (year >= 1) & (year <= 9999)
+    months = np.where(valid, (year - 1970) * 12 + (month - 1), 0).astype("datetime64[M]")
+    dates = months.astype("datetime64[D]") + np.where(valid, day - 1, 0).astype("timedelta64[D]")
+    # 31/02 cai em março: não é uma data
+    valid &= dates.astype("datetime64[M]") == months
+    return np.where(valid, dates, np.datetime64("NaT", "D"))
+
+def _date_text(dates):
+    """dd/mm/yyyy of datetime64[D] values (like strftime("%d/%m/%Y"))"""
+    iso = pd.Series(np.datetime_as_string(dates, unit="D"), dtype=object).str
+    return (iso[8:10] + "/" + iso[5:7] + "/" + iso[0:4]).to_numpy(dtype=object)
+
+def format_dates(values):
+    """Vectorized format_date: (dd/mm/yyyy texts, datetime64[D] dates with NaT when the text is not a date)"""
+    series = pd.Series(values, dtype=object)
+    types = _cell_types(series)
+    text = np.empty(len(series), dtype=object)
+    dates = np.full(len(series), np.datetime64("NaT", "D"))
+    pending = np.ones(len(series), dtype=bool)
+
+    # Datas do Excel (datetime/Timestamp): só o dia importa
+    stamps = types.isin(DATETIME_TYPES).to_numpy()
+    if stamps.any():
+        dates[stamps] = pd.to_datetime(series[stamps]).to_numpy().astype("datetime64[D]")
+        text[stamps] = _date_text(dates[stamps])
+        pending &= ~stamps
+
+    # Números de série do Excel
+    numbers = types.isin(NUMBER_TYPES).to_numpy()
+    if numbers.any():
+        serials = series[numbers].astype(float).to_numpy()
+        in_range = np.isfinite(serials) & (np.abs(serials) < MAX_SERIAL_DAYS)
+        selected = np.flatnonzero(numbers)[in_range]
+        dates[selected] = EXCEL_EPOCH + np.trunc(serials[in_range]).astype("timedelta64[D]")
+        text[selected] = _date_text(dates[selected])
+        pending[selected] = False
+
+    texts = (types == str).to_numpy()
+    if texts.any():
+        strings = series[texts]
+        # "d/m/a": dia e mês com dois dígitos, ano como veio
+        parts = strings.str.extract(SLASH_DATE)
+        slash = parts[0].notna().to_numpy()
+        if slash.any():
+            selected = np.flatnonzero(texts)[slash]
+            numbers_dmy = parts[slash].astype("int64")
+            day, month, year = (numbers_dmy[column] for column in (0, 1, 2))
+            text[selected] = (day.astype(str).str.zfill(2) + "/" + month.astype(str).str.zfill(2) + "/"
+                              + year.astype(str)).to_numpy(dtype=object)
+            dates[selected] = _dates_from_parts(day.to_numpy(), month.to_numpy(), year.to_numpy())
+            pending[selected] = False
+        # "aaaa-mm-dd"
+        dashed = (~strings.str.contains("/", regex=False) & strings.str.contains("-", regex=False)).to_numpy()
+        if dashed.any():
+            parsed = pd.to_datetime(strings[dashed], format="%Y-%m-%d", errors="coerce")
+            ok = parsed.notna().to_numpy()
+            selected = np.flatnonzero(texts)[dashed][ok]
+            dates[selected] = parsed[ok].to_numpy().astype("datetime64[D]")
+            text[selected] = _date_text(dates[selected])
+            pending[selected] = False
+
+    # O resto (textos que não são data, outros tipos) passa pelo format_date, célula a célula
+    for index in np.flatnonzero(pending):
+        text[index] = format_date(series.iat[index])
+    return text, dates
+
+def _history_header(header_row):
+    """Company names, tickers and block indexes of the header row, and the sheet width padded to whole blocks"""
+    header = np.array(list(header_row), dtype=object)
+    # Completa o último bloco para dar 4 colunas por empresa
+    header = np.concatenate([header, np.full(-len(header) % 4, np.nan, dtype=object)])
+    names, codes = header[0::4], header[1::4]
+    companies = np.flatnonzero(~pd.isna(names) & ~pd.isna(codes))
+    return names, codes, companies, len(header)
+
+def _block_cells(rows, companies, first_row):
+    """Cells of a (rows x width) object array as one row per (company, sheet row), with both indexes"""
+    n_rows = rows.shape[0]
+    # (linha, bloco, coluna) -> (empresa, linha) x (data, preço, volume, vazia)
+    cells = rows.reshape(n_rows, rows.shape[1] // 4, 4)[:, companies, :].transpose(1, 0, 2).reshape(-1, 4)
+    company_of = np.repeat(np.arange(len(companies), dtype=np.int32), n_rows)
+    row_of = np.tile(np.arange(first_row, first_row + n_rows, dtype=np.int32), len(companies))
+    return cells, company_of, row_of
+
+def _history_columns(cells, company_of, row_of):
+    """Convert block cells into compact columns, dropping rows without date or price.
+
+    Returns (company, sheet row, date, text, price, volume); the text is None
+    when it is just the dd/mm/yyyy of the date, so rows cost a few numbers each.
+    """
+    # Linhas sem data ou com preço vazio/inválido ficam de fora
+    keep = ~pd.isna(cells[:, 0])
+    prices = _to_float(cells[keep, 1])
+    priced = ~np.isnan(prices)
+    kept = np.flatnonzero(keep)[priced]
+    texts, dates = format_dates(cells[kept, 0])
+    texts[~np.isnat(dates) & (texts == _date_text(dates))] = None
+    volumes = _to_float(cells[kept, 2])
+    return company_of[kept], row_of[kept], dates, texts, prices[priced], volumes
+
+def _latest_date(dates):
+    dates = dates[~np.isnat(dates)]
+    return datetime.datetime.combine(dates.max().astype(datetime.date), datetime.time()) if len(dates) else None
+
+def historic_records(names, codes, companies, columns):
+    """Yield each company's record (newest prices first), printing the progress lines as it goes"""
+    company_of, row_of, dates, texts, prices, volumes = columns
+
+    # Mais recentes primeiro em cada empresa, empate na ordem da planilha. Sem data válida vai para o
+    # topo como "agora", a última linha primeiro (cada linha tinha seu próprio datetime.now())
+    undated = np.isnat(dates)
+    now = np.datetime64(datetime.datetime.now(), "s")
+    sort_key = np.where(undated, now, dates.astype("datetime64[s]")).astype("int64")
+    order = np.lexsort((np.where(undated, -row_of, row_of), -sort_key, company_of))
+
+    ends = np.cumsum(np.bincount(company_of, minlength=len(companies)))
+    start = 0
+    for position, block in enumerate(companies):
+        end = ends[position]
+        empresa, codigo = names[block], codes[block]
+        print(f"Processando empresa: {empresa} ({codigo})")
+        print(f"  Linhas processadas para {codigo}: {end - start}")
+
+        if end > start:
+            rows = order[start:end]
+            latest_company_date = _latest_date(dates[rows])
+            latest_date_str = latest_company_date.strftime("%d/%m/%Y") if latest_company_date else "N/A"
+            print(f"  Data mais recente para {codigo}: {latest_date_str}")
+
+            company_texts = texts[rows]
+            derived = np.equal(company_texts, None)
+            company_texts[derived] = _date_text(dates[rows][derived])
+            company_volumes = volumes[rows].astype(object)
+            company_volumes[np.isnan(volumes[rows])] = None
+
+            yield {
+                "empresa": empresa,
+                "codigo": codigo,
+                "historicoPrecos": [
+                    {"data": data, "preco": preco, "volume": volume}
+                    for data, preco, volume in zip(company_texts, prices[rows].tolist(), company_volumes.tolist())
+                ]
+            }
+        start = end
+
+def _history(header_row, batches):
+    """(names, codes, company blocks, columns) of a header row and batches of (rows x any width) cells"""
+    names, codes, companies, width = _history_header(header_row)
+    parts = []
+    first_row = 0
+    for batch in batches:
+        parts.append(_history_columns(*_block_cells(batch, companies, first_row)))
+        first_row += len(batch)
+    if not parts:
+        parts.append(_history_columns(*_block_cells(np.empty((0, width), dtype=object), companies, 0)))
+    return names, codes, companies, tuple(np.concatenate(field) for field in zip(*parts))
+
+def dataframe_history(df):
+    """Parsed history of a sheet already loaded as a DataFrame (header=None)"""
+    values = df.to_numpy(dtype=object)
+    if values.shape[0] < 2:
+        return _history((), [])
+
+    width = _history_header(values[0])[3]
+    rows = np.full((values.shape[0] - 1, width), np.nan, dtype=object)
+    rows[:, :values.shape[1]] = values[1:]
+    return _history(values[0], [rows])
+
+def _row_batches(rows, width, batch_rows):
+    """Group streamed row tuples into (batch_rows x width) object arrays"""
+    batch = []
+    for row in rows:
+        row = row[:width]
+        batch.append(row + (None,) * (width - len(row)))
+        if len(batch) == batch_rows:
+            yield np.array(batch, dtype=object)
+            batch = []
+    if batch:
+        yield np.array(batch, dtype=object)
+
+def read_history(file_path, batch_cells=BATCH_CELLS):
+    """Parse the history workbook streaming its first sheet in read-only mode.
+
+    Rows are read in batches of about BATCH_CELLS cells and reduced to compact
+    NumPy columns, so memory does not grow with the number of tickers and the
+    workbook is never held as cells or as a DataFrame.
+    Returns (names, codes, company blocks, columns).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        # A primeira planilha, a mesma que o pd.read_excel lê
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, ())
+        width = _history_header(header_row)[3]
+        return _history(header_row, _row_batches(rows, width, max(1, batch_cells // max(width, 1))))
+    finally:
+        wb.close()
+
+def save_history_store(history, path=None, incremental=False):
+    """Replace the columnar price history (Finais/Historico by default) with a parsed workbook.
+
+    With incremental, each ticker only gets the rows after its latest stored
+    day appended, and tickers missing from the workbook are kept. Rows without
+    a valid date cannot be stored and are left out; blocks that repeat a
+    ticker are merged into one series.
+    """
+    names, codes, companies, columns = history
+    company_of, row_of, dates, _, prices, volumes = columns
+    dated = ~np.isnat(dates)
+    company_of, row_of, prices, volumes = company_of[dated], row_of[dated], prices[dated], volumes[dated]
+    days = days_of(dates[dated])
+
+    # Um ticker por código, na ordem da planilha (nome da primeira empresa); linhas do mais antigo para o mais recente
+    first_block = {}
+    for block in companies:
+        first_block.setdefault(str(codes[block]), block)
+    tickers = list(first_block)
+    position_of = {codigo: position for position, codigo in enumerate(tickers)}
+    ticker_of = np.array([position_of[str(codes[block])] for block in companies], dtype=np.int64)[company_of]
+    order = np.lexsort((row_of, company_of, days, ticker_of))
+    ends = np.cumsum(np.bincount(ticker_of, minlength=len(tickers)))
+
+    store = PriceHistory(path or HISTORY_DIR)
+    written = set()
+    appended = 0
+    start = 0
+    for position, codigo in enumerate(tickers):
+        rows = order[start:ends[position]]
+        start = ends[position]
+        if not len(rows):
+            continue
+        if incremental:
+            appended += store.append(codigo, names[first_block[codigo]], days[rows], prices[rows], volumes[rows])
+        else:
+            store.write(codigo, names[first_block[codigo]], days[rows], prices[rows], volumes[rows])
+        written.add(codigo)
+    if incremental:
+        print(f"Linhas novas acrescentadas ao histórico: {appended}")
+    else:
+        # Tickers que saíram da planilha (ou ficaram sem preços)
+        for codigo in [codigo for codigo in store.tickers if codigo not in written]:
+            store.remove(codigo)
+    store.save()
+    return store
+
+def save_historic_json(historic_data, output_dir=None):
+    """Save the price history to Finais/empresasHistorico.json"""
+    # Save to JSON file
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(__file__), "Finais")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    output_json_path = os.path.join(output_dir, "empresasHistorico.json")
+    
+    save_json(output_json_path, historic_data, indent=2)
+    
+    return output_json_path
+
 # Modify the process_excel function to include an option to update dates
 def process_excel():
     """Process the Excel file and extract stock price history"""
@@ -646,165 +952,29 @@ def process_excel():
     print("\n-- Iniciando processamento do arquivo Excel")
     
     try:
-        # Read the Excel file with pandas - try different engines
+        # Stream the workbook in read-only mode; .xls/.csv fall back to pandas with the other engines
         print("Lendo arquivo Excel...")
-        
-        # Try different engines with explicit literals
-        df = None
-        
-        # Try openpyxl first (for .xlsx files)
         try:
-            print("Tentando engine: openpyxl")
-            df = pd.read_excel(file_path, header=None, engine='openpyxl')
-            print("Leitura bem-sucedida com engine: openpyxl")
+            history = read_history(file_path)
         except Exception as e:
-            print(f"Falha ao ler com engine openpyxl: {str(e)}")
-            
-            # Try xlrd (for .xls files)
-            try:
-                print("Tentando engine: xlrd")
-                df = pd.read_excel(file_path, header=None, engine='xlrd')
-                print("Leitura bem-sucedida com engine: xlrd")
-            except Exception as e:
-                print(f"Falha ao ler com engine xlrd: {str(e)}")
-                
-                # Try other engines if needed
-                try:
-                    print("Tentando engine: odf")
-                    df = pd.read_excel(file_path, header=None, engine='odf')
-                    print("Leitura bem-sucedida com engine: odf")
-                except Exception as e:
-                    print(f"Falha ao ler com engine odf: {str(e)}")
-        
-        if df is None:
-            # Try to read as CSV as a fallback
-            try:
-                print("Tentando ler como CSV...")
-                df = pd.read_csv(file_path, header=None)
-                print("Leitura bem-sucedida como CSV")
-            except Exception as e:
-                print(f"Falha ao ler como CSV: {str(e)}")
-                raise ValueError("Não foi possível ler o arquivo em nenhum formato suportado")
-        
-        print(f"Dimensões do DataFrame: {df.shape}")
-        
-        # Process the data
-        historic_data = []
-        latest_date = None
-        
-        # Get the header row
-        header_row = df.iloc[0]
-        
-        # Process data in columns (every 4 columns)
-        for col_index in range(0, len(header_row), 4):
-            empresa = header_row[col_index]
-            codigo = header_row[col_index + 1]
-            
-            if pd.isna(empresa) or pd.isna(codigo):
-                continue
-            
-            print(f"Processando empresa: {empresa} ({codigo})")
-            
-            historico_precos = []
-            latest_company_date = None
-            processed_rows = 0
-            
-            # Process rows for this company
-            for row_index in range(1, len(df)):
-                row = df.iloc[row_index]
-                
-                if col_index >= len(row):
-                    continue
-                
-                data_value = row[col_index]
-                preco_value = row[col_index + 1]
-                volume_value = row[col_index + 2] if col_index + 2 < len(row) else None
-                
-                # Skip rows without date or price
-                if (pd.isna(data_value) and pd.isna(preco_value)) or pd.isna(data_value):
-                    continue
-                
-                # Process date
-                data_formatada = format_date(data_value)
-                date_obj = None
-                
-                try:
-                    if data_formatada and "/" in data_formatada:
-                        parts = data_formatada.split("/")
-                        if len(parts) == 3:
-                            day, month, year = map(int, parts)
-                            date_obj = datetime.datetime(year, month, day)
-                except Exception as e:
-                    print(f"Erro ao converter data para objeto: {data_formatada}, {str(e)}")
-                
-                # Process price
-                preco = preco_value
-                if pd.isna(preco):
-                    continue
-                
-                if not isinstance(preco, (int, float)):
-                    try:
-                        preco = float(str(preco).replace(",", "."))
-                    except:
-                        continue
-                
-                # Process volume
-                volume = volume_value
-                if volume is not None:
-                    if pd.isna(volume):
-                        volume = None
-                    elif not isinstance(volume, (int, float)):
-                        try:
-                            volume = float(str(volume).replace(",", "."))
-                        except:
-                            volume = None
-                
-                # Update latest date
-                if date_obj:
-                    if latest_date is None or date_obj > latest_date:
-                        latest_date = date_obj
-                    
-                    if latest_company_date is None or date_obj > latest_company_date:
-                        latest_company_date = date_obj
-                
-                historico_precos.append({
-                    "data": data_formatada,
-                    "preco": float(preco),
-                    "volume": float(volume) if volume is not None and not pd.isna(volume) else None
-                })
-                processed_rows += 1
-            
-            print(f"  Linhas processadas para {codigo}: {processed_rows}")
-            
-            # Only add companies with valid historical data
-            if historico_precos:
-                # Sort historical data by date (newest first)
-                historico_precos.sort(key=lambda x: datetime.datetime.strptime(x["data"], "%d/%m/%Y") if "/" in x["data"] else datetime.datetime.now(), reverse=True)
-                
-                latest_date_str = latest_company_date.strftime("%d/%m/%Y") if latest_company_date else "N/A"
-                print(f"  Data mais recente para {codigo}: {latest_date_str}")
-                
-                historic_data.append({
-                    "empresa": empresa,
-                    "codigo": codigo,
-                    "historicoPrecos": historico_precos
-                })
+            print(f"Falha na leitura em streaming com openpyxl: {str(e)}")
+            df = read_history_dataframe(file_path)
+            print(f"Dimensões do DataFrame: {df.shape}")
+            history = dataframe_history(df)
         
+        latest_date = _latest_date(history[3][2])
         if latest_date:
             print(f"Data mais recente encontrada: {latest_date.strftime('%d/%m/%Y')}")
         
-        # Save to JSON file
-        output_dir = os.path.join(os.path.dirname(__file__), "Finais")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        output_json_path = os.path.join(output_dir, "empresasHistorico.json")
+        store = save_history_store(history, incremental=INCREMENTAL)
+        print(f"Histórico colunar gravado em {store.path} ({len(store)} tickers)")
         
-        with open(output_json_path, "w", encoding="utf-8") as f:
-            json.dump(historic_data, f, ensure_ascii=False, indent=2)
+        if WRITE_JSON:
+            # As empresas são montadas uma a uma enquanto o JSON é gravado
+            output_json_path = save_historic_json(historic_records(*history))
+            print(f"Historical data JSON file created successfully at {output_json_path}!")
         
-        print(f"Historical data JSON file created successfully at {output_json_path}!")
-        print(f"Total de empresas processadas: {len(historic_data)}")
+        print(f"Total de empresas processadas: {np.count_nonzero(np.bincount(history[3][0], minlength=len(history[2])))}")
     
     except Exception as e:
         print(f"Erro ao processar o arquivo Excel: {str(e)}")
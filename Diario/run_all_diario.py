@@ -1,10 +1,26 @@
+import argparse
 import os
 import sys
-import subprocess
 import time
 from datetime import datetime
 
-def run_script(script_name):
+# Módulos compartilhados (execução e medição das etapas, banco SQLite, histórico de preços)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Comum"))
+from armazem import STORE_PATH, AssetStore, import_prices
+from etapas import run_stage
+from historicoPrecos import HISTORY_DIR, MANIFEST, SNAPSHOT_CLASSES, PriceHistory, append_snapshots
+from perfil import append_run_log, describe
+
+# Script de preços -> classe de armazem.PRICE_FILES cujo Diario/Finais/*.json ele grava
+PRICE_SCRIPTS = {
+    "empresasPreco.js": "empresas",
+    "bdrPreco.js": "bdrs",
+    "etfPreco.js": "etfs",
+    "etfBdrPreco.js": "etfs_bdr",
+    "fiisPreco.js": "fiis",
+}
+
+def run_script(script_name, in_process=True, cprofile_path=None):
     
     print(f"\n{'='*80}")
     print(f"Executando {script_name}...")
@@ -15,11 +31,8 @@ def run_script(script_name):
     # Caminho completo para o script
     script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Scripts", script_name)
     
-    # Executa o script
-    if script_name.endswith('.js'):
-        result = subprocess.run(['node', script_path], capture_output=False)
-    else:
-        result = subprocess.run([sys.executable, script_path], capture_output=False)
+    # Executa o script: no próprio processo quando ele expõe main(), senão num subprocesso (node para .js)
+    returncode, figures = run_stage(script_path, in_process=in_process, cprofile_path=cprofile_path)
     
     end_time = time.time()
     execution_time = end_time - start_time
@@ -27,12 +40,21 @@ def run_script(script_name):
     print(f"\n{'='*80}")
     print(f"Finalizado {script_name}")
     print(f"Tempo de execução: {execution_time/60:.2f} minutos ({execution_time:.2f} segundos)")
-    print(f"Status: {'Sucesso' if result.returncode == 0 else 'Falha'}")
+    print(f"Status: {'Sucesso' if returncode == 0 else 'Falha'}")
+    if figures:
+        print(f"Recursos: {describe(figures)}")
     print(f"{'='*80}\n")
     
-    return result.returncode
+    return returncode, figures
 
 def main():
+    parser = argparse.ArgumentParser(description="Executa todos os scripts diários")
+    parser.add_argument("--subprocesso", action="store_true",
+                        help="Executa cada script num interpretador próprio, como antes")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Grava um cProfile (.prof) de cada script Python em Suporte/perfil_<data>/")
+    args = parser.parse_args()
+
     # Lista de scripts para executar em ordem
     scripts = [
         "empresasPreco.js",
@@ -47,8 +69,14 @@ def main():
     log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Suporte")
     os.makedirs(log_dir, exist_ok=True)
     
-    # Arquivo de log
-    log_file = os.path.join(log_dir, f"execucao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    # Arquivo de log (texto) e log estruturado com os recursos de cada script (JSON Lines)
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_file = os.path.join(log_dir, f"execucao_{run_id}.log")
+    run_log = os.path.join(log_dir, "execucao.jsonl")
+    profile_dir = None
+    if args.perfil:
+        profile_dir = os.path.join(log_dir, f"perfil_{run_id}")
+        os.makedirs(profile_dir, exist_ok=True)
     
     # Registra início da execução
     start_time_total = time.time()
@@ -57,8 +85,9 @@ def main():
     # Executa cada script
     results = {}
     for script in scripts:
+        cprofile_path = os.path.join(profile_dir, os.path.splitext(script)[0] + ".prof") if profile_dir else None
         script_start = time.time()
-        exit_code = run_script(script)
+        exit_code, figures = run_script(script, not args.subprocesso, cprofile_path)
         script_end = time.time()
         
         results[script] = {
@@ -66,6 +95,26 @@ def main():
             "status": "Sucesso" if exit_code == 0 else "Falha",
             "tempo": script_end - script_start
         }
+        append_run_log(run_log, dict({"execucao": run_id, "script": script, "inicio": script_start}, **results[script], **figures))
+    
+    # Um script que falhou deixa o Diario/Finais/*.json de ontem: essa classe fica sem as cotações do dia
+    fresh = [classe for script, classe in PRICE_SCRIPTS.items()
+             if results.get(script, {}).get("exit_code") == 0]
+    
+    # Com B3_BANCO, as cotações do dia também vão para o banco (uma linha por ticker)
+    if STORE_PATH and fresh:
+        store = AssetStore()
+        try:
+            import_prices(store, classes=fresh)
+        finally:
+            store.close()
+    
+    # Com o histórico colunar já criado pelo process_excel.py, as cotações do dia viram mais uma linha de cada ticker
+    # (só das classes cujo script de preços terminou sem erro, como no banco)
+    snapshot_classes = [classe for classe in SNAPSHOT_CLASSES if classe in fresh]
+    if snapshot_classes and os.path.exists(os.path.join(HISTORY_DIR, MANIFEST)):
+        appended = append_snapshots(PriceHistory(HISTORY_DIR), classes=snapshot_classes)
+        print(f"Histórico de preços: {appended} linhas acrescentadas em {HISTORY_DIR}")
     
     # Calcula tempo total
     end_time_total = time.time()
@@ -94,6 +143,7 @@ def main():
             f.write(f"  - {script}: {result['status']} ({result['tempo']/60:.2f} min)\n")
     
     print(f"\nLog salvo em: {log_file}")
+    print(f"Recursos por script: {run_log}")
     print(f"{'='*80}\n")
 
 if __name__ == "__main__":
@@ -1,18 +1,21 @@
-import base64
-import requests
 import json
 import os
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import urllib3
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-urllib3.disable_warnings()
 
 # Base directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Gets the Semanal directory
 
+# Módulos compartilhados (cliente B3, gravação de JSON, índice de dividendos, banco SQLite)
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), "Comum"))
+from armazem import STORE_PATH, AssetStore
+from b3Client import MAX_WORKERS, POOL_SIZE, companies_url, funds_url, get_json, get_metrics, get_session
+from dados import save_json as write_json
+from indiceDividendos import DividendIndex, bdr_key, empresa_key, fii_key, parse_date
+
 # Paths
 AUXILIAR_JSON = os.path.join(BASE_DIR, "Jsons", "dividendos_auxiliar.json")
 EMPRESAS_JSON = os.path.join(BASE_DIR, "Jsons", "dividendosEmpresas.json")
@@ -23,55 +26,67 @@ LOG_DIR = os.path.join(BASE_DIR, "Suporte")
 # Ensure directories exist
 os.makedirs(LOG_DIR, exist_ok=True)
 
-def create_session():
-    """Create a session with retry strategy"""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504]
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+# Empresas, BDRs e FIIs são atualizados ao mesmo tempo, cada classe com seu pool de
+# workers; o ritmo das requisições é dado pelo rate limiter compartilhado do cliente B3.
+# Os workers das três classes cabem juntos no pool de conexões da sessão
+ASSET_CLASSES = 3
+WORKERS_PER_CLASS = max(1, min(MAX_WORKERS, POOL_SIZE // ASSET_CLASSES))
 
-def fetch_empresa_dividends(trading_name, session=None):
-    """Fetch dividends for a company"""
-    if session is None:
-        session = create_session()
-        
+_stats_lock = threading.Lock()
+
+def open_index(file_path, key_of, name_field):
+    """Key index saved next to a dividend JSON (dividendosX.indice.json)"""
+    index_path = os.path.splitext(file_path)[0] + ".indice.json"
+    return DividendIndex(index_path, file_path, key_of, name_field)
+
+def reached_known_records(results, since):
+    """True when the page is newest-first and its oldest record was approved before `since`.
+
+    GetListedCashDividends lists the most recent approvals first, so every
+    later page is older still and holds nothing new.
+    """
+    dates = [parse_date(div.get("dateApproval")) for div in results]
+    if not dates or None in dates:
+        return False
+    if any(newer < older for newer, older in zip(dates, dates[1:])):
+        # Página fora de ordem: não dá para confiar na marca, busca tudo
+        return False
+    return dates[-1] < since
+
+def fetch_empresa_dividends(trading_name, session=None, since=None, stats=None):
+    """Fetch dividends for a company.
+
+    With `since` (the company's high-water mark), paging stops at the first page
+    reaching records approved before it. `stats` counts pages read and skipped.
+    """
     params = {
         "language": "pt-br",
         "pageNumber": 1,
         "pageSize": 60,
         "tradingName": trading_name
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetListedCashDividends/"
-    url = base_url + encoded_params
     
     try:
-        response = session.get(url, verify=False)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json(companies_url("GetListedCashDividends", params), session)
         
-        # Get all pages
+        # Get all pages (only the new ones in incremental mode)
         all_results = data['results']
         total_pages = data['page']['totalPages']
+        last_page = data['results']
+        pages_read = 1
         
         for page_number in range(2, total_pages + 1):
+            if since is not None and reached_known_records(last_page, since):
+                break
             params["pageNumber"] = page_number
-            params_str = json.dumps(params)
-            encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-            url = base_url + encoded_params
-            
-            page_response = session.get(url, verify=False)
-            page_response.raise_for_status()
-            page_data = page_response.json()
-            all_results.extend(page_data['results'])
-            time.sleep(0.5)  # Avoid rate limiting
+            last_page = get_json(companies_url("GetListedCashDividends", params), session)['results']
+            all_results.extend(last_page)
+            pages_read += 1
+        
+        if stats is not None:
+            with _stats_lock:
+                stats["paginas_lidas"] += pages_read
+                stats["paginas_puladas"] += max(0, total_pages - pages_read)
             
         # Format dividends
         formatted_dividends = [
@@ -98,15 +113,9 @@ def fetch_bdr_dividends(trading_name):
         "issuingCompany": trading_name,
         "language": "pt-br"
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetListedSupplementBDR/"
-    url = base_url + encoded_params
     
     try:
-        response = requests.get(url, verify=False)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json(companies_url("GetListedSupplementBDR", params))
         
         if not data:
             return []
@@ -128,55 +137,36 @@ def fetch_bdr_dividends(trading_name):
         print(f"Error fetching dividends for BDR {trading_name}: {e}")
         return []
 
-def fetch_fii_dividends(cnpj, acronym, max_retries=3):
-    """Fetch dividends for a FII with retry mechanism"""
-    dividends_url_template = "https://sistemaswebb3-listados.b3.com.br/fundsProxy/fundsCall/GetListedSupplementFunds/{}"
-    
-    dividends_payload = base64.b64encode(json.dumps({
+def fetch_fii_dividends(cnpj, acronym):
+    """Fetch dividends for a FII (rate limit retries are handled by the B3 client)"""
+    dividends_url = funds_url("GetListedSupplementFunds", {
         "cnpj": cnpj,
         "identifierFund": acronym,
         "typeFund": 7
-    }).encode()).decode()
-    
-    dividends_url = dividends_url_template.format(dividends_payload)
+    })
     
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(dividends_url)
-            response.raise_for_status()
-            data = response.json()
-            
-            cash_dividends = [
-                {
-                    "dataPagamento": dividend["paymentDate"],
-                    "valor": dividend["rate"],
-                    "relativo": format_related_to(dividend["relatedTo"]),
-                    "dataAprovacao": dividend["approvedOn"],
-                    "tipoDividendo": dividend["label"],
-                    "ultimoDiaCom": dividend["lastDatePrior"]
-                }
-                for dividend in data.get("cashDividends", [])
-            ]
-            
-            return {
-                "quantidade": data.get('quantity', ''),
-                "dividendos": cash_dividends
+    try:
+        data = get_json(dividends_url)
+        
+        cash_dividends = [
+            {
+                "dataPagamento": dividend["paymentDate"],
+                "valor": dividend["rate"],
+                "relativo": format_related_to(dividend["relatedTo"]),
+                "dataAprovacao": dividend["approvedOn"],
+                "tipoDividendo": dividend["label"],
+                "ultimoDiaCom": dividend["lastDatePrior"]
             }
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:  # Too Many Requests
-                wait_time = (attempt + 1) * 2  # Exponential backoff: 2, 4, 6 seconds
-                print(f"  ⚠ Rate limit hit, waiting {wait_time} seconds before retry ({attempt+1}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"Error fetching dividends for FII {acronym}: {e}")
-                return {"quantidade": "", "dividendos": []}
-        except Exception as e:
-            print(f"Error fetching dividends for FII {acronym}: {e}")
-            return {"quantidade": "", "dividendos": []}
-    
-    print(f"  ✗ Failed after {max_retries} retries")
-    return {"quantidade": "", "dividendos": []}
+            for dividend in data.get("cashDividends", [])
+        ]
+        
+        return {
+            "quantidade": data.get('quantity', ''),
+            "dividendos": cash_dividends
+        }
+    except Exception as e:
+        print(f"Error fetching dividends for FII {acronym}: {e}")
+        return {"quantidade": "", "dividendos": []}
 
 def format_related_to(related_to):
     """Format the 'relativo' field for FII dividends"""
@@ -233,30 +223,38 @@ def load_json(file_path, default=None):
             return default
     return default
 
+def load_records(file_path, name_field):
+    """Full dividend file and its lookup by entity, only read when something has to be merged into it"""
+    records = load_json(file_path)
+    return records, {item[name_field]: item for item in records}
+
 def save_json(file_path, data):
-    """Save data to JSON file"""
+    """Save data to JSON file (atomically: a failed write keeps the previous file)"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        write_json(file_path, data)
         return True
     except Exception as e:
         print(f"Error saving {file_path}: {e}")
         return False
 
-def update_empresas_dividends():
+def update_empresas_dividends(full_refresh=False):
     """Update dividends for companies"""
     print("\n=== Atualizando dividendos de Empresas ===")
     start_time = time.time()
     
-    # Load data
+    # Load data: the key index replaces the full dividend file, which is only read if something is new
     auxiliar_data = load_json(AUXILIAR_JSON)
-    existing_dividends = load_json(EMPRESAS_JSON)
+    index = open_index(EMPRESAS_JSON, empresa_key, "nomeEmpresa")
+    existing_dividends = None
+    existing_lookup = None
+    # Com B3_BANCO, os dividendos novos também entram no banco, linha a linha
+    store = AssetStore() if STORE_PATH else None
     
-    # Create lookup for existing dividends
-    existing_lookup = {item["nomeEmpresa"]: item for item in existing_dividends}
+    # Shared session for requests
+    session = get_session()
     
-    # Create session for requests
-    session = create_session()
+    # Incremental: para cada empresa já conhecida, só as páginas com aprovações novas (--completo busca todas)
+    paging = {"paginas_lidas": 0, "paginas_puladas": 0}
     
     # Track statistics
     total = len(auxiliar_data.get("empresas", []))
@@ -265,41 +263,37 @@ def update_empresas_dividends():
     updated = 0
     errors = 0
     
+    # Fetch dividends in parallel; results are merged in the auxiliar file order
+    empresas = auxiliar_data.get("empresas", [])
+    executor = ThreadPoolExecutor(max_workers=WORKERS_PER_CLASS)
+    futures = []
+    for empresa in empresas:
+        nome_empresa = empresa.get("nomeEmpresa")
+        since = None if full_refresh else index.latest(nome_empresa)
+        futures.append(executor.submit(fetch_empresa_dividends, nome_empresa, session, since, paging))
+    
     # Process each company
-    for i, empresa in enumerate(auxiliar_data.get("empresas", []), 1):
+    for i, (empresa, future) in enumerate(zip(empresas, futures), 1):
         nome_empresa = empresa.get("nomeEmpresa")
         
         print(f"Processando {nome_empresa} ({i}/{total})")
         
         try:
-            # Fetch dividends
-            new_dividends = fetch_empresa_dividends(nome_empresa, session)
+            # Only the dividends whose key is not indexed yet
+            new_dividends = index.new_dividends(nome_empresa, future.result())
             
             if not new_dividends:                
                 processed += 1
                 continue
+            
+            if existing_dividends is None:
+                existing_dividends, existing_lookup = load_records(EMPRESAS_JSON, "nomeEmpresa")
                 
             # Check if company already exists
             if nome_empresa in existing_lookup:
-                # Get existing dividends
-                existing_item = existing_lookup[nome_empresa]
-                existing_divs = existing_item.get("dividendos", [])
-                
-                # Create a set of existing dividend keys for comparison
-                existing_keys = {f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('tipo')}" 
-                                for div in existing_divs}
-                
-                # Add only new dividends
-                added_count = 0
-                for div in new_dividends:
-                    div_key = f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('tipo')}"
-                    if div_key not in existing_keys:
-                        existing_divs.append(div)
-                        added_count += 1
-                
-                if added_count > 0:
-                    print(f"  ✓ Adicionados {added_count} novos dividendos")
-                    updated += 1
+                existing_lookup[nome_empresa].setdefault("dividendos", []).extend(new_dividends)
+                print(f"  ✓ Adicionados {len(new_dividends)} novos dividendos")
+                updated += 1
                 
             else:
                 # Add new company with dividends
@@ -309,20 +303,26 @@ def update_empresas_dividends():
                 })
                 added += 1
                 print(f"  ✓ Adicionados {len(new_dividends)} dividendos")
-                
-            processed += 1
             
-            # Sleep to avoid rate limiting
-            time.sleep(1)
+            index.add(nome_empresa, new_dividends)
+            if store:
+                store.add_dividends("empresas", nome_empresa, new_dividends)
+            processed += 1
             
         except Exception as e:
             print(f"  ✗ Erro: {e}")
             errors += 1
-            time.sleep(5)  # Longer sleep on error
     
-    # Save updated data
+    executor.shutdown()
+    if store:
+        store.close()
+    
+    # Save updated data, then the index tied to the file just written
+    saved = True
     if added > 0 or updated > 0:
-        save_json(EMPRESAS_JSON, existing_dividends)
+        saved = save_json(EMPRESAS_JSON, existing_dividends)
+    if saved and (added > 0 or updated > 0 or index.rebuilt):
+        index.save()
         
     # Calculate execution time
     end_time = time.time()
@@ -333,6 +333,7 @@ def update_empresas_dividends():
     print(f"  Novas empresas: {added}")
     print(f"  Empresas atualizadas: {updated}")
     print(f"  Erros: {errors}")
+    print(f"  Páginas lidas: {paging['paginas_lidas']} (puladas: {paging['paginas_puladas']})")
     print(f"  Tempo de execução: {execution_time/60:.2f} minutos")
     
     return {
@@ -340,6 +341,8 @@ def update_empresas_dividends():
         "added": added,
         "updated": updated,
         "errors": errors,
+        "pages_read": paging["paginas_lidas"],
+        "pages_skipped": paging["paginas_puladas"],
         "execution_time": execution_time
     }
 
@@ -348,12 +351,13 @@ def update_bdr_dividends():
     print("\n=== Atualizando dividendos de BDRs ===")
     start_time = time.time()
     
-    # Load data
+    # Load data: the key index replaces the full dividend file, which is only read if something is new
     auxiliar_data = load_json(AUXILIAR_JSON)
-    existing_dividends = load_json(BDR_JSON)
-    
-    # Create lookup for existing dividends
-    existing_lookup = {item["nomeEmpresa"]: item for item in existing_dividends}
+    index = open_index(BDR_JSON, bdr_key, "nomeEmpresa")
+    existing_dividends = None
+    existing_lookup = None
+    # Com B3_BANCO, os dividendos novos também entram no banco, linha a linha
+    store = AssetStore() if STORE_PATH else None
     
     # Track statistics
     total = len(auxiliar_data.get("bdrs", []))
@@ -362,41 +366,33 @@ def update_bdr_dividends():
     updated = 0
     errors = 0
     
+    # Fetch dividends in parallel; results are merged in the auxiliar file order
+    bdrs = auxiliar_data.get("bdrs", [])
+    executor = ThreadPoolExecutor(max_workers=WORKERS_PER_CLASS)
+    futures = [executor.submit(fetch_bdr_dividends, bdr.get("codigoEmpresa")) for bdr in bdrs]
+    
     # Process each BDR
-    for i, bdr in enumerate(auxiliar_data.get("bdrs", []), 1):
+    for i, (bdr, future) in enumerate(zip(bdrs, futures), 1):
         codigo_empresa = bdr.get("codigoEmpresa")
         
         print(f"Processando {codigo_empresa} ({i}/{total})")
         
         try:
-            # Fetch dividends
-            new_dividends = fetch_bdr_dividends(codigo_empresa)
+            # Only the dividends whose key is not indexed yet
+            new_dividends = index.new_dividends(codigo_empresa, future.result())
             
             if not new_dividends:                
                 processed += 1
                 continue
+            
+            if existing_dividends is None:
+                existing_dividends, existing_lookup = load_records(BDR_JSON, "nomeEmpresa")
                 
             # Check if BDR already exists
             if codigo_empresa in existing_lookup:
-                # Get existing dividends
-                existing_item = existing_lookup[codigo_empresa]
-                existing_divs = existing_item.get("dividendos", [])
-                
-                # Create a set of existing dividend keys for comparison
-                existing_keys = {f"{div.get('dataAprovacao')}|{div.get('tipo')}" 
-                                for div in existing_divs}
-                
-                # Add only new dividends
-                added_count = 0
-                for div in new_dividends:
-                    div_key = f"{div.get('dataAprovacao')}|{div.get('tipo')}"
-                    if div_key not in existing_keys:
-                        existing_divs.append(div)
-                        added_count += 1
-                
-                if added_count > 0:
-                    print(f"  ✓ Adicionados {added_count} novos dividendos")
-                    updated += 1
+                existing_lookup[codigo_empresa].setdefault("dividendos", []).extend(new_dividends)
+                print(f"  ✓ Adicionados {len(new_dividends)} novos dividendos")
+                updated += 1
                 
             else:
                 # Add new BDR with dividends
@@ -406,20 +402,26 @@ def update_bdr_dividends():
                 })
                 added += 1
                 print(f"  ✓ Adicionados {len(new_dividends)} dividendos")
-                
-            processed += 1
             
-            # Sleep to avoid rate limiting
-            time.sleep(1.5)
+            index.add(codigo_empresa, new_dividends)
+            if store:
+                store.add_dividends("bdrs", codigo_empresa, new_dividends)
+            processed += 1
             
         except Exception as e:
             print(f"  ✗ Erro: {e}")
             errors += 1
-            time.sleep(5)  # Longer sleep on error
     
-    # Save updated data
+    executor.shutdown()
+    if store:
+        store.close()
+    
+    # Save updated data, then the index tied to the file just written
+    saved = True
     if added > 0 or updated > 0:
-        save_json(BDR_JSON, existing_dividends)
+        saved = save_json(BDR_JSON, existing_dividends)
+    if saved and (added > 0 or updated > 0 or index.rebuilt):
+        index.save()
         
     # Calculate execution time
     end_time = time.time()
@@ -445,12 +447,13 @@ def update_fii_dividends():
     print("\n=== Atualizando dividendos de FIIs ===")
     start_time = time.time()
     
-    # Load data
+    # Load data: the key index replaces the full dividend file, which is only read if something is new
     auxiliar_data = load_json(AUXILIAR_JSON)
-    existing_dividends = load_json(FII_JSON)
-    
-    # Create lookup for existing dividends
-    existing_lookup = {item["nomeFII"]: item for item in existing_dividends}
+    index = open_index(FII_JSON, fii_key, "nomeFII")
+    existing_dividends = None
+    existing_lookup = None
+    # Com B3_BANCO, os dividendos novos também entram no banco, linha a linha
+    store = AssetStore() if STORE_PATH else None
     
     # Track statistics
     total = len(auxiliar_data.get("fiis", []))
@@ -459,50 +462,49 @@ def update_fii_dividends():
     updated = 0
     errors = 0
     
+    # Fetch dividends in parallel; results are merged in the auxiliar file order
+    fiis = auxiliar_data.get("fiis", [])
+    executor = ThreadPoolExecutor(max_workers=WORKERS_PER_CLASS)
+    futures = [executor.submit(fetch_fii_dividends, fii.get("cnpj"), fii.get("codigoFII")) for fii in fiis]
+    
     # Process each FII
-    for i, fii in enumerate(auxiliar_data.get("fiis", []), 1):
+    for i, (fii, future) in enumerate(zip(fiis, futures), 1):
         nome_fii = fii.get("nomeFII")
-        codigo_fii = fii.get("codigoFII")
-        cnpj = fii.get("cnpj")
         
         print(f"Processando {nome_fii} ({i}/{total})")
         
         try:
-            # Fetch dividends
-            result = fetch_fii_dividends(cnpj, codigo_fii)
-            new_dividends = result["dividendos"]
+            result = future.result()
+            if not result["dividendos"]:
+                processed += 1
+                continue
             
-            if not new_dividends:
+            # Only the dividends whose key is not indexed yet; the index also keeps the quantidade
+            new_dividends = index.new_dividends(nome_fii, result["dividendos"])
+            new_quantity = (nome_fii in index and result["quantidade"]
+                            and result["quantidade"] != index.get(nome_fii, "quantidade", ""))
+            
+            if not new_dividends and not new_quantity:
                 processed += 1
                 continue
+            
+            if existing_dividends is None:
+                existing_dividends, existing_lookup = load_records(FII_JSON, "nomeFII")
                 
             # Check if FII already exists
             if nome_fii in existing_lookup:
-                # Get existing dividends
                 existing_item = existing_lookup[nome_fii]
-                existing_divs = existing_item.get("dividendos", [])
                 
-                # Create a set of existing dividend keys for comparison
-                existing_keys = {f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('dataPagamento')}" 
-                                for div in existing_divs}
-                
-                # Add only new dividends
-                added_count = 0
-                for div in new_dividends:
-                    div_key = f"{div.get('dataAprovacao')}|{div.get('tipoDividendo')}|{div.get('dataPagamento')}"
-                    if div_key not in existing_keys:
-                        existing_divs.append(div)
-                        added_count += 1
-                
-                if added_count > 0:
-                    print(f"  ✓ Adicionados {added_count} novos dividendos")
+                if new_dividends:
+                    existing_item.setdefault("dividendos", []).extend(new_dividends)
+                    print(f"  ✓ Adicionados {len(new_dividends)} novos dividendos")
                     updated += 1
-                
                     
                 # Update quantidade if needed
-                if result["quantidade"] and result["quantidade"] != existing_item.get("quantidade", ""):
+                if new_quantity:
                     existing_item["quantidade"] = result["quantidade"]
-                    if added_count == 0:  # Only count as update if we didn't already count it
+                    index.set(nome_fii, "quantidade", result["quantidade"])
+                    if not new_dividends:  # Only count as update if we didn't already count it
                         updated += 1
                         print(f"  ✓ Quantidade atualizada: {result['quantidade']}")
             else:
@@ -512,22 +514,30 @@ def update_fii_dividends():
                     "quantidade": result["quantidade"],
                     "dividendos": new_dividends
                 })
+                index.set(nome_fii, "quantidade", result["quantidade"])
                 added += 1
                 print(f"  ✓ Adicionados {len(new_dividends)} dividendos")
-                
-            processed += 1
             
-            # Sleep to avoid rate limiting - increased from 0.5 to 1.5 seconds
-            time.sleep(1.5)
+            index.add(nome_fii, new_dividends)
+            if store:
+                quantity = result["quantidade"] if new_quantity or nome_fii not in existing_lookup else None
+                store.add_dividends("fiis", nome_fii, new_dividends, quantity)
+            processed += 1
             
         except Exception as e:
             print(f"  ✗ Erro: {e}")
             errors += 1
-            time.sleep(5)  # Longer sleep on error
     
-    # Save updated data
+    executor.shutdown()
+    if store:
+        store.close()
+    
+    # Save updated data, then the index tied to the file just written
+    saved = True
     if added > 0 or updated > 0:
-        save_json(FII_JSON, existing_dividends)
+        saved = save_json(FII_JSON, existing_dividends)
+    if saved and (added > 0 or updated > 0 or index.rebuilt):
+        index.save()
         
     # Calculate execution time
     end_time = time.time()
@@ -548,7 +558,7 @@ def update_fii_dividends():
         "execution_time": execution_time
     }
 
-def main():
+def main(argv=None):
     """Main function"""
     print("=== Iniciando atualização de dividendos ===")
     start_time = time.time()
@@ -558,27 +568,36 @@ def main():
         print(f"Erro: Arquivo auxiliar {AUXILIAR_JSON} não encontrado")
         return
     
-    # Update dividends
-    empresas_stats = update_empresas_dividends()
-    bdr_stats = update_bdr_dividends()
-    fii_stats = update_fii_dividends()
+    full_refresh = "--completo" in (sys.argv[1:] if argv is None else argv)
+
+    # Update dividends: the three asset classes run at the same time, each writing its own JSON
+    with ThreadPoolExecutor(max_workers=ASSET_CLASSES) as executor:
+        empresas_future = executor.submit(update_empresas_dividends, full_refresh)
+        bdr_future = executor.submit(update_bdr_dividends)
+        fii_future = executor.submit(update_fii_dividends)
+        empresas_stats = empresas_future.result()
+        bdr_stats = bdr_future.result()
+        fii_stats = fii_future.result()
     
     # Calculate total execution time
     end_time = time.time()
     total_time = end_time - start_time
+    rate_metrics = get_metrics()
     
     # Create log file
     log_file = os.path.join(LOG_DIR, f"dividendos_atualizacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
     
     with open(log_file, 'w', encoding='utf-8') as f:
         f.write(f"Relatório de Atualização de Dividendos - {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n")
-        f.write(f"Tempo total de execução: {total_time/60:.2f} minutos ({total_time:.2f} segundos)\n\n")
+        f.write(f"Tempo total de execução: {total_time/60:.2f} minutos ({total_time:.2f} segundos)\n")
+        f.write(f"Taxa final de requisições B3: {rate_metrics['rate']:.2f} req/s ({rate_metrics['throttles']} respostas 429/503)\n\n")
         
         f.write("=== Empresas ===\n")
         f.write(f"Processados: {empresas_stats['processed']}\n")
         f.write(f"Novas empresas: {empresas_stats['added']}\n")
         f.write(f"Empresas atualizadas: {empresas_stats['updated']}\n")
         f.write(f"Erros: {empresas_stats['errors']}\n")
+        f.write(f"Páginas de dividendos lidas: {empresas_stats['pages_read']} (puladas: {empresas_stats['pages_skipped']})\n")
         f.write(f"Tempo: {empresas_stats['execution_time']/60:.2f} minutos\n\n")
         
         f.write("=== BDRs ===\n")
@@ -1,12 +1,15 @@
-import base64
-import requests
 import json
 import os
-import time
+import sys
 from datetime import datetime
-import urllib3
 
-urllib3.disable_warnings()
+# Módulos compartilhados (cliente B3)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from b3Client import companies_url, get_json
+from cacheDetalhes import DetailCache
+from comparacao import describe_changes, diff_records, load_hashes, needs_rewrite, save_hashes
+from dados import save_json
+from paginacao import fetch_all_pages
 
 # Funções para BDRs patrocinados (existentes)
 def fetch_bdr_companies(page_number, page_size):
@@ -16,41 +19,30 @@ def fetch_bdr_companies(page_number, page_size):
         "pageSize": page_size,
         "governance": "14"
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetInitialCompanies/"
-    url = base_url + encoded_params
-    response = requests.get(url, verify=False)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_bdr_details(code_cvm, max_retries=3):
+    return get_json(companies_url("GetInitialCompanies", params))
+
+def fetch_bdr_details(code_cvm):
     params = {
         "codeCVM": code_cvm,
         "language": "pt-br"
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetDetail/"
-    url = base_url + encoded_params
+    url = companies_url("GetDetail", params)
     
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, verify=False)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:  # Too Many Requests
-                wait_time = (2 ** attempt) + 1  # Exponential backoff
-                print(f"\nRate limit hit, waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                if attempt == max_retries - 1:
-                    raise
-                continue
-            raise
-        except Exception as e:
-            print(f"\nError fetching details for CVM {code_cvm}: {str(e)}")
-            raise
+    try:
+        return get_json(url)
+    except Exception as e:
+        print(f"\nError fetching details for CVM {code_cvm}: {str(e)}")
+        raise
+
+DETAIL_CACHE_JSON = os.path.join("Finais", "Parcial", "cacheDetalhesBdr.json")
+
+def get_bdr_details(bdr, cache, full_refresh=False):
+    """Details from the cache when fresh, otherwise fetched from B3 and cached"""
+    details = None if full_refresh else cache.get(bdr['codeCVM'], bdr)
+    if details is None:
+        details = fetch_bdr_details(bdr['codeCVM'])
+        cache.put(bdr['codeCVM'], bdr, details)
+    return details
 
 def format_bdr_data(bdr, details):
     industry_classification = details.get("industryClassification", "").split(" / ")[0] if details else ""
@@ -86,13 +78,7 @@ def fetch_bdr_nao_patrocinados(page_number, page_size):
         "pageSize": page_size,
         "codeCategoryBVMF": 6
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetCompaniesBDR/"
-    url = base_url + encoded_params
-    response = requests.get(url, verify=False)
-    response.raise_for_status()
-    return response.json()
+    return get_json(companies_url("GetCompaniesBDR", params))
 
 def format_bdr_nao_patrocinados_data(bdr, details):
     industry_classification = details.get("industryClassification", "").split(" / ")[0] if details else ""
@@ -126,93 +112,72 @@ def load_existing_bdrs(filename):
             return json.load(f)
     return {"bdrs": [], "bdr_nao_patrocinados": []}
 
-def find_bdr_by_cvm(bdrs, code_cvm):
-    for bdr in bdrs:
-        if bdr["codigoCVM"] == code_cvm:
-            return bdr
-    return None
-
-def main():
+def main(argv=None):
     page_size = 120
-    page_number = 1
 
     detailed_bdrs = {"bdrs": [], "bdr_nao_patrocinados": []}
-    existing_bdrs = load_existing_bdrs('bdr.json')
-    added_bdrs = []
-    added_bdr_nao_patrocinados = []
-    removed_bdrs = existing_bdrs["bdrs"].copy()
-    removed_bdr_nao_patrocinados = existing_bdrs["bdr_nao_patrocinados"].copy()
-    bdr_changes = []
+    bdrJson = os.path.join("Finais", "Parcial", "bdr.json")
+    existing_bdrs = load_existing_bdrs(bdrJson)
 
-    # Process BDRs Patrocinados
-    all_bdrs = []
+    # Só busca na B3 os detalhes novos, vencidos ou cujo resumo mudou (--completo busca todos)
+    cache = DetailCache(DETAIL_CACHE_JSON)
+    full_refresh = "--completo" in (sys.argv[1:] if argv is None else argv)
 
-    initial_data = fetch_bdr_companies(page_number, page_size)
-    total_pages = initial_data['page']['totalPages']
-    all_bdrs.extend(initial_data['results'])
+    # Process BDRs Patrocinados
     print("Carregando BDRs patrocinados...")
-    for page_number in range(2, total_pages + 1):
-        data = fetch_bdr_companies(page_number, page_size)
-        all_bdrs.extend(data['results'])
-        print(f"Página {page_number} de {total_pages}")
+    all_bdrs = fetch_all_pages(lambda page_number: fetch_bdr_companies(page_number, page_size))
 
     total_bdrs = len(all_bdrs)
     for i, bdr in enumerate(all_bdrs, start=1):
-        details = fetch_bdr_details(bdr['codeCVM'])
+        details = get_bdr_details(bdr, cache, full_refresh)
         formatted_bdr = format_bdr_data(bdr, details)
-        existing_bdr = find_bdr_by_cvm(existing_bdrs["bdrs"], bdr['codeCVM'])
-
-        if existing_bdr:
-            removed_bdrs = [c for c in removed_bdrs if c["codigoCVM"] != bdr['codeCVM']]
-            if formatted_bdr != existing_bdr:
-                bdr_changes.append({
-                    "codigoCVM": bdr["codeCVM"],
-                    "nomeEmpresa": bdr["tradingName"],
-                    "alteracoes": {
-                        "antigo": existing_bdr,
-                        "novo": formatted_bdr
-                    }
-                })
-        else:
-            added_bdrs.append(formatted_bdr)
-
         detailed_bdrs["bdrs"].append(formatted_bdr)
 
         print(f"BDR:  {bdr['companyName']} - {i} / {total_bdrs}")
-        time.sleep(1.5)
 
     # Process BDRs Não Patrocinados
-    all_bdr_nao_patrocinados = []
-
-    initial_data_nao_patrocinados = fetch_bdr_nao_patrocinados(page_number, page_size)
-    total_pages_nao_patrocinados = initial_data_nao_patrocinados['page']['totalPages']
-    all_bdr_nao_patrocinados.extend(initial_data_nao_patrocinados['results'])
     print("Carregando BDRs não patrocinados...")
-    for page_number in range(2, total_pages_nao_patrocinados + 1):
-        data = fetch_bdr_nao_patrocinados(page_number, page_size)
-        all_bdr_nao_patrocinados.extend(data['results'])
-        print(f"Página {page_number} de {total_pages_nao_patrocinados}")
+    all_bdr_nao_patrocinados = fetch_all_pages(lambda page_number: fetch_bdr_nao_patrocinados(page_number, page_size))
 
     total_bdr_nao_patrocinados = len(all_bdr_nao_patrocinados)
     for i, bdr in enumerate(all_bdr_nao_patrocinados, start=1):
-        details = fetch_bdr_details(bdr['codeCVM'])
+        details = get_bdr_details(bdr, cache, full_refresh)
         formatted_bdr = format_bdr_nao_patrocinados_data(bdr, details)
-        existing_bdr = find_bdr_by_cvm(existing_bdrs["bdr_nao_patrocinados"], bdr['codeCVM'])
 
         if formatted_bdr["codigo"]:
-            if existing_bdr:
-                removed_bdr_nao_patrocinados = [c for c in removed_bdr_nao_patrocinados if c["codigoCVM"] != bdr['codeCVM']]
-            else:
-                added_bdr_nao_patrocinados.append(formatted_bdr)
-                detailed_bdrs["bdr_nao_patrocinados"].append(formatted_bdr)
+            detailed_bdrs["bdr_nao_patrocinados"].append(formatted_bdr)
 
         print(f"BDR NP:  {bdr['companyName']} - {i} / {total_bdr_nao_patrocinados}")
-        time.sleep(1.5)
 
-    # Save to bdr.json
-    bdrJson = os.path.join("Finais","Parcial", "bdr.json")
-    with open(bdrJson, "w", encoding="utf-8") as f:
-        json.dump(detailed_bdrs, f, ensure_ascii=False, indent=4)
+    cache.prune(bdr['codeCVM'] for bdr in all_bdrs + all_bdr_nao_patrocinados)
+    cache.save()
+    print(f"Detalhes: {cache.hits} do cache, {cache.updated} buscados na B3")
+
+    # Comparação indexada por codigoCVM, com os hashes da última gravação de cada lista
+    hashes, untouched = load_hashes(bdrJson)
+    bdr_diff = diff_records(existing_bdrs["bdrs"], detailed_bdrs["bdrs"], hashes=hashes.get("bdrs"))
+    added_bdrs = bdr_diff["added"]
+    removed_bdrs = bdr_diff["removed"]
+    bdr_changes = [
+        {
+            "codigoCVM": new["codigoCVM"],
+            "nomeEmpresa": new["nomeEmpresa"],
+            "campos": fields
+        }
+        for old, new, fields in bdr_diff["changed"]
+    ]
+
+    bdr_nao_patrocinados_diff = diff_records(existing_bdrs["bdr_nao_patrocinados"], detailed_bdrs["bdr_nao_patrocinados"],
+                                             hashes=hashes.get("bdr_nao_patrocinados"))
+    added_bdr_nao_patrocinados = bdr_nao_patrocinados_diff["added"]
+    removed_bdr_nao_patrocinados = bdr_nao_patrocinados_diff["removed"]
+
+    # Save to bdr.json (com os hashes gravados, uma execução sem alterações não precisa reescrevê-lo)
+    if needs_rewrite(bdr_diff, untouched) or needs_rewrite(bdr_nao_patrocinados_diff) or not os.path.exists(bdrJson):
+        save_json(bdrJson, detailed_bdrs)
+        save_hashes({"bdrs": bdr_diff["hashes"], "bdr_nao_patrocinados": bdr_nao_patrocinados_diff["hashes"]}, bdrJson)
+    else:
+        print("Nenhuma alteração nos BDRs: bdr.json mantido")
 
     # Relatório de alterações
     txt_BdrAlteracoes = os.path.join("Suporte", "bdr.txt")
@@ -243,8 +208,8 @@ def main():
             f.write("\nAlterações detalhadas:\n")
             for change in bdr_changes:
                 f.write(f"- {change['nomeEmpresa']} (CVM: {change['codigoCVM']})\n")
-                f.write(f"  - Antigo: {json.dumps(change['alteracoes']['antigo'], ensure_ascii=False)}\n")
-                f.write(f"  - Novo: {json.dumps(change['alteracoes']['novo'], ensure_ascii=False)}\n")
+                for line in describe_changes(change["campos"]):
+                    f.write(f"  - {line}\n")
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
 
 # Define paths
 input_path = os.path.join("Finais","Parcial", "bdr.json")
@@ -36,8 +41,7 @@ def main():
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Read input file
-        with open(input_path, 'r', encoding='utf-8') as f:
-            bdr_data = json.load(f)
+        bdr_data = load_json(input_path)
         
         # Format sponsored BDRs
         formatted_bdrs = []
@@ -49,8 +53,7 @@ def main():
             formatted_bdrs.extend([format_bdr(bdr, False) for bdr in bdr_data["bdr_nao_patrocinados"]])
         
         # Write output file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_bdrs, f, ensure_ascii=False, indent=2)
+        save_json(output_path, formatted_bdrs, indent=2)
         
         print(f"Formatação concluída. Arquivo salvo em {output_path}")
         print(f"Total de BDRs processadas: {len(formatted_bdrs)}")
@@ -1,44 +1,32 @@
-import requests
-import base64
 import json
 import os
+import sys
 import time
 from datetime import datetime
-import urllib3
 
-urllib3.disable_warnings()
+# Módulos compartilhados (cliente B3)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from b3Client import companies_url, get
+from dados import load_json, save_json
 
-def fetch_dividends(trading_name, max_retries=3):
+def fetch_dividends(trading_name):
     params = {
         "issuingCompany": trading_name,
         "language": "pt-br"
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetListedSupplementBDR/"
-    url = base_url + encoded_params
+    url = companies_url("GetListedSupplementBDR", params)
     
-    for attempt in range(max_retries):
+    try:
+        response = get(url)
+        response.raise_for_status()
         try:
-            response = requests.get(url, verify=False)
-            response.raise_for_status()
-            try:
-                return response.json()
-            except json.JSONDecodeError:
-                print(f"Erro ao decodificar JSON para {trading_name}: {response.text}")
-                return None
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:  # Too Many Requests
-                wait_time = (2 ** attempt) + 1  # Exponential backoff
-                print(f"\nRate limit hit, waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                if attempt == max_retries - 1:
-                    raise
-                continue
-            raise
-        except Exception as e:
-            print(f"\nError fetching dividends for {trading_name}: {str(e)}")
-            raise
+            return response.json()
+        except json.JSONDecodeError:
+            print(f"Erro ao decodificar JSON para {trading_name}: {response.text}")
+            return None
+    except Exception as e:
+        print(f"\nError fetching dividends for {trading_name}: {str(e)}")
+        raise
 
 def reset_file(filename):
     if os.path.exists(filename):
@@ -47,8 +35,7 @@ def reset_file(filename):
 def main():
     start_time = time.time()
     bdrJson = os.path.join("Finais", "Parcial", "bdr.json")
-    with open(bdrJson, 'r', encoding='utf-8') as f:
-        bdr_data = json.load(f)
+    bdr_data = load_json(bdrJson)
     bdrs = bdr_data.get("bdrs", [])
     bdrs_np = bdr_data.get("bdr_nao_patrocinados", [])
     total_bdrs = len(bdrs) + len(bdrs_np)
@@ -71,7 +58,6 @@ def main():
                 }
                 for div in dividendos
             ]
-            time.sleep(1.5)
     
         if formatted_dividends:
             company_dividends = {
@@ -97,7 +83,6 @@ def main():
                 }
                 for div in dividendos
             ]
-            time.sleep(1.5)
     
         if formatted_dividends:
             company_dividends = {
@@ -107,8 +92,7 @@ def main():
             all_dividends.append(company_dividends)
         
     dividendosBdrJson = os.path.join("Finais", "dividendosBdr.json")
-    with open(dividendosBdrJson, 'w', encoding='utf-8') as f:
-        json.dump(all_dividends, f, ensure_ascii=False, indent=4)
+    save_json(dividendosBdrJson, all_dividends)
         
     print(f"Total de dividendos processados: {total_bdrs}")
     end_time = time.time()
@@ -1,28 +1,30 @@
 import requests
-import base64
 import json
 import time
 import os
+import sys
 from datetime import datetime
 
+# Módulos compartilhados (cliente B3)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from b3Client import funds_url, get
+from dados import load_json, save_json
+
 # Constantes
-dividends_url_template = "https://sistemaswebb3-listados.b3.com.br/fundsProxy/fundsCall/GetListedSupplementFunds/{}"
 fiiJson = os.path.join("Finais", "fiis.json")
 dividendoFiiJson = os.path.join("Finais", "Parcial", "dividendosFii.json")
 txt_filename = os.path.join("Suporte", "dividendosFii.txt")
 
 # Funções
 def fetch_dividends(cnpj, acronym):
-    dividends_payload = base64.b64encode(json.dumps({
+    dividends_url = funds_url("GetListedSupplementFunds", {
         "cnpj": cnpj,
         "identifierFund": acronym,
         "typeFund": 7
-    }).encode()).decode()
-    
-    dividends_url = dividends_url_template.format(dividends_payload)
+    })
     
     try:
-        response = requests.get(dividends_url)
+        response = get(dividends_url)
         response.raise_for_status()  # Lança um erro para status HTTP diferente de 200
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -84,74 +86,72 @@ def reset_file(filename):
     if os.path.exists(filename):
         os.remove(filename)
 
-# Início do script principal
-start_time = time.time()
+def main():
+    # Início do script principal
+    start_time = time.time()
+
+    # Carregar detalhes dos FIIs do arquivo JSON
+    fiis = load_json(fiiJson)
+
+    dividends_data = []
+
+    total_fiis = len(fiis)
+    print(f"Coletando informações de dividendos para cada um dos {total_fiis} FIIs...")
+    for i, fii in enumerate(fiis, start=1):
+        dividends = fetch_dividends(fii['informacoes']['cnpj'], fii['codigoFII'])
+
+        if dividends is None:
+            print(f"{fii['nomeFII']} : erro na coleta de dividendos")
+            continue
+
+        cash_dividends = [
+            {
+                "dataPagamento": dividend["paymentDate"],
+                "valor": dividend["rate"],
+                "relativo": format_related_to(dividend["relatedTo"]),
+                "dataAprovacao": dividend["approvedOn"],
+                "tipoDividendo": dividend["label"],
+                "ultimoDiaCom": dividend["lastDatePrior"]
+            }
+            for dividend in dividends.get("cashDividends", [])
+        ]
+
+        dividends_details = {
+            "nomeFII": fii['nomeFII'],
+            "quantidade": dividends['quantity'],
+            "dividendos": cash_dividends
+        }
+        dividends_data.append(dividends_details)
 
-# Carregar detalhes dos FIIs do arquivo JSON
-with open(fiiJson, 'r', encoding='utf-8') as fiis_file:
-    fiis = json.load(fiis_file)
+        print(f"Dividendos: {fii['nomeFII']} - {i} / {total_fiis}")
 
-dividends_data = []
+    # Salvar dados de dividendos no arquivo JSON
+    save_json(dividendoFiiJson, dividends_data)
 
-total_fiis = len(fiis)
-print(f"Coletando informações de dividendos para cada um dos {total_fiis} FIIs...")
-for i, fii in enumerate(fiis, start=1):
-    dividends = fetch_dividends(fii['informacoes']['cnpj'], fii['codigoFII'])
-    
-    if dividends is None:
-        print(f"{fii['nomeFII']} : erro na coleta de dividendos")
-        continue
-    
-    cash_dividends = [
-        {
-            "dataPagamento": dividend["paymentDate"],
-            "valor": dividend["rate"],
-            "relativo": format_related_to(dividend["relatedTo"]),
-            "dataAprovacao": dividend["approvedOn"],
-            "tipoDividendo": dividend["label"],
-            "ultimoDiaCom": dividend["lastDatePrior"]
-        }
-        for dividend in dividends.get("cashDividends", [])
-    ]
-    
-    dividends_details = {
-        "nomeFII": fii['nomeFII'],
-        "quantidade": dividends['quantity'],
-        "dividendos": cash_dividends
-    }
-    dividends_data.append(dividends_details)
-    
-    print(f"Dividendos: {fii['nomeFII']} - {i} / {total_fiis}")
-    
-    # Adicionar um intervalo entre as solicitações para evitar sobrecarregar o servidor
-    time.sleep(0.5)
-
-# Salvar dados de dividendos no arquivo JSON
-with open(dividendoFiiJson, 'w', encoding='utf-8') as dividends_file:
-    json.dump(dividends_data, dividends_file, ensure_ascii=False, indent=4)
-
-# Carregar, corrigir e salvar o arquivo JSON novamente
-with open(dividendoFiiJson, 'r', encoding='utf-8') as dividends_file:
-    dividends_data = json.load(dividends_file)
-
-dividends_data_corrigido = corrigir_relativo(dividends_data)
-
-with open(dividendoFiiJson, 'w', encoding='utf-8') as dividends_file:
-    json.dump(dividends_data_corrigido, dividends_file, ensure_ascii=False, indent=4)
-
-# Calcular e exibir o tempo de execução
-end_time = time.time()
-execution_time_min = (end_time - start_time) / 60
-execution_time_secs = (end_time - start_time) % 60
-print(f"Tempo de execução: {execution_time_min:.0f} minutos e {execution_time_secs:.0f} segundos")
-tempo_medio = (end_time - start_time) / total_fiis
-print(f"Tempo médio: {tempo_medio:.2f} segundos")
-
-# Escrever informações no arquivo de texto
-reset_file(txt_filename)
-with open(txt_filename, 'w', encoding='utf-8') as f:
-    f.write(f"Relatório de Dividendos FIIs gerado em: {datetime.now().strftime('%d / %m / %Y  %H:%M')}\n\n")
-    f.write(f"Tempo de execução: {execution_time_min:.0f} minutos e {execution_time_secs:.0f} segundos.\n\n")
-    f.write(f"Total de FIIs com dividendos: {total_fiis}")
-
-print("Arquivo gerado 'dividendosFii.json'.")
+    # Carregar, corrigir e salvar o arquivo JSON novamente
+    with open(dividendoFiiJson, 'r', encoding='utf-8') as dividends_file:
+        dividends_data = json.load(dividends_file)
+
+    dividends_data_corrigido = corrigir_relativo(dividends_data)
+
+    save_json(dividendoFiiJson, dividends_data_corrigido)
+
+    # Calcular e exibir o tempo de execução
+    end_time = time.time()
+    execution_time_min = (end_time - start_time) / 60
+    execution_time_secs = (end_time - start_time) % 60
+    print(f"Tempo de execução: {execution_time_min:.0f} minutos e {execution_time_secs:.0f} segundos")
+    tempo_medio = (end_time - start_time) / total_fiis
+    print(f"Tempo médio: {tempo_medio:.2f} segundos")
+
+    # Escrever informações no arquivo de texto
+    reset_file(txt_filename)
+    with open(txt_filename, 'w', encoding='utf-8') as f:
+        f.write(f"Relatório de Dividendos FIIs gerado em: {datetime.now().strftime('%d / %m / %Y  %H:%M')}\n\n")
+        f.write(f"Tempo de execução: {execution_time_min:.0f} minutos e {execution_time_secs:.0f} segundos.\n\n")
+        f.write(f"Total de FIIs com dividendos: {total_fiis}")
+
+    print("Arquivo gerado 'dividendosFii.json'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import json
 import os
+import sys
 from datetime import datetime
 
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
+
 def reset_file(filename):
     """Remove file if it exists"""
     if os.path.exists(filename):
@@ -27,8 +32,7 @@ def main():
     # Process empresas.json
     print("Processando empresas.json...")
     try:
-        with open(empresas_json, 'r', encoding='utf-8') as f:
-            empresas = json.load(f)
+        empresas = load_json(empresas_json)
             
         for empresa in empresas:
             if "nomeEmpresa" in empresa and "codigoEmpresa" in empresa:
@@ -44,8 +48,7 @@ def main():
     # Process bdr.json
     print("Processando bdr.json...")
     try:
-        with open(bdr_json, 'r', encoding='utf-8') as f:
-            bdr_data = json.load(f)
+        bdr_data = load_json(bdr_json)
         
         # Process patrocinados
         for bdr in bdr_data.get("bdrs", []):
@@ -72,8 +75,7 @@ def main():
     # Process fiis.json
     print("Processando fiis.json...")
     try:
-        with open(fiis_json, 'r', encoding='utf-8') as f:
-            fiis = json.load(f)
+        fiis = load_json(fiis_json)
         
         for fii in fiis:
             if "informacoes" in fii and "cnpj" in fii["informacoes"] and "codigoFII" in fii:
@@ -89,8 +91,7 @@ def main():
     
     # Save the consolidated data
     try:
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=4)
+        save_json(output_json, result)
         print(f"Arquivo auxiliar criado com sucesso: {output_json}")
         
         # Create a summary text file
@@ -1,12 +1,18 @@
-import base64
-import requests
 import json
 import os
+import sys
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-import urllib3
 
-urllib3.disable_warnings()
+# Módulos compartilhados (cliente B3)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from b3Client import MAX_WORKERS, companies_url, get_json
+from cacheDetalhes import DetailCache
+from checkpoint import Checkpoint, resume_requested
+from comparacao import describe_changes, diff_records, load_hashes, needs_rewrite, save_hashes
+from dados import save_json
+from paginacao import fetch_all_pages
 
 def fetch_companies(page_number, page_size):
     params = {
@@ -14,41 +20,23 @@ def fetch_companies(page_number, page_size):
         "pageNumber": page_number,
         "pageSize": page_size
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetInitialCompanies/"
-    url = base_url + encoded_params
-    response = requests.get(url, verify=False)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_company_details(code_cvm, max_retries=3):
+    return get_json(companies_url("GetInitialCompanies", params))
+
+DETAIL_CACHE_JSON = os.path.join("Finais", "Parcial", "cacheDetalhesEmpresas.json")
+CHECKPOINT_JSONL = os.path.join("Finais", "Parcial", "empresas.checkpoint.jsonl")
+
+def fetch_company_details(code_cvm):
     params = {
         "codeCVM": code_cvm,
         "language": "pt-br"
     }
-    params_str = json.dumps(params)
-    encoded_params = base64.b64encode(params_str.encode('utf-8')).decode('utf-8')
-    base_url = "https://sistemaswebb3-listados.b3.com.br/listedCompaniesProxy/CompanyCall/GetDetail/"
-    url = base_url + encoded_params
+    url = companies_url("GetDetail", params)
 
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, verify=False)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:  # Too Many Requests
-                wait_time = (2 ** attempt) + 1  # Exponential backoff
-                print(f"\nRate limit hit, waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-                if attempt == max_retries - 1:
-                    raise
-                continue
-            raise
-        except Exception as e:
-            print(f"\nError fetching details for CVM {code_cvm}: {str(e)}")
-            raise
+    try:
+        return get_json(url)
+    except Exception as e:
+        print(f"\nError fetching details for CVM {code_cvm}: {str(e)}")
+        raise
 
 def format_company_data(company, details):
     industry_classification = details.get("industryClassification", "").split(" / ")[0] if details else ""
@@ -84,18 +72,11 @@ def load_existing_companies(filename):
             return json.load(f)
     return {"empresas": [], "empresas_sem_codigo": []}
 
-def find_company_by_cvm(companies, code_cvm):
-    for company_list in companies.values():
-        for company in company_list:
-            if company["codigoCVM"] == code_cvm:
-                return company
-    return None
-
 def reset_file(filename):
     if os.path.exists(filename):
         os.remove(filename)
 
-def main():
+def main(argv=None):
     
     if not os.path.exists("Json"):
         os.makedirs("Json")
@@ -105,17 +86,9 @@ def main():
         
     start_time = time.time()
     page_size = 120
-    page_number = 1
-    all_companies = []
 
-    initial_data = fetch_companies(page_number, page_size)
-    total_pages = initial_data['page']['totalPages']
-    all_companies.extend(initial_data['results'])
     print("Carregando todas as empresas...")
-    for page_number in range(2, total_pages + 1):
-        data = fetch_companies(page_number, page_size)
-        all_companies.extend(data['results'])
-        print(f"Página {page_number} de {total_pages}")
+    all_companies = fetch_all_pages(lambda page_number: fetch_companies(page_number, page_size))
 
     detailed_companies = {"empresas": [], "empresas_sem_codigo": []}
     empresas_com_codigo_json = os.path.join("Finais/Parcial", "empresasParcial.json")
@@ -126,31 +99,43 @@ def main():
         "empresas": existing_companies_com_codigo.get("empresas", []),
         "empresas_sem_codigo": existing_companies_sem_codigo.get("empresas_sem_codigo", [])
     }
-    added_companies = []
-    removed_companies = {"empresas": existing_companies["empresas"].copy(), "empresas_sem_codigo": existing_companies["empresas_sem_codigo"].copy()}
-    changes = []
+    formatted_companies = []
 
     total_companies = len(all_companies)
-    for i, company in enumerate(all_companies, start=1):
+
+    # Só busca na B3 os detalhes novos, vencidos ou cujo resumo mudou (--completo busca todos)
+    cache = DetailCache(DETAIL_CACHE_JSON)
+    argv = sys.argv[1:] if argv is None else argv
+    full_refresh = "--completo" in argv
+
+    # Journal dos detalhes já buscados: com --resume, uma execução interrompida continua de onde parou
+    checkpoint = Checkpoint(CHECKPOINT_JSONL, resume=resume_requested(argv))
+    if len(checkpoint):
+        print(f"Retomando: {len(checkpoint)} empresas já buscadas")
+
+    # Busca os detalhes em paralelo (limitado pelo rate limiter global) e processa na ordem original
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    details_futures = []
+    for company in all_companies:
+        cached = checkpoint.get(company['codeCVM'])
+        if cached is None and not full_refresh:
+            cached = cache.get(company['codeCVM'], company)
+        if cached is None:
+            details_futures.append((executor.submit(fetch_company_details, company['codeCVM']), True))
+        else:
+            future = Future()
+            future.set_result(cached)
+            details_futures.append((future, False))
+
+    for i, (company, (details_future, fetched)) in enumerate(zip(all_companies, details_futures), start=1):
         try:
-            details = fetch_company_details(company['codeCVM'])
+            details = details_future.result()
+            if fetched:
+                checkpoint.record(company['codeCVM'], details)
+            if company['codeCVM'] in checkpoint:
+                cache.put(company['codeCVM'], company, details)
             formatted_company = format_company_data(company, details)
-            existing_company = find_company_by_cvm(existing_companies, company['codeCVM'])
-
-            if existing_company:
-                removed_companies["empresas"] = [c for c in removed_companies["empresas"] if c["codigoCVM"] != company['codeCVM']]
-                removed_companies["empresas_sem_codigo"] = [c for c in removed_companies["empresas_sem_codigo"] if c["codigoCVM"] != company['codeCVM']]
-                if formatted_company != existing_company:
-                    changes.append({
-                        "codigoCVM": company["codeCVM"],
-                        "nomeEmpresa": company["tradingName"],
-                        "alteracoes": {
-                            "antigo": existing_company,
-                            "novo": formatted_company
-                        }
-                    })
-            else:
-                added_companies.append(formatted_company)
+            formatted_companies.append(formatted_company)
 
             if formatted_company["codigos"]:
                 detailed_companies["empresas"].append(formatted_company)
@@ -158,17 +143,45 @@ def main():
                 detailed_companies["empresas_sem_codigo"].append(formatted_company)
 
             print(f"Empresa:  {company['companyName']} - {i} / {total_companies}")
-            time.sleep(1.5)  # Increased delay between requests
         except Exception as e:
             print(f"\nError processing company {company['companyName']}: {str(e)}")
-            time.sleep(5)  # Longer delay after an error
             continue
 
-    with open(empresas_com_codigo_json, 'w', encoding='utf-8') as f:
-        json.dump({"empresas": detailed_companies["empresas"]}, f, ensure_ascii=False, indent=4)
-        
-    with open(empresas_sem_codigo_json, 'w', encoding='utf-8') as f:
-        json.dump({"empresas_sem_codigo": detailed_companies["empresas_sem_codigo"]}, f, ensure_ascii=False, indent=4)
+    executor.shutdown()
+
+    cache.prune(company['codeCVM'] for company in all_companies)
+    cache.save()
+    print(f"Detalhes: {cache.hits} do cache, {cache.updated} buscados na B3")
+
+    # Comparação indexada por codigoCVM (uma empresa pode trocar de lista entre execuções)
+    hashes, untouched = load_hashes(empresas_com_codigo_json, empresas_sem_codigo_json)
+    diff = diff_records(existing_companies["empresas"] + existing_companies["empresas_sem_codigo"], formatted_companies, hashes=hashes)
+    added_companies = diff["added"]
+    existing_com_codigo = {c["codigoCVM"] for c in existing_companies["empresas"]}
+    removed_companies = {
+        "empresas": [c for c in diff["removed"] if c["codigoCVM"] in existing_com_codigo],
+        "empresas_sem_codigo": [c for c in diff["removed"] if c["codigoCVM"] not in existing_com_codigo]
+    }
+    changes = [
+        {
+            "codigoCVM": new["codigoCVM"],
+            "nomeEmpresa": new["nomeEmpresa"],
+            "campos": fields
+        }
+        for old, new, fields in diff["changed"]
+    ]
+
+    # Com os hashes gravados, uma execução sem alterações não precisa reescrever os arquivos
+    if needs_rewrite(diff, untouched) or not os.path.exists(empresas_com_codigo_json) or not os.path.exists(empresas_sem_codigo_json):
+        save_json(empresas_com_codigo_json, {"empresas": detailed_companies["empresas"]})
+            
+        save_json(empresas_sem_codigo_json, {"empresas_sem_codigo": detailed_companies["empresas_sem_codigo"]})
+        save_hashes(diff["hashes"], empresas_com_codigo_json, empresas_sem_codigo_json)
+    else:
+        print("Nenhuma alteração nas empresas: arquivos JSON mantidos")
+
+    # Resultados gravados: o journal não é mais necessário
+    checkpoint.clear()
 
    
     # Reset files if they exist
@@ -209,11 +222,8 @@ def main():
             f.write("Alterações nas Empresas:\n")
             for change in changes:
                 f.write(f"- {change['nomeEmpresa']} (CVM: {change['codigoCVM']})\n")
-                f.write("  Antigo:\n")
-                f.write(json.dumps(change["alteracoes"]["antigo"], ensure_ascii=False, indent=4))
-                f.write("\n  Novo:\n")
-                f.write(json.dumps(change["alteracoes"]["novo"], ensure_ascii=False, indent=4))
-                f.write("\n\n")
+                for line in describe_changes(change["campos"]):
+                    f.write(f"  - {line}\n")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
 
 # Define paths
 input_path = os.path.join("Finais", "Parcial", "empresas.json")
@@ -34,15 +39,13 @@ def main():
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Read input file
-        with open(input_path, 'r', encoding='utf-8') as f:
-            empresas = json.load(f)
+        empresas = load_json(input_path)
         
         # Format each company
         formatted_empresas = [format_empresa(empresa) for empresa in empresas]
         
         # Write output file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_empresas, f, ensure_ascii=False, indent=2)
+        save_json(output_path, formatted_empresas, indent=2)
         
         print(f"Formatação concluída. Arquivo salvo em {output_path}")
         print(f"Total de empresas processadas: {len(formatted_empresas)}")
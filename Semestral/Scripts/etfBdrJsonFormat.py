@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
 
 # Define paths
 input_path = os.path.join("Finais", "Parcial", "etfBdr.json")
@@ -32,8 +37,7 @@ def main():
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Read input file
-        with open(input_path, 'r', encoding='utf-8') as f:
-            etf_bdrs = json.load(f)
+        etf_bdrs = load_json(input_path)
         
         # Format each ETF BDR
         formatted_etf_bdrs = [format_etf_bdr(etf_bdr) for etf_bdr in etf_bdrs]
@@ -42,8 +46,7 @@ def main():
         formatted_etf_bdrs_with_codes = [etf_bdr for etf_bdr in formatted_etf_bdrs if etf_bdr["codigos"]]
         
         # Write output file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_etf_bdrs_with_codes, f, ensure_ascii=False, indent=2)
+        save_json(output_path, formatted_etf_bdrs_with_codes, indent=2)
         
         print(f"Formatação concluída. Arquivo salvo em {output_path}")
         print(f"Total de ETF BDRs processados: {len(formatted_etf_bdrs)}")
@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
 
 # Define paths
 input_path = os.path.join("Finais", "Parcial", "etf.json")
@@ -33,15 +38,13 @@ def main():
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Read input file
-        with open(input_path, 'r', encoding='utf-8') as f:
-            etfs = json.load(f)
+        etfs = load_json(input_path)
         
         # Format each ETF
         formatted_etfs = [format_etf(etf) for etf in etfs]
         
         # Write output file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_etfs, f, ensure_ascii=False, indent=2)
+        save_json(output_path, formatted_etfs, indent=2)
         
         print(f"Formatação concluída. Arquivo salvo em {output_path}")
         print(f"Total de ETFs processados: {len(formatted_etfs)}")
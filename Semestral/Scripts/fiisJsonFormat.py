@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+
+# Módulos compartilhados (leitura dos JSONs das etapas anteriores)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Comum"))
+from dados import load_json, save_json
 
 # Define paths
 input_path = os.path.join("Finais", "Parcial", "fiis.json")
@@ -36,8 +41,7 @@ def main():
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
         # Read input file
-        with open(input_path, 'r', encoding='utf-8') as f:
-            fiis = json.load(f)
+        fiis = load_json(input_path)
         
         # Format each FII
         formatted_fiis = [format_fii(fii) for fii in fiis]
@@ -46,8 +50,7 @@ def main():
         formatted_fiis_with_codes = [fii for fii in formatted_fiis if fii["codigos"]]
         
         # Write output file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(formatted_fiis_with_codes, f, ensure_ascii=False, indent=2)
+        save_json(output_path, formatted_fiis_with_codes, indent=2)
         
         print(f"Formatação concluída. Arquivo salvo em {output_path}")
         print(f"Total de FIIs processados: {len(formatted_fiis)}")
@@ -1,11 +1,59 @@
+import argparse
 import os
 import sys
-import subprocess
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
-def run_script(script_name):
-    """Execute um script Python e retorne o código de saída"""
+# Módulos compartilhados (journal de checkpoint, orçamento de requisições, execução das etapas, banco SQLite)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Comum"))
+from armazem import STORE_PATH, AssetStore, import_assets
+from b3Client import CASSETE_PATH, RATE_BURST, RATE_LIMIT, RATE_MAX
+from checkpoint import Checkpoint
+from etapas import run_stage
+from perfil import append_run_log, describe
+
+# Grafo de dependências: cada script só roda depois dos que ele lista.
+# As cadeias de cada classe de ativo são independentes até dividendosauxiliar.py
+STAGES = {
+    "empresas.py": [],
+    "empresasExcelJson.py": ["empresas.py"],
+    "dividendosEmpresas.py": ["empresasExcelJson.py"],
+    "empresasJsonFormat.py": ["dividendosEmpresas.py"],
+    "bdr.py": [],
+    "bdrExcelJson.py": ["bdr.py"],
+    "dividendosBdr.py": ["bdrExcelJson.py"],
+    "bdrJsonFormat.py": ["dividendosBdr.py"],
+    "etf.py": [],
+    "etfExcelJson.py": ["etf.py"],
+    "etfJsonFormat.py": ["etfExcelJson.py"],
+    "etfBdr.py": [],
+    "etfBdrExcelJson.py": ["etfBdr.py"],
+    "etfBdrJsonFormat.py": ["etfBdrExcelJson.py"],
+    "fii.py": [],
+    "fiiExcelJson.py": ["fii.py"],
+    "dividendosFii.py": ["fiiExcelJson.py"],
+    "fiisJsonFormat.py": ["dividendosFii.py"],
+    "dividendosauxiliar.py": ["empresasJsonFormat.py", "bdrJsonFormat.py", "etfJsonFormat.py",
+                              "etfBdrJsonFormat.py", "fiisJsonFormat.py"]
+}
+
+# Os *ExcelJson.py automatizam o Excel (e matam processos EXCEL.EXE): nunca rodam juntos
+EXCLUSIVE = {script for script in STAGES if script.endswith("ExcelJson.py")}
+
+WORKERS = int(os.environ.get("SEMESTRAL_WORKERS", 5))
+
+def stage_env(workers):
+    """Ambiente dos subprocessos com o orçamento de requisições à B3 dividido entre os que rodam em paralelo"""
+    env = dict(os.environ)
+    if workers > 1:
+        env["B3_RATE_LIMIT"] = str(RATE_LIMIT / workers)
+        env["B3_RATE_BURST"] = str(max(1.0, RATE_BURST / workers))
+        env["B3_RATE_MAX"] = str(RATE_MAX / workers)
+    return env
+
+def run_script(script_name, extra_args=None, env=None, log_path=None, in_process=True, cprofile_path=None):
+    """Execute um script Python e retorne o código de saída e as medidas de recursos"""
     print(f"\n{'='*80}")
     print(f"Executando {script_name}...")
     print(f"{'='*80}\n")
@@ -15,8 +63,9 @@ def run_script(script_name):
     # Caminho completo para o script
     script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Scripts", script_name)
     
-    # Executa o script
-    result = subprocess.run([sys.executable, script_path], capture_output=False)
+    # Executa o script: no próprio processo quando ele expõe main(), senão num subprocesso
+    # (em paralelo, a saída de cada script vai para o seu próprio log)
+    returncode, figures = run_stage(script_path, extra_args or [], in_process, env, log_path, cprofile_path)
     
     end_time = time.time()
     execution_time = end_time - start_time
@@ -24,58 +73,137 @@ def run_script(script_name):
     print(f"\n{'='*80}")
     print(f"Finalizado {script_name}")
     print(f"Tempo de execução: {execution_time/60:.2f} minutos ({execution_time:.2f} segundos)")
-    print(f"Status: {'Sucesso' if result.returncode == 0 else 'Falha'}")
+    print(f"Status: {'Sucesso' if returncode == 0 else 'Falha'}")
+    if figures:
+        print(f"Recursos: {describe(figures)}")
+    if log_path:
+        print(f"Saída: {log_path}")
     print(f"{'='*80}\n")
     
-    return result.returncode
+    return returncode, figures
+
+def run_stages(stages, workers, start_stage, finished=()):
+    """Executa o grafo `stages` com até `workers` scripts ao mesmo tempo.
+
+    Um script entra na fila quando todas as suas dependências terminaram (com
+    sucesso ou não, como na execução sequencial), na ordem em que foi declarado;
+    os de EXCLUSIVE esperam uns pelos outros. `finished` lista os que não
+    precisam rodar. Retorna {script: resultado de start_stage}.
+    """
+    done = set(finished)
+    pending = [script for script in stages if script not in done]
+    running = {}
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            exclusive_busy = any(script in EXCLUSIVE for script in running.values())
+            for script in list(pending):
+                if len(running) >= workers:
+                    break
+                if not all(dep in done for dep in stages[script]):
+                    continue
+                if script in EXCLUSIVE:
+                    if exclusive_busy:
+                        continue
+                    exclusive_busy = True
+                pending.remove(script)
+                running[executor.submit(start_stage, script)] = script
+
+            if not running:
+                raise RuntimeError(f"Dependências não satisfeitas: {', '.join(pending)}")
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                script = running.pop(future)
+                results[script] = future.result()
+                done.add(script)
+
+    return results
 
 def main():
-    # Lista de scripts para executar em ordem
-    scripts = [
-        "empresas.py",
-        "empresasExcelJson.py",
-        "dividendosEmpresas.py",
-        "empresasJsonFormat.py",
-        "bdr.py",
-        "bdrExcelJson.py",
-        "dividendosBdr.py",
-        "bdrJsonFormat.py",
-        "etf.py",
-        "etfExcelJson.py",
-        "etfJsonFormat.py",
-        "etfBdr.py",
-        "etfBdrExcelJson.py",
-        "etfBdrJsonFormat.py",
-        "fii.py",
-        "fiiExcelJson.py",
-        "dividendosFii.py",
-        "fiisJsonFormat.py",
-        "dividendosauxiliar.py"
-    ]
+    parser = argparse.ArgumentParser(description="Executa todos os scripts semestrais")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma a última execução interrompida: pula os scripts já concluídos e repassa --resume aos scripts")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Máximo de scripts rodando ao mesmo tempo (padrão: SEMESTRAL_WORKERS ou 5; 1 = sequencial)")
+    parser.add_argument("--subprocesso", action="store_true",
+                        help="Executa cada script num interpretador próprio, como antes")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Grava um cProfile (.prof) de cada script em Suporte/perfil_<data>/")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    in_process = not args.subprocesso
+    if CASSETE_PATH and workers > 1 and not in_process:
+        # Vários processos gravando no mesmo cassete corromperiam o arquivo
+        print("B3_CASSETE definido: executando os scripts em sequência")
+        workers = 1
+    scripts = list(STAGES)
     
     # Cria pasta de logs se não existir
     log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Suporte")
     os.makedirs(log_dir, exist_ok=True)
     
-    # Arquivo de log
-    log_file = os.path.join(log_dir, f"execucao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    # Arquivo de log (texto) e log estruturado com os recursos de cada script (JSON Lines)
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_file = os.path.join(log_dir, f"execucao_{run_id}.log")
+    run_log = os.path.join(log_dir, "execucao.jsonl")
+    profile_dir = None
+    if args.perfil:
+        profile_dir = os.path.join(log_dir, f"perfil_{run_id}")
+        os.makedirs(profile_dir, exist_ok=True)
+    
+    # Journal dos scripts concluídos nesta rodada (apagado quando todos terminam com sucesso)
+    checkpoint = Checkpoint(os.path.join(log_dir, "execucao.checkpoint.jsonl"), resume=args.resume, fsync_every=1)
+    extra_args = ["--resume"] if args.resume else []
+    # No mesmo processo as etapas dividem uma sessão e um rate limiter; só os subprocessos precisam dividir o orçamento
+    env = stage_env(1 if in_process else workers)
+    stage_log_dir = None
+    if workers > 1:
+        stage_log_dir = os.path.join(log_dir, f"execucao_{run_id}")
+        os.makedirs(stage_log_dir, exist_ok=True)
     
     # Registra início da execução
     start_time_total = time.time()
-    print(f"Iniciando execução de todos os scripts: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    print(f"Iniciando execução de todos os scripts: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} ({workers} em paralelo)")
     
-    # Executa cada script
-    results = {}
-    for script in scripts:
+    def start_stage(script):
+        log_path = os.path.join(stage_log_dir, script.replace(".py", ".log")) if stage_log_dir else None
+        cprofile_path = os.path.join(profile_dir, script.replace(".py", ".prof")) if profile_dir else None
         script_start = time.time()
-        exit_code = run_script(script)
+        exit_code, figures = run_script(script, extra_args, env, log_path, in_process, cprofile_path)
         script_end = time.time()
         
-        results[script] = {
+        result = {
             "exit_code": exit_code,
             "status": "Sucesso" if exit_code == 0 else "Falha",
             "tempo": script_end - script_start
         }
+        append_run_log(run_log, dict({"execucao": run_id, "script": script, "inicio": script_start}, **result, **figures))
+        if exit_code == 0:
+            checkpoint.record(script, result)
+        return result
+    
+    # Executa os scripts respeitando as dependências
+    finished = [script for script in scripts if script in checkpoint]
+    for script in finished:
+        print(f"Pulando {script}: concluído na execução anterior")
+    stage_results = run_stages(STAGES, workers, start_stage, finished)
+    results = {script: stage_results.get(script) or checkpoint.get(script) for script in scripts}
+    
+    if all(result["exit_code"] == 0 for result in results.values()):
+        checkpoint.clear()
+        # Com B3_BANCO, os ativos da rodada também vão para o banco
+        if STORE_PATH:
+            store = AssetStore()
+            try:
+                import_assets(store)
+            finally:
+                store.close()
+    else:
+        checkpoint.close()
+        print("Execução com falhas: rode novamente com --resume para continuar de onde parou")
     
     # Calcula tempo total
     end_time_total = time.time()
@@ -104,6 +232,7 @@ def main():
             f.write(f"  - {script}: {result['status']} ({result['tempo']/60:.2f} min)\n")
     
     print(f"\nLog salvo em: {log_file}")
+    print(f"Recursos por script: {run_log}")
     print(f"{'='*80}\n")
 
 if __name__ == "__main__":